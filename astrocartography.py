@@ -0,0 +1,162 @@
+"""
+Астрокартография: линии ASC, DSC, MC и IC планет по всему земному шару
+и релокация карты в другой город.
+
+	lines = planet_lines(chart['jd'])       # {планета: {'MC': долгота, 'ASC': [[(lon, lat), ...]], ...}}
+	near = lines_near(chart, lat, lon)      # линии, проходящие рядом с городом
+	reloc = relocate(chart, lat, lon)       # куспиды и дома планет в новом месте
+
+Линии решаются аналитически, без swe.houses в узлах сетки. Для планеты с
+прямым восхождением α и склонением δ при гринвичском звёздном времени θ:
+	MC/IC — меридианы λ = α − θ и λ + 180°;
+	ASC/DSC — горизонт: для каждой долготы сетки часовой угол H = θ + λ − α,
+	широта φ = atan(−cos H / tg δ); восход (ASC) при sin H < 0, заход — при sin H > 0.
+На карту — одна пара (α, δ) на планету и по одному atan на долготу с шагом
+ASTRO_STEP. Линии кэшируются по моменту рождения (ASTRO_CACHE_SIZE карт).
+"""
+
+import math
+import os
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import swisseph as swe
+
+from calculator import PLANETS
+from ephemeris import wrap180
+from houses import chosen_system, houses_at, sidereal_frame
+from texts import get_house
+
+
+ASTRO_STEP = float(os.getenv("ASTRO_STEP", "1.0"))  # шаг по долготе, °
+ASTRO_CACHE_SIZE = int(os.getenv("ASTRO_CACHE_SIZE", "256"))
+MAX_LATITUDE = 75.0  # выше линии восхода почти параллельны меридианам — не рисуем
+LINE_ORB = 3.0  # «рядом с городом» — ближе LINE_ORB градусов по долготе
+
+ANGLES = ('ASC', 'DSC', 'MC', 'IC')
+
+Point = Tuple[float, float]  # (долгота, широта)
+
+
+def _equatorial(jd: float, pid: int) -> Tuple[float, float]:
+	"""Прямое восхождение и склонение планеты, °."""
+	xx = swe.calc_ut(jd, pid, swe.FLG_SWIEPH | swe.FLG_EQUATORIAL)[0]
+	return xx[0], xx[1]
+
+
+def _horizon_latitude(hour_angle: float, dec: float) -> float:
+	"""Широта, на которой планета с часовым углом hour_angle на горизонте."""
+	h, d = math.radians(hour_angle), math.radians(dec)
+	lat = math.degrees(math.atan2(-math.cos(h) * math.cos(d), math.sin(d)))
+	if lat > 90.0:
+		lat -= 180.0
+	elif lat < -90.0:
+		lat += 180.0
+	return lat
+
+
+def _horizon_lines(ra: float, dec: float, gst: float, step: float) -> Dict[str, List[List[Point]]]:
+	"""Линии восхода и захода: ломаные по долготам сетки, разорванные там,
+	где линия уходит за MAX_LATITUDE или меняется восход/заход."""
+	lines = {'ASC': [], 'DSC': []}
+	current, kind = [], None
+	count = int(round(360.0 / step))
+	for k in range(count + 1):
+		lon = -180.0 + k * step
+		hour_angle = wrap180(gst + lon - ra)
+		lat = _horizon_latitude(hour_angle, dec)
+		point_kind = 'ASC' if hour_angle < 0 else 'DSC'
+		if abs(lat) > MAX_LATITUDE or point_kind != kind:
+			if len(current) > 1:
+				lines[kind].append(current)
+			current, kind = [], point_kind
+			if abs(lat) > MAX_LATITUDE:
+				continue
+		current.append((lon, lat))
+	if len(current) > 1:
+		lines[kind].append(current)
+	return lines
+
+
+@lru_cache(maxsize=ASTRO_CACHE_SIZE)
+def _lines_at(jd: float, planets: Tuple[Tuple[str, int], ...], step: float) -> Dict[str, Dict]:
+	gst = swe.sidtime(jd) * 15.0
+	result = {}
+	for name, pid in planets:
+		ra, dec = _equatorial(jd, pid)
+		mc = wrap180(ra - gst)
+		lines = _horizon_lines(ra, dec, gst, step)
+		result[name] = {
+			'MC': mc,
+			'IC': wrap180(mc + 180.0),
+			'ASC': lines['ASC'],
+			'DSC': lines['DSC'],
+			'ra': ra,
+			'dec': dec,
+		}
+	return result
+
+
+def planet_lines(jd: float, planets: Optional[Dict[str, int]] = None, step: float = ASTRO_STEP) -> Dict[str, Dict]:
+	"""Линии планет для момента jd (UT).
+
+	Возвращает {планета: {'MC': долгота, 'IC': долгота, 'ASC': [ломаные], 'DSC': [ломаные],
+	'ra', 'dec'}}; ломаная — список (долгота, широта) от −180° к 180°.
+	Результат общий для всех вызовов с тем же jd — не изменяйте его.
+	"""
+	return _lines_at(jd, tuple((planets or PLANETS).items()), step)
+
+
+def _natal_jd(chart: Dict) -> float:
+	jd = chart.get('jd')
+	if jd is None:
+		raise ValueError("В карте нет момента рождения — пересчитайте карту")
+	return jd
+
+
+def lines_near(chart: Dict, lat: float, lon: float, orb: float = LINE_ORB) -> List[Dict]:
+	"""Линии, проходящие не дальше orb градусов по долготе от точки (lat, lon),
+	по возрастанию расстояния: [{'planet', 'angle', 'distance'}]."""
+	near = []
+	for planet, lines in planet_lines(_natal_jd(chart)).items():
+		candidates = {'MC': lines['MC'], 'IC': lines['IC']}
+		# Долготы восхода и захода на широте точки — из того же уравнения горизонта
+		product = -math.tan(math.radians(lat)) * math.tan(math.radians(lines['dec']))
+		if -1.0 <= product <= 1.0:
+			semi_arc = math.degrees(math.acos(product))
+			candidates['ASC'] = wrap180(lines['MC'] - semi_arc)
+			candidates['DSC'] = wrap180(lines['MC'] + semi_arc)
+		for angle, line_lon in candidates.items():
+			distance = abs(wrap180(lon - line_lon))
+			if distance <= orb:
+				near.append({'planet': planet, 'angle': angle, 'distance': distance})
+	near.sort(key=lambda n: n['distance'])
+	return near
+
+
+def relocate(chart: Dict, lat: float, lon: float) -> Dict:
+	"""Карта на момент рождения в другом месте: ASC, MC, куспиды в системе домов
+	карты и дома натальных планет. Положения планет не меняются."""
+	armc, obliquity = sidereal_frame(_natal_jd(chart), lon)
+	houses = houses_at(armc, lat, obliquity, chosen_system(chart))
+	cusps = houses['cusps']
+	return {
+		'lat': lat,
+		'lon': lon,
+		'asc': houses['asc'],
+		'mc': houses['mc'],
+		'cusps': cusps,
+		'house_system': houses['system'],
+		'houses': {planet: get_house(cusps, pos) for planet, pos in chart['positions'].items()},
+		'lines': lines_near(chart, lat, lon),
+	}
+
+
+def relocate_to(chart: Dict, place: str) -> Dict:
+	"""relocate для города по названию (геокодинг через Nominatim)."""
+	from calculator import geocode
+
+	lat, lon = geocode(place)
+	result = relocate(chart, lat, lon)
+	result['place'] = place
+	return result
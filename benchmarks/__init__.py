@@ -0,0 +1 @@
+"""Бенчмарки горячих путей бота (python -m benchmarks.run)."""
@@ -0,0 +1,218 @@
+"""
+Набор бенчмарков горячих путей.
+
+Каждый кейс — функция setup(size), которая готовит данные и возвращает
+пару (run, teardown): run выполняет одну операцию над очередным элементом
+корпуса, teardown убирает временные файлы (или None).
+"""
+
+import itertools
+import os
+import tempfile
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+from benchmarks import corpus
+
+
+Setup = Callable[[int], Tuple[Callable[[], object], Optional[Callable[[], None]]]]
+
+
+class Case(NamedTuple):
+	name: str
+	setup: Setup
+	# Сколько вызовов run в одном раунде замера
+	number: int
+
+
+CASES: Dict[str, Case] = {}
+
+
+def case(name: str, number: int = 100):
+	def register(setup: Setup) -> Setup:
+		CASES[name] = Case(name, setup, number)
+		return setup
+	return register
+
+
+@case("chart.calculate_full_chart", number=50)
+def _calculate_full_chart(size):
+	import calculator
+
+	records = itertools.cycle(corpus.birth_records(size))
+	original = calculator.geocode
+	calculator.geocode = corpus.fake_geocode
+
+	def teardown():
+		calculator.geocode = original
+
+	return (lambda: calculator.calculate_full_chart(dict(next(records)))), teardown
+
+
+@case("chart.unknown_time_day_ranges", number=10)
+def _day_ranges(size):
+	from unknown_time import day_ranges
+
+	records = itertools.cycle([
+		(record["birth_date"],) + corpus.COORDINATES[record["place"]]
+		for record in corpus.birth_records(size)
+	])
+	return (lambda: day_ranges(*next(records))), None
+
+
+@case("chart.find_aspects", number=1000)
+def _find_aspects(size):
+	from calculator import find_aspects
+
+	positions = itertools.cycle([chart["positions"] for chart in corpus.charts(size)])
+	return (lambda: find_aspects(next(positions))), None
+
+
+@case("chart.aspect_matrix_32", number=200)
+def _aspect_matrix(size):
+	from bodies import EXTENDED_ASPECTS, aspect_matrix
+
+	# 10 планет + 22 тела со сдвинутыми долготами — масштаб набора full
+	def widen(positions):
+		lons = list(positions.values())
+		extra = {f"Asteroid {k}": (lons[k % len(lons)] + 37.0 * k) % 360 for k in range(22)}
+		return dict(positions, **extra)
+
+	positions = itertools.cycle([widen(chart["positions"]) for chart in corpus.charts(size)])
+	return (lambda: aspect_matrix(next(positions), EXTENDED_ASPECTS)), None
+
+
+@case("texts.get_planet_interpretation", number=1000)
+def _planet_interpretation(size):
+	from texts import get_planet_interpretation, get_sign_name
+
+	pairs = itertools.cycle([
+		(planet.lower(), get_sign_name(deg))
+		for chart in corpus.charts(size)
+		for planet, deg in chart["positions"].items()
+	])
+	return (lambda: get_planet_interpretation(*next(pairs))), None
+
+
+@case("texts.get_ascendant_interpretation", number=1000)
+def _ascendant_interpretation(size):
+	from texts import get_ascendant_interpretation, get_sign_name
+
+	signs = itertools.cycle([get_sign_name(chart["asc"]) for chart in corpus.charts(size)])
+	return (lambda: get_ascendant_interpretation(next(signs))), None
+
+
+@case("texts.get_aspect_interpretation", number=1000)
+def _aspect_interpretation(size):
+	from texts import get_aspect_interpretation
+
+	aspects = itertools.cycle([
+		(a["p1"], a["p2"], a["type"], a["orb"])
+		for chart in corpus.charts(size)
+		for a in chart["aspects"]
+	])
+	return (lambda: get_aspect_interpretation(*next(aspects))), None
+
+
+@case("transits.find_transits", number=20)
+def _find_transits(size):
+	from datetime import datetime
+
+	import pytz
+	from transits import find_transits
+
+	charts = itertools.cycle(corpus.charts(size))
+	# Фиксированное начало окна — результаты сравнимы между запусками
+	start = pytz.utc.localize(datetime(2025, 1, 1))
+	return (lambda: find_transits(next(charts), start=start)), None
+
+
+@case("progressions.returns", number=20)
+def _returns(size):
+	from progressions import returns
+
+	charts = itertools.cycle(corpus.charts(size))
+	return (lambda: returns(next(charts), 2025, 2027)), None
+
+
+@case("houses.compare_systems", number=500)
+def _compare_systems(size):
+	from houses import HOUSE_SYSTEMS, compare_systems
+
+	charts = itertools.cycle(corpus.charts(size))
+	return (lambda: compare_systems(next(charts), HOUSE_SYSTEMS)), None
+
+
+@case("astrocartography.planet_lines", number=20)
+def _planet_lines(size):
+	import astrocartography
+
+	jds = itertools.cycle([chart["jd"] for chart in corpus.charts(size)])
+
+	def run():
+		# без кэша — замер самого расчёта линий
+		astrocartography._lines_at.cache_clear()
+		return astrocartography.planet_lines(next(jds))
+
+	return run, None
+
+
+@case("texts.generate_free_interpretation", number=20)
+def _free_interpretation(size):
+	from texts import generate_free_interpretation
+
+	charts = itertools.cycle(corpus.charts(size))
+	return (lambda: generate_free_interpretation(next(charts))), None
+
+
+@case("pdf.create_natal_pdf", number=3)
+def _create_natal_pdf(size):
+	import pdf_generator
+
+	charts = itertools.cycle(corpus.charts(min(size, 10)))
+	sections = corpus.sections()
+	uids = itertools.count(1)
+
+	def run():
+		# Разделы передаются готовыми — love_ai и LLM в замер не попадают
+		path = pdf_generator.create_natal_pdf(next(charts), next(uids), "Бенчмарк", "bench_bot", sections)
+		os.remove(path)
+
+	return run, None
+
+
+def _temp_db(size):
+	from cryptography.fernet import Fernet
+	from database import EncryptedDB
+
+	tmp = tempfile.TemporaryDirectory()
+	db = EncryptedDB(os.path.join(tmp.name, "bench.sqlite"), fernet_key=Fernet.generate_key().decode())
+	db.init_db()
+	states = corpus.user_states(size)
+	for uid, data in enumerate(states, start=1):
+		db.ensure_user_exists(uid)
+		db.set_state(uid, "WAIT_PLACE", data)
+
+	def teardown():
+		db.close()
+		tmp.cleanup()
+
+	return db, states, teardown
+
+
+@case("db.set_state", number=200)
+def _db_set_state(size):
+	db, states, teardown = _temp_db(size)
+	items = itertools.cycle(list(enumerate(states, start=1)))
+
+	def run():
+		uid, data = next(items)
+		db.set_state(uid, "SHOWING_RESULT", data)
+
+	return run, teardown
+
+
+@case("db.get_state", number=500)
+def _db_get_state(size):
+	db, states, teardown = _temp_db(size)
+	uids = itertools.cycle(range(1, len(states) + 1))
+	return (lambda: db.get_state(next(uids))), teardown
@@ -0,0 +1,78 @@
+"""
+Синтетические данные для бенчмарков.
+
+Все генераторы детерминированы (seed), поэтому прогоны на разных
+коммитах считают одно и то же и результаты можно сравнивать.
+"""
+
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from love_ai import FALLBACK_TEXTS
+
+
+# Города с координатами: геокодер в бенчмарках не вызывается
+CITIES = [
+	("Москва, Россия", 55.7558, 37.6173),
+	("Казань, Россия", 55.7961, 49.1064),
+	("Новосибирск, Россия", 55.0084, 82.9357),
+	("Владивосток, Россия", 43.1155, 131.8855),
+	("Киев, Украина", 50.4501, 30.5234),
+	("Минск, Беларусь", 53.9006, 27.5590),
+	("Алматы, Казахстан", 43.2220, 76.8512),
+	("Мурманск, Россия", 68.9585, 33.0827),
+	("Берлин, Германия", 52.5200, 13.4050),
+	("Нью-Йорк, США", 40.7128, -74.0060),
+	("Буэнос-Айрес, Аргентина", -34.6037, -58.3816),
+	("Сидней, Австралия", -33.8688, 151.2093),
+]
+COORDINATES = {place: (lat, lon) for place, lat, lon in CITIES}
+
+FIRST_BIRTH = datetime(1940, 1, 1)
+BIRTH_SPAN_DAYS = 365 * 70
+
+
+def birth_records(count: int, seed: int = 42) -> List[Dict[str, str]]:
+	"""Записи в формате диалога: birth_date, birth_time, place."""
+	rnd = random.Random(seed)
+	records = []
+	for _ in range(count):
+		born = FIRST_BIRTH + timedelta(days=rnd.randrange(BIRTH_SPAN_DAYS), minutes=rnd.randrange(24 * 60))
+		records.append({
+			"birth_date": born.strftime("%d.%m.%Y"),
+			"birth_time": born.strftime("%H:%M"),
+			"place": rnd.choice(CITIES)[0],
+		})
+	return records
+
+
+def fake_geocode(place: str) -> tuple:
+	return COORDINATES[place]
+
+
+def charts(count: int, seed: int = 42) -> List[dict]:
+	"""Рассчитанные карты для бенчмарков текстов и PDF."""
+	import calculator
+
+	original = calculator.geocode
+	calculator.geocode = fake_geocode
+	try:
+		return [calculator.calculate_full_chart(dict(record)) for record in birth_records(count, seed)]
+	finally:
+		calculator.geocode = original
+
+
+def sections() -> Dict[str, str]:
+	"""Разделы LLM: в бенчмарке PDF модель не вызывается."""
+	return dict(FALLBACK_TEXTS)
+
+
+def user_states(count: int, seed: int = 42) -> List[dict]:
+	"""Данные пользователя такого же размера, как в боевом состоянии диалога."""
+	states = []
+	for i, record in enumerate(birth_records(count, seed)):
+		data = dict(record)
+		data.update({"user_first_name": f"User{i}", "lat": 55.75, "lon": 37.61, "birth_time_unknown": False})
+		states.append(data)
+	return states
@@ -0,0 +1,171 @@
+"""
+Запуск бенчмарков, история результатов и проверка регрессий.
+
+	python -m benchmarks.run                      # все кейсы, запись в историю
+	python -m benchmarks.run -k texts --rounds 20 # только кейсы с 'texts' в имени
+	python -m benchmarks.run --save-baseline      # зафиксировать текущие цифры как эталон
+	python -m benchmarks.run --check              # код возврата 1 при регрессии
+
+Каждый прогон дописывается строкой JSON в benchmarks/results/history.jsonl
+(коммит, время, версия Python, статистика по кейсам). Регрессия — медиана
+кейса хуже эталона (baseline.json) больше, чем в допустимое число раз
+из thresholds.json.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from benchmarks.cases import CASES, Case
+
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+HISTORY_PATH = os.path.join(RESULTS_DIR, "history.jsonl")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+THRESHOLDS_PATH = os.path.join(BENCH_DIR, "thresholds.json")
+
+ROUNDS = 10
+WARMUP_ROUNDS = 1
+CORPUS_SIZE = 200
+
+
+def measure(bench: Case, rounds: int = ROUNDS, size: int = CORPUS_SIZE) -> Dict[str, float]:
+	"""Время одной операции (секунды) по раундам из bench.number вызовов."""
+	run, teardown = bench.setup(size)
+	samples: List[float] = []
+	try:
+		for i in range(WARMUP_ROUNDS + rounds):
+			gc.collect()
+			started = time.perf_counter()
+			for _ in range(bench.number):
+				run()
+			elapsed = (time.perf_counter() - started) / bench.number
+			if i >= WARMUP_ROUNDS:
+				samples.append(elapsed)
+	finally:
+		if teardown:
+			teardown()
+
+	samples.sort()
+	median = statistics.median(samples)
+	return {
+		"min": samples[0],
+		"median": median,
+		"p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+		"stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+		"ops_per_sec": 1 / median if median else 0.0,
+		"rounds": rounds,
+		"number": bench.number,
+	}
+
+
+def _git_commit() -> str:
+	try:
+		return subprocess.run(
+			["git", "rev-parse", "--short", "HEAD"],
+			cwd=BENCH_DIR, capture_output=True, text=True, check=True
+		).stdout.strip()
+	except Exception:
+		return "unknown"
+
+
+def _load_json(path: str) -> dict:
+	if not os.path.exists(path):
+		return {}
+	with open(path, "r", encoding="utf-8") as f:
+		return json.load(f)
+
+
+def make_record(results: Dict[str, dict]) -> dict:
+	return {
+		"timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+		"commit": _git_commit(),
+		"python": platform.python_version(),
+		"machine": platform.machine(),
+		"results": results,
+	}
+
+
+def append_history(record: dict) -> None:
+	os.makedirs(RESULTS_DIR, exist_ok=True)
+	with open(HISTORY_PATH, "a", encoding="utf-8") as f:
+		f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def save_baseline(record: dict) -> None:
+	baseline = _load_json(BASELINE_PATH)
+	baseline.update({name: {"median": r["median"], "commit": record["commit"]} for name, r in record["results"].items()})
+	with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+		json.dump(baseline, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+def find_regressions(results: Dict[str, dict]) -> List[str]:
+	baseline = _load_json(BASELINE_PATH)
+	thresholds = _load_json(THRESHOLDS_PATH)
+	default = thresholds.get("default", 1.25)
+
+	regressions = []
+	for name, result in results.items():
+		if name not in baseline:
+			continue
+		limit = thresholds.get("cases", {}).get(name, default)
+		ratio = result["median"] / baseline[name]["median"]
+		if ratio > limit:
+			regressions.append(f"{name}: ×{ratio:.2f} к эталону {baseline[name]['commit']} (допустимо ×{limit})")
+	return regressions
+
+
+def _format_seconds(seconds: float) -> str:
+	if seconds >= 1:
+		return f"{seconds:.2f} s"
+	if seconds >= 1e-3:
+		return f"{seconds * 1e3:.2f} ms"
+	return f"{seconds * 1e6:.1f} µs"
+
+
+def main() -> int:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("-k", "--filter", default="", help="подстрока имени кейса")
+	parser.add_argument("--rounds", type=int, default=ROUNDS)
+	parser.add_argument("--size", type=int, default=CORPUS_SIZE, help="размер синтетического корпуса")
+	parser.add_argument("--save-baseline", action="store_true")
+	parser.add_argument("--check", action="store_true", help="вернуть 1 при регрессии")
+	parser.add_argument("--no-history", action="store_true")
+	args = parser.parse_args()
+
+	results = {}
+	for name, bench in CASES.items():
+		if args.filter not in name:
+			continue
+		results[name] = stats = measure(bench, rounds=args.rounds, size=args.size)
+		print(f"{name:40} median {_format_seconds(stats['median']):>10}  "
+			  f"p95 {_format_seconds(stats['p95']):>10}  {stats['ops_per_sec']:>10.1f} оп/с")
+
+	if not results:
+		print(f"Нет кейсов, подходящих под '{args.filter}'")
+		return 1
+
+	record = make_record(results)
+	if not args.no_history:
+		append_history(record)
+	if args.save_baseline:
+		save_baseline(record)
+		print(f"Эталон обновлён: {BASELINE_PATH}")
+
+	regressions = find_regressions(results)
+	for line in regressions:
+		print(f"РЕГРЕССИЯ {line}")
+	return 1 if args.check and regressions else 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
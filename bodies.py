@@ -0,0 +1,216 @@
+"""
+Расширенные наборы тел и малые аспекты.
+
+	extra = body_positions(jd, 'extended')        # узлы, Лилит, Хирон, астероиды
+	aspects = aspect_matrix({**chart['positions'], **extra}, EXTENDED_ASPECTS)
+
+Наборы тел (BODY_SETS) дополняют 10 планет calculator.PLANETS:
+	classic   — только планеты (по умолчанию, CHART_BODIES)
+	extended  — лунные узлы, Лилит, Хирон, Церера, Паллада, Юнона, Веста
+	full      — extended + Фол и нумерованные астероиды из ephe/ast*/
+
+Главные астероиды считаются по seas_*.se1, которые лежат в ephe/.
+Нумерованные — по отдельным файлам ephe/astN/seNNNNN.se1 (их в репозитории
+нет, кладутся по необходимости); каталог сканируется и имена из
+astlistn.md читаются один раз, при первом запросе набора full.
+
+Аспекты между n телами считаются матрицей: на каждую пару одна разность
+долгот и один bisect по отсортированным углам аспектов, орб пары —
+среднее орбов тел из BODY_ORBS, умноженное на множитель аспекта.
+Предельные орбы пар для набора тел строятся один раз и кэшируются, так
+что 30+ тел — это ~500 пар без перебора аспектов.
+"""
+
+import bisect
+import glob
+import os
+import re
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+import swisseph as swe
+
+from startup import Lazy
+
+
+EPHE_DIR = './ephe'
+
+# Набор тел по умолчанию; у пользователя — data['bodies']
+CHART_BODIES = os.getenv("CHART_BODIES", "classic")
+# Номера астероидов через запятую для набора full (если есть файл эфемерид)
+NUMBERED_ASTEROIDS = [int(n) for n in os.getenv("NUMBERED_ASTEROIDS", "").split(",") if n.strip()]
+
+SOUTH_NODE = 'SouthNode'
+
+EXTENDED_BODIES = {
+	'NorthNode': swe.TRUE_NODE,
+	SOUTH_NODE: None,  # противоположна северному
+	'Lilith': swe.MEAN_APOG,
+	'Chiron': swe.CHIRON,
+	'Ceres': swe.CERES,
+	'Pallas': swe.PALLAS,
+	'Juno': swe.JUNO,
+	'Vesta': swe.VESTA,
+}
+
+FULL_BODIES = dict(EXTENDED_BODIES, Pholus=swe.PHOLUS)
+
+BODY_SETS = ('classic', 'extended', 'full')
+
+# (тип, угол, множитель орба); мажорные — как в calculator.ASPECTS
+EXTENDED_ASPECTS = [
+	('conj',           0,   1.0),
+	('semisextile',    30,  0.25),
+	('semisquare',     45,  0.3),
+	('sextile',        60,  0.6),
+	('quintile',       72,  0.25),
+	('square',         90,  0.8),
+	('trine',          120, 0.8),
+	('sesquiquadrate', 135, 0.3),
+	('biquintile',     144, 0.25),
+	('quincunx',       150, 0.4),
+	('opp',            180, 1.0),
+]
+MINOR_ASPECT_TYPES = {'semisextile', 'semisquare', 'quintile', 'sesquiquadrate', 'biquintile', 'quincunx'}
+
+# Орб тела для соединения, °; у пары — среднее двух тел
+BODY_ORBS = {
+	'Sun': 10.0, 'Moon': 10.0,
+	'Mercury': 7.0, 'Venus': 7.0, 'Mars': 7.0,
+	'Jupiter': 6.0, 'Saturn': 6.0,
+	'Uranus': 5.0, 'Neptune': 5.0, 'Pluto': 5.0,
+	'ASC': 6.0, 'MC': 6.0,
+	'NorthNode': 3.0, SOUTH_NODE: 3.0, 'Lilith': 2.0, 'Chiron': 2.0,
+}
+DEFAULT_BODY_ORB = 1.5  # астероиды
+
+
+# ---------------------------------------------------------------------------
+# Нумерованные астероиды
+# ---------------------------------------------------------------------------
+
+def _asteroid_files(ephe_dir: str = EPHE_DIR) -> List[int]:
+	"""Номера астероидов, для которых в ephe/ast*/ есть файл эфемерид."""
+	numbers = set()
+	for path in glob.glob(os.path.join(ephe_dir, 'ast*', '*.se1')):
+		match = re.fullmatch(r's[e]?(\d+)s?\.se1', os.path.basename(path))
+		if match:
+			numbers.add(int(match.group(1)))
+	return sorted(numbers)
+
+
+def _asteroid_names(numbers, ephe_dir: str = EPHE_DIR) -> Dict[int, str]:
+	"""Имена астероидов из astlistn.md (строки вида «  (433) Eros  Eros»)."""
+	wanted = set(numbers)
+	names = {}
+	if not wanted:
+		return names
+	try:
+		with open(os.path.join(ephe_dir, 'astlistn.md'), encoding='utf-8') as f:
+			for line in f:
+				match = re.match(r'\s*\((\d+)\)\s+(\S.*?)\s{2,}', line)
+				if match and int(match.group(1)) in wanted:
+					names[int(match.group(1))] = match.group(2)
+					if len(names) == len(wanted):
+						break
+	except OSError as e:
+		print(f"Не удалось прочитать список астероидов: {e}")
+	return names
+
+
+def _load_numbered() -> Dict[str, int]:
+	"""Имя → ipl (swe.AST_OFFSET + номер) для доступных нумерованных астероидов."""
+	numbers = sorted(set(_asteroid_files()) | set(NUMBERED_ASTEROIDS))
+	names = _asteroid_names(numbers)
+	return {names.get(n, f"Asteroid {n}"): swe.AST_OFFSET + n for n in numbers}
+
+
+numbered_asteroids = Lazy("numbered_asteroids", _load_numbered)
+
+
+def bodies_for(body_set: str = None) -> Dict[str, int]:
+	"""Тела сверх calculator.PLANETS для набора body_set (имя → ipl, None — вычисляемое)."""
+	body_set = body_set or CHART_BODIES
+	if body_set == 'classic':
+		return {}
+	if body_set == 'extended':
+		return EXTENDED_BODIES
+	if body_set == 'full':
+		return dict(FULL_BODIES, **numbered_asteroids.get())
+	raise ValueError(f"Неизвестный набор тел: {body_set}. Доступны: {', '.join(BODY_SETS)}")
+
+
+def body_positions(jd: float, body_set: str = None) -> Dict[str, float]:
+	"""Долготы дополнительных тел набора body_set на момент jd (UT).
+	Тела без файла эфемерид пропускаются с сообщением в лог."""
+	positions = {}
+	for name, pid in bodies_for(body_set).items():
+		if pid is None:
+			continue
+		try:
+			positions[name] = swe.calc_ut(jd, pid)[0][0] % 360
+		except Exception as e:
+			print(f"Ошибка расчёта {name}: {e}")
+	if 'NorthNode' in positions:
+		positions[SOUTH_NODE] = (positions['NorthNode'] + 180.0) % 360
+	return positions
+
+
+# ---------------------------------------------------------------------------
+# Матрица аспектов
+# ---------------------------------------------------------------------------
+
+def _angles(aspects) -> Tuple[List[float], List[Tuple[str, float, float]]]:
+	ordered = sorted(aspects, key=lambda a: a[1])
+	return [float(a[1]) for a in ordered], ordered
+
+
+@lru_cache(maxsize=64)
+def _pair_orbs(names: Tuple[str, ...]) -> List[List[float]]:
+	"""Базовый орб каждой пары тел набора (среднее орбов тел)."""
+	orbs = [BODY_ORBS.get(name, DEFAULT_BODY_ORB) for name in names]
+	return [[(a + b) / 2 for b in orbs] for a in orbs]
+
+
+def aspect_matrix(positions: Dict[str, float], aspects=EXTENDED_ASPECTS) -> List[Dict]:
+	"""Все аспекты между телами positions, отсортированные по орбу.
+
+	На пару — одна разность долгот и bisect по отсортированным углам:
+	проверяются только два соседних угла из aspects (список (тип, угол, множитель орба)).
+	"""
+	names = tuple(positions)
+	lons = [positions[name] for name in names]
+	pair_orbs = _pair_orbs(names)
+	angles, ordered = _angles(aspects)
+	last = len(angles) - 1
+
+	found = []
+	for i in range(len(names)):
+		row = pair_orbs[i]
+		lon1 = lons[i]
+		for j in range(i + 1, len(names)):
+			diff = abs(lon1 - lons[j]) % 360.0
+			if diff > 180.0:
+				diff = 360.0 - diff
+			# кандидаты — соседние углы слева и справа от разности
+			k = bisect.bisect_left(angles, diff)
+			best = None
+			for index in (k - 1, k):
+				if 0 <= index <= last:
+					name, angle, factor = ordered[index]
+					orb = abs(diff - angle)
+					if orb <= row[j] * factor and (best is None or orb < best[1]):
+						best = (name, orb)
+			if best is not None:
+				name, orb = best
+				found.append({
+					'p1': names[i],
+					'p2': names[j],
+					'type': name,
+					'diff': diff,
+					'orb': orb,
+					'minor': name in MINOR_ASPECT_TYPES,
+				})
+
+	found.sort(key=lambda a: a['orb'])
+	return found
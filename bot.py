@@ -1,143 +1,121 @@
-import datetime
+import asyncio
 import os
-import threading
-import time
-from time import time as now_time
+import signal
 from admin import admin_only
 from dotenv import load_dotenv
-from pdf_generator import create_natal_pdf
-import telebot
+from telebot.async_telebot import AsyncTeleBot
 from telebot.types import ReplyKeyboardMarkup, InlineKeyboardMarkup, InlineKeyboardButton
-import telebot.apihelper as apihelper
-from states import get_active_user_count, get_paid_user_count, is_paid, set_paid, set_state, get_state, get_data, last_callback_time, CALLBACK_COOLDOWN
+import telebot.asyncio_helper as asyncio_helper
+from states import get_active_user_count, get_paid_user_count, is_paid, set_paid, set_state, get_state, get_data, update_data
 from calculator import calculate_full_chart
-from texts import generate_free_interpretation
-from payments import send_full_chart_invoice
+from texts import format_relocation, generate_free_interpretation
+from astrocartography import relocate_to
+from houses import HOUSE_NAMES_RU, parse_system, rehouse, resolve
+from payments import DELIVERED, FAILED, RENDERING, FulfillmentReconciler, advance, record_payment, send_full_chart_invoice
+from broadcast import BroadcastEngine, format_stats
+from runtime import per_chat, run_blocking, shutdown_executors, spawn, wait_background_tasks
+from webhook import run_webhook
+from bot_meta import BotMetadata
+from delivery import ReportDelivery, stats as delivery_stats
+import metrics
+from tracing import set_attributes, traced
+from ratelimit import limiter
+import dialog
+import warmup
 
 load_dotenv()
 
 TOKEN = os.getenv("TOKEN")
+BOT_MODE = os.getenv("BOT_MODE", "polling")  # polling | webhook
 
-apihelper.API_TIMEOUT = 1000
-apihelper.RETRY_ON_ERROR = True
-apihelper.RETRY_DELAY = 2
-apihelper.MAX_RETRIES = 5
+# Таймаут одного запроса к Bot API; долгие операции (PDF) идут в фоне и не держат апдейты
+asyncio_helper.REQUEST_TIMEOUT = 300
+asyncio_helper.MAX_RETRIES = 5
+# Свой сервер Bot API (локальный telegram-bot-api или заглушка нагрузочных тестов)
+if os.getenv("TELEGRAM_API_URL"):
+	asyncio_helper.API_URL = os.getenv("TELEGRAM_API_URL")
 
-bot = telebot.TeleBot(TOKEN)
-
-
-def _generate_and_send_pdf(bot, chat_id, uid, chart, user_first_name, bot_username):
-	pdf_path = None
-	try:
-		pdf_path = create_natal_pdf(
-			chart,
-			uid,
-			user_first_name,
-			bot_username
-		)
-
-		for attempt in range(1, 4):
-			try:
-				with open(pdf_path, "rb") as f:
-					bot.send_document(
-						chat_id,
-						f,
-						caption="Ваш полный натальный разбор в PDF\nСкачайте и сохраните ❤️",
-						timeout=90 + attempt * 30
-					)
-				break
-
-			except Exception as e:
-				if attempt == 3:
-					raise
-				bot.send_message(chat_id, f"Попытка {attempt} не удалась, пробую ещё раз...")
-				time.sleep(3)
-
-	except Exception as e:
-		bot.send_message(
-			chat_id,
-			f"❌ Ошибка при отправке PDF:\n{e}"
-		)
-
-	finally:
-		if pdf_path and os.path.exists(pdf_path):
-			os.remove(pdf_path)
+bot = AsyncTeleBot(TOKEN)
+broadcaster = BroadcastEngine(bot)
+bot_meta = BotMetadata(bot)
+reports = ReportDelivery(bot, bot_meta)
 
 
 @bot.message_handler(commands=['start'])
-def start(message):
+@per_chat
+async def start(message):
 	uid = message.from_user.id
-	set_state(uid, 'START')
+	set_state(uid, dialog.START)
 	markup = ReplyKeyboardMarkup(resize_keyboard=True)
-	markup.add("Рассчитать натальную карту")
-	bot.send_message(message.chat.id, "Привет! Я рассчитаю твою натальную карту.", reply_markup=markup)
+	markup.add(dialog.BEGIN_BUTTON)
+	await bot.send_message(message.chat.id, "Привет! Я рассчитаю твою натальную карту.", reply_markup=markup)
 
 
-@bot.message_handler(func=lambda m: m.text == "Рассчитать натальную карту")
-def begin_calc(m):
+@bot.message_handler(func=lambda m: m.text is not None and not m.text.startswith('/'))
+@per_chat
+async def handle_text(m):
+	"""Весь ввод диалога: состояние читается один раз, шаг выбирается по таблице dialog.STEPS"""
 	uid = m.from_user.id
-	set_state(uid, "WAIT_DATE")
-	bot.send_message(m.chat.id, "Введите дату рождения в формате ДД.ММ.ГГГГ")
-
+	transition = dialog.advance(get_state(uid), m.text)
+	if transition is None:
+		return
 
-@bot.message_handler(func=lambda m: get_state(m.from_user.id) == "WAIT_DATE")
-def handle_date(m):
-	uid = m.from_user.id
-	get_data(uid)['birth_date'] = m.text
-	set_state(uid, "WAIT_TIME")
-	bot.send_message(m.chat.id, "Введите время рождения (ЧЧ:ММ) или 'не знаю'")
+	if transition.error:
+		await bot.send_message(m.chat.id, transition.reply)
+		return
 
+	if transition.next_state == dialog.CALCULATING:
+		await calculate_chart(m, transition.data)
+		return
 
-@bot.message_handler(func=lambda m: get_state(m.from_user.id) == "WAIT_TIME")
-def handle_time(m):
-	uid = m.from_user.id
-	time_input = m.text.lower().strip()
-	if time_input == "не знаю":
-		get_data(uid)['birth_time'] = "12:00"
-	else:
-		get_data(uid)['birth_time'] = time_input
-	set_state(uid, "WAIT_PLACE")
-	bot.send_message(m.chat.id, "Введите место рождения (город, страна)")
+	set_state(uid, transition.next_state, transition.data)
+	await bot.send_message(m.chat.id, transition.reply)
 
 
-@bot.message_handler(func=lambda m: get_state(m.from_user.id) == "WAIT_PLACE")
-def handle_place(m):
+@traced("request.chart")
+async def calculate_chart(m, place_data):
 	uid = m.from_user.id
-	user_data = get_data(uid)
-	user_data['place'] = m.text
+	set_attributes(uid=uid)
+	user_data = {**get_data(uid), **place_data}
+
+	retry_after = limiter.check("chart", uid)
+	if retry_after:
+		await bot.send_message(m.chat.id, f"Слишком много расчётов подряд. Попробуйте через {int(retry_after) + 1} сек.")
+		return
 
-	set_state(uid, "CALCULATING")
-	msg = bot.send_message(m.chat.id, "Расчитываю карту... ⏳")
+	set_state(uid, dialog.CALCULATING, place_data)
+	msg = await bot.send_message(m.chat.id, "Расчитываю карту... ⏳")
 
 	try:
-		chart_data = calculate_full_chart(user_data)
+		chart_data = await run_blocking(calculate_full_chart, user_data, pool="chart")
 		user_data['chart'] = chart_data
-		bot.edit_message_text("Готово!", m.chat.id, msg.message_id)
-		
-		free_text = generate_free_interpretation(chart_data)
-		bot.send_message(m.chat.id, free_text, parse_mode='HTML')
-		
+		set_state(uid, dialog.CALCULATING, user_data)
+		await bot.edit_message_text("Готово!", m.chat.id, msg.message_id)
+
+		# Ближайший транзит считается через Swiss Ephemeris — не в event loop
+		free_text = await run_blocking(generate_free_interpretation, chart_data, pool="chart")
+		await bot.send_message(m.chat.id, free_text, parse_mode='HTML')
+
 		markup = InlineKeyboardMarkup()
 		markup.add(InlineKeyboardButton("Купить полный разбор", callback_data="buy_full"))
-		bot.send_message(m.chat.id, "Хотите увидеть полный разбор?", reply_markup=markup)
-		
-		set_state(uid, "SHOWING_RESULT")
+		await bot.send_message(m.chat.id, "Хотите увидеть полный разбор?", reply_markup=markup)
+
+		set_state(uid, dialog.SHOWING_RESULT)
 	except Exception as e:
-		bot.send_message(m.chat.id, f"Ошибка при расчёте: {e}")
-		set_state(uid, "START")
+		await bot.send_message(m.chat.id, f"Ошибка при расчёте: {e}")
+		set_state(uid, dialog.START)
 
 
 @bot.callback_query_handler(func=lambda call: call.data == "buy_full")
-def handle_buy_full(call):
+@per_chat
+async def handle_buy_full(call):
 	uid = call.from_user.id
 	chat_id = call.message.chat.id
 	user_first_name = call.from_user.first_name or ""
 
-	now = now_time()
-
 	# Проверяем кулдаун
-	if uid in last_callback_time and now - last_callback_time[uid] < CALLBACK_COOLDOWN:
-		bot.answer_callback_query(
+	if limiter.check("buy_button", uid):
+		await bot.answer_callback_query(
 			call.id,
 			text="Подождите 3–4 секунды перед повторным нажатием",
 			show_alert=False,
@@ -145,51 +123,46 @@ def handle_buy_full(call):
 		)
 		return
 
-	last_callback_time[uid] = now
-
-	user_first_name = call.from_user.first_name or ""
-
 	if is_paid(uid):
-		bot.answer_callback_query(call.id, "Вы уже оплатили полный разбор", show_alert=True)
+		await bot.answer_callback_query(call.id, "Вы уже оплатили полный разбор", show_alert=True)
 		# Отправляем разбор если уже оплачено
-		chart = get_data(uid).get('chart')
-		if chart:
-			try:
-				bot_info = bot.get_me()
-				bot_username = bot_info.username or "natal_chart_bot"
-				
-				pdf_path = create_natal_pdf(chart, uid, user_first_name, bot_username)
-				
-				with open(pdf_path, 'rb') as pdf_file:
-					bot.send_document(
-						chat_id,
-						pdf_file,
-						caption="Ваш полный натальный разбор в PDF"
-					)
-				
-				os.remove(pdf_path)
-			except Exception as e:
-				bot.send_message(chat_id, f"Ошибка при создании PDF: {str(e)}")
+		data = get_data(uid)
+		chart = data.get('chart')
+		retry_after = limiter.check("render", uid, use_global=False)
+		if chart and retry_after:
+			await bot.send_message(
+				chat_id,
+				f"Разбор уже отправлялся недавно. Повторно можно запросить через {int(retry_after // 60) + 1} мин."
+			)
+		elif chart:
+			spawn(
+				reports.deliver(
+					chat_id, uid, chart, user_first_name,
+					caption="Ваш полный натальный разбор в PDF",
+					key=data.get('charge_id')
+				),
+				name=f"resend-pdf-{uid}"
+			)
 		return
 
 	# Отправляем инвойс
 	try:
-		send_full_chart_invoice(bot, chat_id)
-		bot.answer_callback_query(call.id, "Открываем оплату...")
+		await send_full_chart_invoice(bot, chat_id)
+		await bot.answer_callback_query(call.id, "Открываем оплату...")
 	except Exception as e:
-		bot.answer_callback_query(call.id, f"Ошибка: {str(e)}", show_alert=True)
+		await bot.answer_callback_query(call.id, f"Ошибка: {str(e)}", show_alert=True)
 		print(f"Ошибка при send_invoice для {uid}: {e}")
 
 
 @bot.pre_checkout_query_handler(func=lambda query: True)
-def pre_checkout_handler(pre_checkout_query):
+async def pre_checkout_handler(pre_checkout_query):
 	"""
 	Обязательный обработчик для подтверждения возможности оплаты
 	"""
-	bot.answer_pre_checkout_query(pre_checkout_query.id, ok=True)
+	await bot.answer_pre_checkout_query(pre_checkout_query.id, ok=True)
 
 
-def send_full_result(bot, chat_id, uid=None):
+async def send_full_result(bot, chat_id, uid=None):
 	"""
 	Отправляет полный натальный разбор пользователю в виде PDF (без таймаутов).
 	"""
@@ -198,7 +171,7 @@ def send_full_result(bot, chat_id, uid=None):
 
 	# Проверка оплаты
 	if not is_paid(uid):
-		bot.send_message(
+		await bot.send_message(
 			chat_id,
 			"❌ Доступ к полному разбору только после оплаты (100 ★).\n"
 			"Нажмите кнопку «Купить полный разбор» ниже."
@@ -209,7 +182,7 @@ def send_full_result(bot, chat_id, uid=None):
 	chart = data.get("chart")
 
 	if not chart:
-		bot.send_message(
+		await bot.send_message(
 			chat_id,
 			"⚠️ Натальная карта не найдена.\n"
 			"Пожалуйста, рассчитайте карту заново."
@@ -218,43 +191,71 @@ def send_full_result(bot, chat_id, uid=None):
 
 	user_first_name = data.get("user_first_name", "")
 
-	try:
-		bot_info = bot.get_me()
-		bot_username = bot_info.username or "natal_chart_bot"
-	except Exception:
-		bot_username = "natal_chart_bot"
-
-	bot.send_message(
+	await bot.send_message(
 		chat_id,
 		"⏳ Формирую ваш полный натальный разбор.\n"
 		"Это займет около 5–10 минут."
 	)
 
-	threading.Thread(
-		target=_generate_and_send_pdf,
-		args=(bot, chat_id, uid, chart, user_first_name, bot_username),
-		daemon=True
-	).start()
+	spawn(
+		reports.deliver(chat_id, uid, chart, user_first_name, key=data.get("charge_id")),
+		name=f"send-pdf-{uid}"
+	)
 
 
 @bot.message_handler(content_types=['successful_payment'])
-def successful_payment_handler(message):
+@per_chat
+async def successful_payment_handler(message):
 	uid = message.from_user.id
 	chat_id = message.chat.id
 	user_first_name = message.from_user.first_name or ""
 
-	set_paid(uid, message.successful_payment.telegram_payment_charge_id)
+	charge_id = message.successful_payment.telegram_payment_charge_id
+	if not record_payment(uid, message.successful_payment):
+		print(f"Повторный successful_payment {charge_id} от {uid} — заказ уже в работе")
+		return
+	set_paid(uid, charge_id)
+	update_data(uid, {"user_first_name": user_first_name})
 
 	data = get_data(uid)
 	chart = data.get('chart')
 
 	if not chart:
-		bot.send_message(chat_id, "Оплата прошла, но карта не найдена. Начните заново (/start)")
-		set_state(uid, "START")
+		# Заказ остаётся в журнале: сверка доставит PDF, когда карта появится
+		advance(uid, charge_id, RENDERING)
+		advance(uid, charge_id, FAILED, {"error": "chart not found"})
+		await bot.send_message(chat_id, "Оплата прошла, но карта не найдена. Начните заново (/start)")
+		set_state(uid, dialog.START)
 		return
 
-	loading_msg = bot.send_message(
-		chat_id, 
+	# Рендер PDF занимает минуты — не держим очередь апдейтов этого чата
+	spawn(_fulfil_payment(chat_id, uid, chart, user_first_name, charge_id), name=f"fulfil-{uid}")
+
+
+async def _resume_fulfilment(uid, charge_id):
+	"""Довыполняет заказ, найденный сверкой (процесс упал посреди рендера и т.п.)"""
+	data = get_data(uid)
+	chart = data.get('chart')
+	if not chart:
+		if advance(uid, charge_id, RENDERING):
+			advance(uid, charge_id, FAILED, {"error": "chart not found"})
+		return
+	await _fulfil_payment(uid, uid, chart, data.get("user_first_name", ""), charge_id, resumed=True)
+
+
+@traced("request.paid_report")
+async def _fulfil_payment(chat_id, uid, chart, user_first_name, charge_id, resumed=False):
+	set_attributes(uid=uid, charge_id=charge_id, resumed=resumed)
+	if not advance(uid, charge_id, RENDERING):
+		return  # заказ уже доставлен
+
+	if resumed:
+		ok = await reports.deliver(chat_id, uid, chart, user_first_name, key=charge_id)
+		advance(uid, charge_id, DELIVERED if ok else FAILED)
+		return
+
+	loading_msg = await bot.send_message(
+		chat_id,
 		"✅ Оплата прошла успешно! 🎉\n\n"
 		"🔄 *Генерирую ваш PDF-разбор...*\n"
 		"⏳ Это займет несколько секунд\n"
@@ -262,85 +263,160 @@ def successful_payment_handler(message):
 		parse_mode="Markdown"
 	)
 
-	try:
-		bot_info = bot.get_me()
-		bot.edit_message_text(
-			"✅ Оплата прошла успешно! 🎉\n\n"
-			"🔄 *Генерирую ваш PDF-разбор...*\n"
-			"⏳ Формирую натальную карту...",
-			chat_id,
-			loading_msg.message_id,
-			parse_mode="Markdown"
-		)
-		bot_username = bot_info.username or "natal_chart_bot"
+	progress_texts = {
+		"rendering": "✅ Оплата прошла успешно! 🎉\n\n"
+					 "🔄 *Генерирую ваш PDF-разбор...*\n"
+					 "⏳ Формирую натальную карту...",
+		"uploading": "✅ *PDF успешно создан!*\n📤 Отправляю файл...",
+	}
 
-		pdf_path = create_natal_pdf(chart, uid, user_first_name, bot_username)
+	async def show_progress(stage):
+		try:
+			await bot.edit_message_text(progress_texts[stage], chat_id, loading_msg.message_id, parse_mode="Markdown")
+		except Exception as e:
+			print(f"Не удалось обновить статус доставки для {uid}: {e}")
 
-		bot.edit_message_text(
-			"✅ *PDF успешно создан!*\n📤 Отправляю файл...",
-			chat_id,
-			loading_msg.message_id,
-			parse_mode="Markdown"
-		)
+	ok = await reports.deliver(chat_id, uid, chart, user_first_name, progress=show_progress, key=charge_id)
+	advance(uid, charge_id, DELIVERED if ok else FAILED)
+	set_state(uid, dialog.START)
 
-		with open(pdf_path, 'rb') as pdf_file:
-			bot.send_document(
-				chat_id,
-				pdf_file,
-				caption="Ваш полный натальный разбор в PDF\nСкачайте и сохраните ❤️",
-				filename=f"natal_chart_{user_first_name}.pdf"
-			)
 
-		os.remove(pdf_path)
+@bot.message_handler(commands=['houses'])
+@per_chat
+async def house_system(message):
+	"""/houses — текущая система домов, /houses Кох — выбрать другую."""
+	uid = message.from_user.id
+	data = get_data(uid)
+	answer = message.text.partition(' ')[2].strip()
+	if not answer:
+		current = HOUSE_NAMES_RU[resolve(data.get('house_system'))]
+		options = ", ".join(HOUSE_NAMES_RU.values())
+		await bot.reply_to(message, f"Система домов: {current}.\nДоступны: {options}.\nВыбрать: /houses Кох")
+		return
+	try:
+		system = parse_system(answer)
+	except ValueError as e:
+		await bot.reply_to(message, str(e))
+		return
 
+	update = {'house_system': system}
+	chart = data.get('chart')
+	note = ""
+	if chart:
+		# Дома пересчитываются от сохранённых ARMC и наклона — без эфемерид и геокодинга
+		try:
+			update['chart'] = await run_blocking(rehouse, chart, system, pool="chart")
+		except Exception as e:
+			await bot.reply_to(message, f"Ошибка при расчёте: {e}")
+			return
+		if update['chart'].get('house_fallback'):
+			note = f"\nЗа полярным кругом используется {HOUSE_NAMES_RU[update['chart']['house_system']]}."
+	update_data(uid, update)
+	await bot.reply_to(message, f"Система домов: {HOUSE_NAMES_RU[system]}.{note}")
+
+
+@bot.message_handler(commands=['relocate'])
+@per_chat
+async def relocate(message):
+	"""/relocate Город — дома и угловые линии натальной карты в другом месте."""
+	uid = message.from_user.id
+	place = message.text.partition(' ')[2].strip()
+	if not place:
+		await bot.reply_to(message, "Укажите город: /relocate Париж, Франция")
+		return
+	chart = get_data(uid).get('chart')
+	if not chart or chart.get('jd') is None:
+		await bot.reply_to(message, "Сначала рассчитайте натальную карту: /start")
+		return
+	if chart.get('unknown_time'):
+		await bot.reply_to(message, "Для релокации нужно точное время рождения.")
+		return
+	try:
+		reloc = await run_blocking(relocate_to, chart, place, pool="chart")
 	except Exception as e:
-		bot.send_message(chat_id, f"Ошибка при создании PDF: {str(e)}\nНапишите администратору.")
-
-	set_state(uid, "START")
+		await bot.reply_to(message, f"Ошибка при расчёте: {e}")
+		return
+	await bot.send_message(message.chat.id, format_relocation(reloc), parse_mode='HTML')
 
 
 @bot.message_handler(commands=['admin', 'stats'])
 @admin_only
-def admin_stats(message):
+async def admin_stats(message):
 	from datetime import datetime
 
 	text = f"Статистика на {datetime.now().strftime('%Y-%m-%d %H:%M')}\n\n"
 
-	active = get_active_user_count()
-	paid = get_paid_user_count()
+	active = await run_blocking(get_active_user_count)
+	paid = await run_blocking(get_paid_user_count)
 
 	text += f"Активных сессий: {active}\n"
 	text += f"Оплативших полный разбор: {paid}\n"
 
-	bot.reply_to(message, text)
+	m = delivery_stats()
+	if m["requested"]:
+		text += (
+			f"\nДоставка PDF: {m['delivered']:g} из {m['requested']:g}, ошибок {m['failed']:g}\n"
+			f"Рендеров: {m['renders']:g}, повторно по file_id: {m['reused_uploads']:g}, "
+			f"дублей отсечено: {m['deduplicated']:g}, повторов отправки: {m['send_retries']:g}\n"
+		)
+		if m["renders"]:
+			text += (
+				f"Среднее время LLM: {m['llm_avg']:.1f} с, рендера: {m['render_avg']:.1f} с, "
+				f"загрузки: {m['upload_avg']:.1f} с\n"
+			)
+
+	await bot.reply_to(message, text)
+
+
+@bot.message_handler(commands=['metrics'])
+@admin_only
+async def admin_metrics(message):
+	await bot.reply_to(message, metrics.summary()[:4000])
+
+
+@bot.message_handler(commands=['health'])
+@admin_only
+async def admin_health(message):
+	await bot.reply_to(message, warmup.format_report()[:4000])
 
 
 @bot.message_handler(commands=['broadcast'])
 @admin_only
-def broadcast(message):
+async def broadcast(message):
 	if len(message.text.split()) <= 1:
-		bot.reply_to(message, "Напишите: /broadcast Ваш текст для рассылки")
+		await bot.reply_to(message, "Напишите: /broadcast Ваш текст для рассылки")
 		return
 
 	text = message.text.split(maxsplit=1)[1]
-	sent = 0
-	failed = 0
+	job_id = broadcaster.start(text, notify_chat_id=message.chat.id)
+	if job_id is None:
+		await bot.reply_to(message, "Рассылка уже идёт. /broadcast_status — прогресс, /broadcast_cancel — отмена.")
+		return
 
-	bot.reply_to(message, "Рассылка запущена... Это может занять время.")
+	await bot.reply_to(
+		message,
+		f"Рассылка #{job_id} запущена в фоне.\n"
+		"/broadcast_status — прогресс, /broadcast_cancel — отмена."
+	)
 
-	for uid in list(user_states.keys()):
-		try:
-			bot.send_message(uid, text)
-			sent += 1
-		except Exception as e:
-			failed += 1
 
-		time.sleep(0.35)
+@bot.message_handler(commands=['broadcast_status'])
+@admin_only
+async def broadcast_status(message):
+	await bot.reply_to(message, format_stats(broadcaster.stats()))
+
+
+@bot.message_handler(commands=['broadcast_cancel'])
+@admin_only
+async def broadcast_cancel(message):
+	if broadcaster.cancel():
+		await bot.reply_to(message, "Рассылка будет остановлена после текущей пачки сообщений.")
+	else:
+		await bot.reply_to(message, "Сейчас нет активной рассылки.")
 
-	bot.reply_to(message, f"Рассылка завершена.\nОтправлено: {sent}\nНе удалось: {failed}")
 
 @bot.message_handler(commands=['info', 'информация', 'помощь', 'help'])
-def bot_info(message):
+async def bot_info(message):
 	uid = message.from_user.id
 	text = (
 		"🌟 <b>Натальный чарт-бот</b> 🌟\n\n"
@@ -360,7 +436,7 @@ def bot_info(message):
 		"Приятного исследования себя! ✨"
 	)
 	
-	bot.send_message(
+	await bot.send_message(
 		message.chat.id,
 		text,
 		parse_mode='HTML',
@@ -369,12 +445,67 @@ def bot_info(message):
 
 
 # @bot.message_handler(commands=['testpay'])
-# def testpay(message):
+# async def testpay(message):
 # 	uid = message.from_user.id
 # 	set_paid(uid, "test123")
-# 	bot.send_message(message.chat.id, "Тест: оплата прошла")
-# 	send_full_result(bot, message.chat.id, uid)
+# 	await bot.send_message(message.chat.id, "Тест: оплата прошла")
+# 	await send_full_result(bot, message.chat.id, uid)
+
+
+reconciler = FulfillmentReconciler(_resume_fulfilment)
+
+
+_metrics_exporter = None
+
+
+async def start_services(leader: bool = True, owns=None, metrics_port: int = None) -> None:
+	"""Фоновые службы процесса. Рассылки ведёт только ведущий процесс (leader),
+	иначе в кластере они дублировались бы. Сверка платежей идёт в каждом
+	процессе, но только для пользователей owns(uid) — их состояние пишет
+	только этот процесс (кэш сессий states). metrics_port — свой порт
+	экспортера процесса (по умолчанию METRICS_PORT)."""
+	global _metrics_exporter
+	await bot_meta.start()
+	if owns is not None:
+		reconciler.owns = owns
+	if leader:
+		broadcaster.resume_unfinished()
+	if leader or owns is not None:
+		reconciler.start()
+	_metrics_exporter = await metrics.start_exporter(
+		port=metrics.METRICS_PORT if metrics_port is None else metrics_port,
+		routes=warmup.HEALTH_ROUTES
+	)
+	# Ресурсы, эфемериды, рендер и LLM прогреваются в фоне; апдейты ждут warmup.is_ready
+	spawn(warmup.warm_up(), name="warm-up")
+
+
+async def stop_services() -> None:
+	global _metrics_exporter
+	bot_meta.stop()
+	reconciler.stop()
+	if _metrics_exporter is not None:
+		await _metrics_exporter.cleanup()
+		_metrics_exporter = None
+	await wait_background_tasks(timeout=30)
+	shutdown_executors(wait=False)
+
+
+async def main():
+	await start_services()
+	try:
+		if BOT_MODE == "webhook":
+			stop_event = asyncio.Event()
+			loop = asyncio.get_running_loop()
+			for sig in (signal.SIGINT, signal.SIGTERM):
+				loop.add_signal_handler(sig, stop_event.set)
+			await run_webhook(bot, stop_event)
+		else:
+			await warmup.wait_ready()
+			await bot.infinity_polling()
+	finally:
+		await stop_services()
 
 
 if __name__ == "__main__":
-	bot.infinity_polling()
+	asyncio.run(main())
@@ -0,0 +1,59 @@
+"""
+Кэш сведений о самом боте (getMe).
+
+Имя бота нужно в подвале каждого PDF, но запрашивать его у Telegram при
+каждой доставке — лишний сетевой round trip. Данные загружаются один раз
+при старте и тихо обновляются в фоне.
+"""
+
+import asyncio
+import os
+from typing import Optional
+
+from runtime import spawn
+
+
+DEFAULT_USERNAME = "natal_chart_bot"
+REFRESH_INTERVAL = int(os.getenv("BOT_META_REFRESH", str(6 * 3600)))
+STARTUP_ATTEMPTS = 3
+
+
+class BotMetadata:
+	def __init__(self, bot, refresh_interval: float = REFRESH_INTERVAL):
+		self.bot = bot
+		self.refresh_interval = refresh_interval
+		self.user = None
+		self._task: Optional[asyncio.Task] = None
+
+	@property
+	def username(self) -> str:
+		if self.user is not None and self.user.username:
+			return self.user.username
+		return DEFAULT_USERNAME
+
+	async def refresh(self) -> bool:
+		try:
+			self.user = await self.bot.get_me()
+			return True
+		except Exception as e:
+			print(f"[bot_meta] Не удалось получить getMe: {e}")
+			return False
+
+	async def start(self) -> None:
+		"""Загружает данные бота и запускает фоновое обновление."""
+		for attempt in range(1, STARTUP_ATTEMPTS + 1):
+			if await self.refresh():
+				break
+			await asyncio.sleep(attempt)
+		if self._task is None:
+			self._task = spawn(self._refresh_loop(), name="bot-meta-refresh")
+
+	def stop(self) -> None:
+		if self._task is not None:
+			self._task.cancel()
+			self._task = None
+
+	async def _refresh_loop(self) -> None:
+		while True:
+			await asyncio.sleep(self.refresh_interval)
+			await self.refresh()
@@ -0,0 +1,274 @@
+"""
+Фоновая рассылка сообщений всем пользователям бота.
+
+Рассылка идёт фоновой asyncio-задачей и не блокирует обработку апдейтов:
+- глобальный и поканальный token bucket под лимиты Telegram
+  (~30 сообщений/сек на бота, ~1 сообщение/сек в один чат);
+- параллельная отправка пачками через asyncio.gather;
+- обработка 429 Too Many Requests с паузой на retry_after;
+- прогресс сохраняется в таблицу broadcasts, после рестарта рассылка продолжается.
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from telebot.asyncio_helper import ApiTelegramException
+
+from runtime import spawn
+from states import get_all_user_ids, get_db
+
+
+GLOBAL_RATE = float(os.getenv("BROADCAST_GLOBAL_RATE", "25"))
+PER_CHAT_RATE = 1.0
+WORKERS = int(os.getenv("BROADCAST_WORKERS", "8"))
+CHUNK_SIZE = 50
+MAX_ATTEMPTS = 3
+
+
+class TokenBucket:
+	"""Token bucket для event loop: rate токенов в секунду, не больше capacity в запасе."""
+
+	def __init__(self, rate: float, capacity: Optional[float] = None):
+		self.rate = rate
+		self.capacity = capacity if capacity is not None else rate
+		self._tokens = self.capacity
+		self._updated = time.monotonic()
+		self._paused_until = 0.0
+
+	def _refill(self, now: float) -> None:
+		self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+		self._updated = now
+
+	async def acquire(self) -> None:
+		"""Ждёт, пока не появится свободный токен."""
+		while True:
+			now = time.monotonic()
+			self._refill(now)
+			if now >= self._paused_until and self._tokens >= 1:
+				self._tokens -= 1
+				return
+			await asyncio.sleep(max(self._paused_until - now, (1 - self._tokens) / self.rate))
+
+	def pause(self, seconds: float) -> None:
+		"""Останавливает выдачу токенов (ответ 429 с retry_after)."""
+		self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+		self._tokens = 0
+
+
+class RateLimiter:
+	"""Глобальный лимит бота + отдельный лимит на каждый чат.
+
+	Бакет чата живёт, пока не простоит без отправок время полного пополнения
+	(capacity / rate): раньше новый полный бакет пропустил бы сообщение сверх
+	лимита, позже он ничем не отличается от старого. Так словарь бакетов не
+	растёт на всю рассылку, а лимит чата действует между сообщениями.
+	"""
+
+	def __init__(self, global_rate: float = GLOBAL_RATE, per_chat_rate: float = PER_CHAT_RATE):
+		self.global_bucket = TokenBucket(global_rate)
+		self._per_chat_rate = per_chat_rate
+		self._chats: Dict[int, TokenBucket] = {}
+		# Чаты без отправок в работе: chat_id → время release, по возрастанию
+		self._idle: "OrderedDict[int, float]" = OrderedDict()
+
+	async def acquire(self, chat_id: int) -> None:
+		self._idle.pop(chat_id, None)
+		bucket = self._chats.get(chat_id)
+		if bucket is None:
+			bucket = self._chats[chat_id] = TokenBucket(self._per_chat_rate)
+		await bucket.acquire()
+		await self.global_bucket.acquire()
+
+	def release(self, chat_id: int) -> None:
+		"""Отмечает конец отправки в чат и забывает бакеты, которые уже пополнились."""
+		now = time.monotonic()
+		self._idle[chat_id] = now
+		self._idle.move_to_end(chat_id)
+		while self._idle:
+			idle_chat, since = next(iter(self._idle.items()))
+			bucket = self._chats.get(idle_chat)
+			if bucket is not None and now - since < bucket.capacity / bucket.rate:
+				break
+			del self._idle[idle_chat]
+			self._chats.pop(idle_chat, None)
+
+
+# In-memory хранилище рассылок, если БД не настроена
+_in_memory_jobs: Dict[int, Dict[str, Any]] = {}
+
+
+def _create_job(text: str, recipients: List[int], notify_chat_id: Optional[int]) -> int:
+	db = get_db()
+	if db:
+		return db.create_broadcast(text, recipients, notify_chat_id)
+
+	job_id = len(_in_memory_jobs) + 1
+	_in_memory_jobs[job_id] = {
+		"id": job_id, "text": text, "recipients": recipients, "notify_chat_id": notify_chat_id,
+		"status": "running", "position": 0, "sent": 0, "failed": 0, "blocked": 0,
+	}
+	return job_id
+
+
+def _save_job(job: Dict[str, Any]) -> None:
+	db = get_db()
+	fields = {k: job[k] for k in ("status", "position", "sent", "failed", "blocked")}
+	if db:
+		db.update_broadcast(job["id"], **fields)
+	elif job["id"] in _in_memory_jobs:
+		_in_memory_jobs[job["id"]].update(fields)
+
+
+def _unfinished_jobs() -> List[Dict[str, Any]]:
+	db = get_db()
+	if db:
+		return db.get_broadcasts(status="running")
+	return [dict(j) for j in _in_memory_jobs.values() if j["status"] == "running"]
+
+
+class BroadcastEngine:
+	"""Запускает и ведёт одну рассылку за раз фоновой задачей."""
+
+	def __init__(self, bot, limiter: Optional[RateLimiter] = None, workers: int = WORKERS):
+		self.bot = bot
+		self.limiter = limiter or RateLimiter()
+		self.workers = workers
+		self._job: Optional[Dict[str, Any]] = None
+		self._started_at = 0.0
+		self._start_position = 0
+		self._cancel = asyncio.Event()
+
+	def start(self, text: str, notify_chat_id: Optional[int] = None) -> Optional[int]:
+		"""Создаёт рассылку по всем пользователям. Возвращает id или None, если уже идёт другая."""
+		if self.is_running():
+			return None
+		recipients = get_all_user_ids()
+		job_id = _create_job(text, recipients, notify_chat_id)
+		job = {
+			"id": job_id, "text": text, "recipients": recipients, "notify_chat_id": notify_chat_id,
+			"status": "running", "position": 0, "sent": 0, "failed": 0, "blocked": 0,
+		}
+		self._launch(job)
+		return job_id
+
+	def resume_unfinished(self) -> Optional[int]:
+		"""Продолжает рассылку, прерванную рестартом бота."""
+		if self.is_running():
+			return None
+		jobs = _unfinished_jobs()
+		if not jobs:
+			return None
+		self._launch(jobs[-1])
+		return jobs[-1]["id"]
+
+	def cancel(self) -> bool:
+		if not self.is_running():
+			return False
+		self._cancel.set()
+		return True
+
+	def is_running(self) -> bool:
+		return self._job is not None and self._job["status"] == "running"
+
+	def stats(self) -> Optional[Dict[str, Any]]:
+		"""Текущая статистика доставки последней рассылки."""
+		job = self._job
+		if job is None:
+			return None
+		elapsed = time.monotonic() - self._started_at
+		done = job["position"] - self._start_position
+		return {
+			"id": job["id"],
+			"status": job["status"],
+			"total": len(job["recipients"]),
+			"done": job["position"],
+			"sent": job["sent"],
+			"failed": job["failed"],
+			"blocked": job["blocked"],
+			"elapsed": elapsed,
+			"rate": done / elapsed if elapsed > 0 else 0.0,
+		}
+
+	def _launch(self, job: Dict[str, Any]) -> None:
+		self._job = job
+		self._cancel.clear()
+		self._started_at = time.monotonic()
+		self._start_position = job["position"]
+		spawn(self._run(job), name=f"broadcast-{job['id']}")
+
+	async def _send_one(self, chat_id: int, text: str) -> str:
+		try:
+			for attempt in range(1, MAX_ATTEMPTS + 1):
+				await self.limiter.acquire(chat_id)
+				try:
+					await self.bot.send_message(chat_id, text)
+					return "sent"
+				except ApiTelegramException as e:
+					if e.error_code == 429:
+						retry_after = (e.result_json or {}).get("parameters", {}).get("retry_after", 1)
+						self.limiter.global_bucket.pause(float(retry_after))
+					elif e.error_code in (400, 403):
+						# Бот заблокирован пользователем или чат не существует
+						return "blocked"
+				except Exception as e:
+					print(f"[broadcast] Ошибка отправки {chat_id} (попытка {attempt}): {e}")
+			return "failed"
+		finally:
+			self.limiter.release(chat_id)
+
+	async def _run(self, job: Dict[str, Any]) -> None:
+		recipients = job["recipients"]
+		semaphore = asyncio.Semaphore(self.workers)
+
+		async def send(uid: int) -> str:
+			async with semaphore:
+				return await self._send_one(uid, job["text"])
+
+		try:
+			while job["position"] < len(recipients):
+				if self._cancel.is_set():
+					job["status"] = "cancelled"
+					break
+
+				chunk = recipients[job["position"]:job["position"] + CHUNK_SIZE]
+				for result in await asyncio.gather(*(send(uid) for uid in chunk)):
+					job[result] += 1
+				job["position"] += len(chunk)
+				_save_job(job)
+			else:
+				job["status"] = "done"
+		except Exception as e:
+			print(f"[broadcast] Рассылка #{job['id']} прервана: {e}")
+			job["status"] = "failed"
+		finally:
+			_save_job(job)
+
+		if job.get("notify_chat_id"):
+			try:
+				await self.bot.send_message(job["notify_chat_id"], format_stats(self.stats()))
+			except Exception as e:
+				print(f"[broadcast] Не удалось отправить отчёт: {e}")
+
+
+_STATUS_RU = {
+	"running": "идёт",
+	"done": "завершена",
+	"cancelled": "отменена",
+	"failed": "прервана из-за ошибки",
+}
+
+
+def format_stats(stats: Optional[Dict[str, Any]]) -> str:
+	if not stats:
+		return "Рассылок пока не было."
+	return (
+		f"Рассылка #{stats['id']}: {_STATUS_RU.get(stats['status'], stats['status'])}\n"
+		f"Обработано: {stats['done']} из {stats['total']}\n"
+		f"Отправлено: {stats['sent']}\n"
+		f"Заблокировали бота: {stats['blocked']}\n"
+		f"Не удалось: {stats['failed']}\n"
+		f"Скорость: {stats['rate']:.1f} сообщ./сек"
+	)
@@ -5,9 +5,16 @@ from timezonefinder import TimezoneFinder
 from geopy.geocoders import Nominatim
 from geopy.exc import GeocoderTimedOut, GeocoderUnavailable
 
+from bodies import EXTENDED_ASPECTS, aspect_matrix, body_positions
+from houses import chart_houses
+from metrics import timed
+from startup import Lazy
+from tracing import traced
+
 swe.set_ephe_path('./ephe')
 
-tf = TimezoneFinder(in_memory=True)
+# Полигоны часовых поясов грузятся в память при первом расчёте (или прогревом)
+timezone_finder = Lazy("timezonefinder", lambda: TimezoneFinder(in_memory=True))
 
 PLANETS = {
 	'Sun': swe.SUN, 'Moon': swe.MOON, 'Mercury': swe.MERCURY,
@@ -24,6 +31,56 @@ def deg_to_sign(deg):
 	deg_in_sign = deg % 30
 	return f"{deg_in_sign:.1f}° {SIGNS[sign_idx]}"
 
+
+ASPECTS = [
+	('conj',    0),
+	('sextile', 60),
+	('square',  90),
+	('trine',   120),
+	('opp',     180)
+]
+ORB_LIMITS = {'conj': 8, 'opp': 8, 'trine': 6, 'square': 6, 'sextile': 4}
+MAX_ASPECTS = 7
+
+
+@traced("chart.geocode")
+def geocode(place: str) -> tuple:
+	"""Координаты места (lat, lon) через Nominatim."""
+	geolocator = Nominatim(user_agent="natal_chart_bot")
+	try:
+		with timed("chart_stage_seconds", stage="geocode"):
+			loc = geolocator.geocode(place, timeout=10)
+	except (GeocoderTimedOut, GeocoderUnavailable) as e:
+		raise RuntimeError(f"Ошибка геокодирования: {e}. Попробуйте позже или уточните место.")
+	if not loc:
+		raise ValueError(f"Место не найдено: {place}")
+	return loc.latitude, loc.longitude
+
+
+def find_aspects(positions: dict, limit: int = MAX_ASPECTS) -> list:
+	"""Мажорные аспекты между планетами, отсортированные по точности орба (топ-limit)."""
+	aspects = []
+	planet_list = list(positions.keys())
+
+	for i in range(len(planet_list)):
+		for j in range(i + 1, len(planet_list)):
+			p1, p2 = planet_list[i], planet_list[j]
+			diff = min(abs(positions[p1] - positions[p2]), 360 - abs(positions[p1] - positions[p2]))
+
+			for asp_name, asp_angle in ASPECTS:
+				orb = abs(diff - asp_angle)
+				if orb <= ORB_LIMITS.get(asp_name, 5):
+					aspects.append({
+						'p1': p1,
+						'p2': p2,
+						'type': asp_name,
+						'diff': diff,
+						'orb': orb
+					})
+
+	return sorted(aspects, key=lambda x: x['orb'])[:limit]
+
+
 def calculate_full_chart(data: dict) -> dict:
 	"""
 	Рассчитывает натальную карту с учётом часового пояса.
@@ -33,9 +90,14 @@ def calculate_full_chart(data: dict) -> dict:
 			- birth_date: str в формате "ДД.ММ.ГГГГ"
 			- birth_time: str в формате "ЧЧ:ММ" (локальное время)
 			- place: str (название места, например "Киев, Украина")
+			- birth_time_unknown: bool (необязательно)
+			- bodies: набор тел classic | extended | full (необязательно, см. bodies.py)
+			- house_system: система домов (необязательно, см. houses.py)
 	
 	Возвращает:
-		dict с positions, asc, mc, cusps, aspects
+		dict с positions, asc, mc, cusps, aspects, house_system
+		(bodies и extended_aspects — для расширенного набора тел;
+		unknown_time — диапазоны за сутки, если время рождения неизвестно)
 	"""
 	# Парсинг даты и локального времени
 	dt_str = f"{data['birth_date']} {data.get('birth_time', '12:00')}"
@@ -45,25 +107,30 @@ def calculate_full_chart(data: dict) -> dict:
 		raise ValueError(f"Неверный формат даты/времени: {dt_str}. Ожидается ДД.ММ.ГГГГ ЧЧ:ММ") from e
 
 	# Получаем координаты места
-	geolocator = Nominatim(user_agent="natal_chart_bot")
-	try:
-		loc = geolocator.geocode(data['place'], timeout=10)
-		if not loc:
-			raise ValueError(f"Место не найдено: {data['place']}")
-		
-		lat = loc.latitude
-		lon = loc.longitude
-		data['lat'] = lat
-		data['lon'] = lon
-	except (GeocoderTimedOut, GeocoderUnavailable) as e:
-		raise RuntimeError(f"Ошибка геокодирования: {e}. Попробуйте позже или уточните место.")
+	lat, lon = geocode(data['place'])
+	data['lat'] = lat
+	data['lon'] = lon
+
+	chart = calculate_chart_at(dt_local_naive, lat, lon, bodies=data.get('bodies'),
+							   house_system=data.get('house_system'))
+	if data.get('birth_time_unknown'):
+		# Время неизвестно: карта на полдень + что известно наверняка за сутки
+		from unknown_time import day_ranges
+		chart['unknown_time'] = day_ranges(data['birth_date'], lat, lon, data.get('house_system'))
+	return chart
 
-	# Определяем часовой пояс по координатам
-	timezone_str = tf.timezone_at(lat=lat, lng=lon)
-	if not timezone_str:
-		timezone_str = 'UTC'
 
-	tz = pytz.timezone(timezone_str)
+def timezone_for(lat: float, lon: float):
+	"""Часовой пояс pytz по координатам (UTC, если пояс не найден)."""
+	return pytz.timezone(timezone_finder.get().timezone_at(lat=lat, lng=lon) or 'UTC')
+
+
+@traced("chart.calculate")
+def calculate_chart_at(dt_local_naive: datetime, lat: float, lon: float, bodies: str = None,
+					   house_system: str = None) -> dict:
+	"""Натальная карта для локального времени рождения в точке (lat, lon) — без геокодинга."""
+	# Определяем часовой пояс по координатам
+	tz = timezone_for(lat, lon)
 
 	# Делаем локальное время aware и конвертируем в UTC
 	dt_local = tz.localize(dt_local_naive, is_dst=None)  # is_dst=None → использует исторические правила
@@ -74,58 +141,50 @@ def calculate_full_chart(data: dict) -> dict:
 	# Юлианский день в UTC
 	jd = swe.utc_to_jd(year, month, day, hour, minute, 0, swe.GREG_CAL)[1]
 
-	# Позиции планет (тропические, геоцентрические)
-	positions = {}
-	for name, pid in PLANETS.items():
-		try:
-			xx = swe.calc_ut(jd, pid)[0]
-			positions[name] = xx[0] % 360
-		except Exception as e:
-			print(f"Ошибка расчёта {name}: {e}")
-			positions[name] = 0.0
-
-	# Дома Placidus + Asc + MC
-	try:
-		cusps, ascmc = swe.houses(jd, lat, lon, b'P')
-		asc = ascmc[0] % 360
-		mc  = ascmc[1] % 360
-	except Exception as e:
-		raise RuntimeError(f"Ошибка расчёта домов: {e}")
-
-	# Major аспекты (MVP)
-	aspects = []
-	orb_limits = {'conj': 8, 'opp': 8, 'trine': 6, 'square': 6, 'sextile': 4}
-	planet_list = list(positions.keys())
-
-	for i in range(len(planet_list)):
-		for j in range(i + 1, len(planet_list)):
-			p1, p2 = planet_list[i], planet_list[j]
-			diff = min(abs(positions[p1] - positions[p2]), 360 - abs(positions[p1] - positions[p2]))
-
-			for asp_name, asp_angle in [
-				('conj',    0),
-				('sextile', 60),
-				('square',  90),
-				('trine',   120),
-				('opp',     180)
-			]:
-				orb = abs(diff - asp_angle)
-				if orb <= orb_limits.get(asp_name, 5):
-					aspects.append({
-						'p1': p1,
-						'p2': p2,
-						'type': asp_name,
-						'diff': diff,
-						'orb': orb
-					})
+	return chart_at_jd(jd, lat, lon, bodies, house_system)
 
-	# Сортируем по точности орба и берём топ-7
-	aspects = sorted(aspects, key=lambda x: x['orb'])[:7]
 
-	return {
+def chart_at_jd(jd: float, lat: float, lon: float, bodies: str = None, house_system: str = None) -> dict:
+	"""Карта на момент jd (UT) в точке (lat, lon): планеты, дома, аспекты.
+	Общая часть натальной карты, возвращений и прогрессий."""
+	# Позиции планет (тропические, геоцентрические)
+	positions = {}
+	with timed("chart_stage_seconds", stage="ephemeris"):
+		for name, pid in PLANETS.items():
+			try:
+				xx = swe.calc_ut(jd, pid)[0]
+				positions[name] = xx[0] % 360
+			except Exception as e:
+				print(f"Ошибка расчёта {name}: {e}")
+				positions[name] = 0.0
+
+	# Дома выбранной системы (за полярным кругом — запасная) + Asc + MC
+	with timed("chart_stage_seconds", stage="houses"):
+		houses = chart_houses(jd, lat, lon, house_system)
+
+	# Major аспекты (MVP), топ-7 по точности орба
+	aspects = find_aspects(positions)
+
+	chart = {
 		'positions': positions,
-		'asc': asc,
-		'mc': mc,
-		'cusps': cusps[:13],
+		'asc': houses['asc'],
+		'mc': houses['mc'],
+		'cusps': houses['cusps'],
 		'aspects': aspects,
+		'lat': lat,
+		'lon': lon,
+		'jd': jd,
+		'house_system': houses['system'],
+		'house_fallback': houses['fallback'],
+		'armc': houses['armc'],
+		'obliquity': houses['obliquity'],
 	}
+
+	# Узлы, Лилит, Хирон, астероиды + все аспекты, включая малые
+	with timed("chart_stage_seconds", stage="bodies"):
+		extra = body_positions(jd, bodies)
+	if extra:
+		chart['bodies'] = extra
+		with timed("chart_stage_seconds", stage="aspect_matrix"):
+			chart['extended_aspects'] = aspect_matrix(dict(positions, **extra), EXTENDED_ASPECTS)
+	return chart
@@ -0,0 +1,271 @@
+"""
+Горизонтальное масштабирование webhook-режима на несколько процессов.
+
+Один процесс-маршрутизатор принимает апдейты (тот же WebhookServer: секрет,
+дедупликация, 503 при переполнении) и раскладывает их по N процессам-
+воркерам согласованным хешированием telegram_id. Все апдейты пользователя
+попадают в один воркер, поэтому:
+- порядок сообщений в диалоге сохраняется;
+- воркер держит кэш сессий в памяти (states.SESSION_CACHE_SIZE) и не
+  перечитывает состояние из БД на каждый апдейт.
+
+Общее между воркерами — только SQLite (DB_PATH) и лимиты
+(RATE_LIMIT_BACKEND=sqlite). Метрики у каждого процесса свои: маршрутизатор
+отдаёт их на METRICS_PORT, воркер i — на METRICS_PORT + 1 + i.
+Рассылки ведёт воркер 0; сверку платежей —
+каждый воркер для своих пользователей, так что состояние пользователя
+пишет только его воркер и кэши сессий не затирают друг друга.
+Внутри воркера расчёт карт и рендер PDF идут в отдельных пулах runtime
+(CHART_POOL / RENDER_POOL = thread | process), запросы к LLM — в event loop.
+
+Запуск:
+
+	CLUSTER_WORKERS=4 python -m cluster
+"""
+
+import asyncio
+import bisect
+import functools
+import hashlib
+import multiprocessing
+import os
+import queue
+import signal
+from typing import Any, Dict, List, Optional
+
+import metrics
+import warmup
+from webhook import WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_URL, WebhookServer
+
+
+CLUSTER_WORKERS = int(os.getenv("CLUSTER_WORKERS", "2"))
+WORKER_QUEUE_SIZE = int(os.getenv("CLUSTER_QUEUE_SIZE", "500"))
+WORKER_CONCURRENCY = int(os.getenv("CLUSTER_WORKER_CONCURRENCY", "32"))
+SESSION_CACHE_SIZE = int(os.getenv("CLUSTER_SESSION_CACHE", "10000"))
+VNODES = 64
+JOIN_TIMEOUT = 60
+SUPERVISE_INTERVAL = 1.0  # с, как часто маршрутизатор проверяет воркеров
+RESTART_BACKOFF = 5.0  # с, не чаще одного перезапуска воркера
+
+# Разделы апдейта, из которых берётся отправитель
+_UPDATE_KINDS = ("message", "edited_message", "callback_query", "pre_checkout_query", "shipping_query", "my_chat_member")
+
+
+def _hash(key: str) -> int:
+	return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+	"""Согласованное хеширование: при изменении числа воркеров переезжает
+	только ~1/N пользователей, а не все."""
+
+	def __init__(self, nodes: List[int], vnodes: int = VNODES):
+		points = sorted((_hash(f"{node}:{i}"), node) for node in nodes for i in range(vnodes))
+		self._keys = [point for point, _ in points]
+		self._nodes = [node for _, node in points]
+
+	def node_for(self, key: int) -> int:
+		i = bisect.bisect(self._keys, _hash(str(key))) % len(self._keys)
+		return self._nodes[i]
+
+
+def update_user_id(payload: Dict[str, Any]) -> int:
+	"""telegram_id отправителя апдейта; апдейты без отправителя идут по update_id."""
+	for kind in _UPDATE_KINDS:
+		section = payload.get(kind)
+		if section:
+			sender = section.get("from") or section.get("chat") or {}
+			if "id" in sender:
+				return int(sender["id"])
+	return int(payload["update_id"])
+
+
+class ClusterRouter(WebhookServer):
+	"""WebhookServer, который не обрабатывает апдейты сам, а передаёт их воркерам."""
+
+	def __init__(self, workers: int = CLUSTER_WORKERS, queue_size: int = WORKER_QUEUE_SIZE,
+				 path: str = WEBHOOK_PATH, secret: str = WEBHOOK_SECRET, env: Optional[Dict[str, str]] = None):
+		super().__init__(bot=None, path=path, secret=secret, queue_size=1, workers=0)
+		self.ring = HashRing(list(range(workers)))
+		self.env = env or {}
+		self._ctx = multiprocessing.get_context("spawn")
+		self.queues = [self._ctx.Queue(maxsize=queue_size) for _ in range(workers)]
+		# Воркер выставляет своё событие, когда прогрев пройден (warmup.wait_ready)
+		self.warm = [self._ctx.Event() for _ in range(workers)]
+		self.processes = [self._new_process(i) for i in range(workers)]
+		# Апдейты и /readyz — только когда все воркеры живы и прогреты
+		self.ready = self._workers_ready
+		self.stats["routed"] = [0] * workers
+		self.stats["restarts"] = [0] * workers
+		self._started_at = [0.0] * workers
+		self._supervisor: Optional[asyncio.Task] = None
+
+	def _new_process(self, index: int) -> multiprocessing.Process:
+		# Очередь и событие прогрева те же: перезапущенный воркер дочитывает очередь упавшего
+		return self._ctx.Process(
+			target=worker_main,
+			args=(index, len(self.queues), self.queues[index], self.warm[index], self.env),
+			name=f"bot-worker-{index}",
+			daemon=False,
+		)
+
+	def _start_worker(self, index: int) -> None:
+		self._started_at[index] = asyncio.get_running_loop().time()
+		self.processes[index].start()
+
+	async def _supervise(self) -> None:
+		"""Перезапускает упавших воркеров (OOM, сбой в C-расширении): иначе их доля
+		пользователей и ready() остались бы недоступны до рестарта сервиса."""
+		loop = asyncio.get_running_loop()
+		while True:
+			await asyncio.sleep(SUPERVISE_INTERVAL)
+			for index, process in enumerate(self.processes):
+				if process.is_alive() or loop.time() - self._started_at[index] < RESTART_BACKOFF:
+					continue
+				print(f"[cluster] {process.name} завершился (код {process.exitcode}), перезапускаю")
+				self.warm[index].clear()
+				self.processes[index] = self._new_process(index)
+				self._start_worker(index)
+				self.stats["restarts"][index] += 1
+
+	def enqueue(self, payload: dict) -> bool:
+		index = self.ring.node_for(update_user_id(payload))
+		try:
+			self.queues[index].put_nowait(payload)
+		except queue.Full:
+			return False
+		self.stats["routed"][index] += 1
+		return True
+
+	def queue_depth(self) -> int:
+		try:
+			return sum(q.qsize() for q in self.queues)
+		except NotImplementedError:  # macOS: qsize у multiprocessing.Queue нет
+			return 0
+
+	def _workers_ready(self) -> bool:
+		return all(p.is_alive() and warm.is_set() for p, warm in zip(self.processes, self.warm))
+
+	def readiness(self) -> dict:
+		# Пока хоть один воркер не прогрет, маршрутизатор отвечает 503 и Telegram повторит доставку
+		return {
+			"ready": self._accepting and self.ready(),
+			"workers": [p.is_alive() for p in self.processes],
+			"warm": [warm.is_set() for warm in self.warm],
+			"routed": self.stats["routed"],
+			"restarts": self.stats["restarts"],
+		}
+
+	async def start(self, *args, **kwargs) -> None:
+		for index in range(len(self.processes)):
+			self._start_worker(index)
+		await super().start(*args, **kwargs)
+		self._supervisor = asyncio.create_task(self._supervise(), name="cluster-supervisor")
+
+	async def stop(self, drain_timeout: float = JOIN_TIMEOUT) -> None:
+		if self._supervisor is not None:
+			self._supervisor.cancel()
+			await asyncio.gather(self._supervisor, return_exceptions=True)
+			self._supervisor = None
+		await super().stop(drain_timeout=0)
+		loop = asyncio.get_running_loop()
+		# None — сигнал воркеру дообработать очередь и завершиться; очередь может быть полной
+		for q, process in zip(self.queues, self.processes):
+			try:
+				await loop.run_in_executor(None, functools.partial(q.put, None, timeout=drain_timeout))
+			except queue.Full:
+				print(f"[cluster] Очередь {process.name} переполнена, сигнал остановки не доставлен")
+		for process in self.processes:
+			await loop.run_in_executor(None, process.join, drain_timeout)
+			if process.is_alive():
+				print(f"[cluster] {process.name} не завершился за {drain_timeout} с, останавливаю")
+				process.terminate()
+
+
+def worker_main(index: int, workers: int, updates: "multiprocessing.Queue", warm, env: Dict[str, str]) -> None:
+	"""Точка входа процесса-воркера."""
+	os.environ.update(env)
+	os.environ["WORKER_INDEX"] = str(index)
+	os.environ["CLUSTER_WORKERS"] = str(workers)
+	os.environ.setdefault("SESSION_CACHE_SIZE", str(SESSION_CACHE_SIZE))
+	signal.signal(signal.SIGINT, signal.SIG_IGN)  # останавливает маршрутизатор
+	asyncio.run(_worker_loop(index, workers, updates, warm))
+
+
+async def _worker_loop(index: int, workers: int, updates: "multiprocessing.Queue", warm) -> None:
+	# bot импортируется здесь: в каждом процессе свои соединения, пулы и кэши
+	import bot as bot_module
+	import states
+	from telebot.types import Update
+
+	# То же кольцо, что у маршрутизатора: воркер кэширует и довыполняет только своих пользователей
+	ring = HashRing(list(range(workers)))
+	owns = lambda uid: ring.node_for(uid) == index
+	states.set_cache_owner(owns)
+	metrics_port = metrics.METRICS_PORT + 1 + index if metrics.METRICS_PORT else 0
+	await bot_module.start_services(leader=index == 0, owns=owns, metrics_port=metrics_port)
+	await warmup.wait_ready()
+	warm.set()
+	loop = asyncio.get_running_loop()
+	semaphore = asyncio.Semaphore(WORKER_CONCURRENCY)
+	tasks = set()
+
+	async def process(payload):
+		try:
+			await bot_module.bot.process_new_updates([Update.de_json(payload)])
+		except Exception as e:
+			print(f"[cluster] Воркер {index}: ошибка апдейта {payload.get('update_id')}: {e}")
+		finally:
+			semaphore.release()
+
+	try:
+		while True:
+			payload = await loop.run_in_executor(None, updates.get)
+			if payload is None:
+				break
+			await semaphore.acquire()
+			task = loop.create_task(process(payload))
+			tasks.add(task)
+			task.add_done_callback(tasks.discard)
+		if tasks:
+			await asyncio.wait(set(tasks))
+	finally:
+		await bot_module.stop_services()
+
+
+async def run_cluster(workers: int = CLUSTER_WORKERS, stop_event: Optional[asyncio.Event] = None) -> None:
+	router = ClusterRouter(workers=workers)
+	await router.start()
+	exporter = await metrics.start_exporter()
+	if WEBHOOK_URL:
+		# Регистрация webhook — единственный вызов Bot API из маршрутизатора
+		from telebot.async_telebot import AsyncTeleBot
+		api = AsyncTeleBot(os.environ["TOKEN"])
+		await api.set_webhook(
+			url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+			secret_token=WEBHOOK_SECRET or None,
+			max_connections=100,
+		)
+		await api.close_session()
+	print(f"[cluster] Маршрутизатор запущен, воркеров: {workers}")
+	try:
+		await (stop_event or asyncio.Event()).wait()
+	finally:
+		await router.stop()
+		if exporter is not None:
+			await exporter.cleanup()
+		print(f"[cluster] Остановлен, распределение апдейтов: {router.stats['routed']}")
+
+
+async def main() -> None:
+	stop_event = asyncio.Event()
+	loop = asyncio.get_running_loop()
+	for sig in (signal.SIGINT, signal.SIGTERM):
+		loop.add_signal_handler(sig, stop_event.set)
+	await run_cluster(stop_event=stop_event)
+
+
+if __name__ == "__main__":
+	from dotenv import load_dotenv
+	load_dotenv()
+	asyncio.run(main())
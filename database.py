@@ -3,7 +3,9 @@ from __future__ import annotations
 import os
 import sqlite3
 import json
-from typing import Optional, Dict, Any
+import threading
+import time
+from typing import Optional, Dict, Any, List
 from dotenv import load_dotenv
 
 from cryptography.fernet import Fernet
@@ -13,12 +15,14 @@ from cryptography.hazmat.backends import default_backend
 import base64
 from pathlib import Path
 
-from states import ensure_user_exists
+from metrics import histogram
 
 load_dotenv()
 
 DB_FERNET_KEY = os.getenv("DB_FERNET_KEY")
 
+_commit_seconds = histogram("db_commit_seconds", "Длительность COMMIT в SQLite")
+
 def derive_fernet_key_from_passphrase(passphrase: str, salt: bytes = b"natalbot-salt") -> bytes:
 	kdf = PBKDF2HMAC(
 		algorithm=hashes.SHA256(),
@@ -56,10 +60,12 @@ class EncryptedDB:
 		if not db_path.parent.exists():
 			db_path.parent.mkdir(parents=True, exist_ok=True)
 
-		# Create connection
+		# Create connection (shared between handler threads, guarded by _lock)
+		self._lock = threading.RLock()
 		self._conn = self._connect()
 
 	def init_db(self) -> None:
+		self._migrate()
 		schema_path = os.path.join(os.path.dirname(__file__), "db", "schema.sql")
 		if os.path.exists(schema_path):
 			with open(schema_path, "r", encoding="utf-8") as f:
@@ -79,6 +85,17 @@ class EncryptedDB:
 			)
 		self._conn.commit()
 
+	def _migrate(self) -> None:
+		"""Adds columns introduced after a table was first created (CREATE IF NOT EXISTS won't)."""
+		columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(payments)")}
+		if columns and "charge_id" not in columns:
+			self._conn.execute("ALTER TABLE payments ADD COLUMN charge_id TEXT")
+
+	def _commit(self, operation: str) -> None:
+		started = time.perf_counter()
+		self._conn.commit()
+		_commit_seconds.observe(time.perf_counter() - started, op=operation)
+
 	def _encrypt(self, plaintext_bytes: bytes) -> bytes:
 		return self._fernet.encrypt(plaintext_bytes)
 
@@ -91,7 +108,7 @@ class EncryptedDB:
 			return None
 	
 	def _connect(self):
-		conn = sqlite3.connect(self._path)
+		conn = sqlite3.connect(self._path, check_same_thread=False)
 		conn.row_factory = sqlite3.Row
 		conn.execute("PRAGMA journal_mode=WAL;")
 		return conn
@@ -102,17 +119,19 @@ class EncryptedDB:
 			payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
 			payload = self._encrypt(payload)
 
-		cur = self._conn.cursor()
-		cur.execute(
-			"INSERT INTO user_states(telegram_id, state, data, created_at, updated_at) VALUES (?, ?, ?, datetime('now'), datetime('now'))"
-			" ON CONFLICT(telegram_id) DO UPDATE SET state=excluded.state, data=excluded.data, updated_at=datetime('now')",
-			(telegram_id, state, payload),
-		)
-		self._conn.commit()
+		with self._lock:
+			cur = self._conn.cursor()
+			cur.execute(
+				"INSERT INTO user_states(telegram_id, state, data, created_at, updated_at) VALUES (?, ?, ?, datetime('now'), datetime('now'))"
+				" ON CONFLICT(telegram_id) DO UPDATE SET state=excluded.state, data=excluded.data, updated_at=datetime('now')",
+				(telegram_id, state, payload),
+			)
+			self._commit("set_state")
 
 	def get_state(self, telegram_id: int) -> Optional[Dict[str, Any]]:
-		cur = self._conn.execute("SELECT state, data FROM user_states WHERE telegram_id = ?", (telegram_id,))
-		row = cur.fetchone()
+		with self._lock:
+			cur = self._conn.execute("SELECT state, data FROM user_states WHERE telegram_id = ?", (telegram_id,))
+			row = cur.fetchone()
 		if not row:
 			return None
 		state = row["state"]
@@ -126,6 +145,103 @@ class EncryptedDB:
 				data = None
 		return {"state": state, "data": data}
 
+	def list_user_ids(self) -> List[int]:
+		with self._lock:
+			return [row[0] for row in self._conn.execute("SELECT telegram_id FROM user_states").fetchall()]
+
+	def ensure_user_exists(self, telegram_id: int) -> None:
+		with self._lock:
+			self._conn.execute("INSERT OR IGNORE INTO users (telegram_id) VALUES (?)", (telegram_id,))
+			self._commit("ensure_user_exists")
+
+	def create_broadcast(self, text: str, recipients: List[int], notify_chat_id: Optional[int] = None) -> int:
+		with self._lock:
+			cur = self._conn.execute(
+				"INSERT INTO broadcasts(text, recipients, notify_chat_id, status) VALUES (?, ?, ?, 'running')",
+				(text, json.dumps(recipients), notify_chat_id),
+			)
+			self._commit("create_broadcast")
+			return cur.lastrowid
+
+	def update_broadcast(self, broadcast_id: int, **fields: Any) -> None:
+		"""Update progress columns (status, position, sent, failed, blocked) of a broadcast."""
+		allowed = {"status", "position", "sent", "failed", "blocked"}
+		cols = [k for k in fields if k in allowed]
+		if not cols:
+			return
+		assignments = ", ".join(f"{c} = ?" for c in cols)
+		with self._lock:
+			self._conn.execute(
+				f"UPDATE broadcasts SET {assignments}, updated_at = datetime('now') WHERE id = ?",
+				(*[fields[c] for c in cols], broadcast_id),
+			)
+			self._commit("update_broadcast")
+
+	def get_broadcasts(self, status: Optional[str] = None) -> List[Dict[str, Any]]:
+		query = "SELECT * FROM broadcasts"
+		params: tuple = ()
+		if status is not None:
+			query += " WHERE status = ?"
+			params = (status,)
+		with self._lock:
+			rows = self._conn.execute(query + " ORDER BY id", params).fetchall()
+		result = []
+		for row in rows:
+			item = dict(row)
+			item["recipients"] = json.loads(item["recipients"] or "[]")
+			result.append(item)
+		return result
+
+	def append_payment_event(self, telegram_id: int, charge_id: str, status: str,
+							 payload: Optional[Dict[str, Any]] = None,
+							 provider_invoice_id: Optional[str] = None) -> None:
+		blob = None
+		if payload is not None:
+			blob = self._encrypt(json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+		with self._lock:
+			self._conn.execute(
+				"INSERT INTO payments(telegram_id, charge_id, provider_invoice_id, status, payload) VALUES (?, ?, ?, ?, ?)",
+				(telegram_id, charge_id, provider_invoice_id, status, blob),
+			)
+			self._commit("append_payment_event")
+
+	def get_payment_status(self, charge_id: str) -> Optional[str]:
+		with self._lock:
+			row = self._conn.execute(
+				"SELECT status FROM payments WHERE charge_id = ? ORDER BY id DESC LIMIT 1",
+				(charge_id,),
+			).fetchone()
+		return row["status"] if row else None
+
+	def get_latest_payment(self, telegram_id: int) -> Optional[Dict[str, Any]]:
+		with self._lock:
+			row = self._conn.execute(
+				"SELECT telegram_id, charge_id, status, created_at FROM payments"
+				" WHERE telegram_id = ? ORDER BY id DESC LIMIT 1",
+				(telegram_id,),
+			).fetchone()
+		return dict(row) if row else None
+
+	def get_open_payments(self, statuses: List[str]) -> List[Dict[str, Any]]:
+		"""Charges whose latest event is in statuses, with event age (seconds) and render attempts."""
+		placeholders = ", ".join("?" for _ in statuses)
+		with self._lock:
+			rows = self._conn.execute(
+				"SELECT p.telegram_id, p.charge_id, p.status, last.attempts,"
+				" CAST((julianday('now') - julianday(p.created_at)) * 86400 AS INTEGER) AS age"
+				" FROM payments p JOIN ("
+				"   SELECT charge_id, MAX(id) AS max_id, SUM(status = 'rendering') AS attempts"
+				"   FROM payments GROUP BY charge_id"
+				" ) last ON p.id = last.max_id"
+				f" WHERE p.status IN ({placeholders})",
+				tuple(statuses),
+			).fetchall()
+		return [dict(row) for row in rows]
+
+	def count_paid_users(self) -> int:
+		with self._lock:
+			return self._conn.execute("SELECT COUNT(DISTINCT telegram_id) FROM payments").fetchone()[0]
+
 	def migrate_from_memory(self, memory_states: Dict[int, Dict[str, Any]]) -> int:
 		"""Migrate an in-memory dict mapping telegram_id -> {state, data}.
 
@@ -161,6 +277,6 @@ if __name__ == "__main__":
 	else:
 		db = EncryptedDB("db/test_data.sqlite", fernet_key=key)
 		db.init_db()
-		ensure_user_exists(db, 12345)
+		db.ensure_user_exists(12345)
 		db.set_state(12345, "TEST", {"hello": "world"})
 		db.close()
@@ -29,12 +29,34 @@ CREATE TABLE IF NOT EXISTS charts (
     FOREIGN KEY(telegram_id) REFERENCES users(telegram_id) ON DELETE CASCADE
 );
 
--- Payments / invoices table (minimal)
+-- Payments ledger (append-only: one row per fulfillment event of a charge)
+-- status: paid -> rendering -> delivered (or failed -> rendering again)
 CREATE TABLE IF NOT EXISTS payments (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     telegram_id INTEGER NOT NULL,
     provider_invoice_id TEXT,
     status TEXT,
-    payload BLOB,
-    created_at TEXT DEFAULT (datetime('now'))
+    payload BLOB, -- encrypted JSON
+    created_at TEXT DEFAULT (datetime('now')),
+    charge_id TEXT -- telegram_payment_charge_id
+);
+
+CREATE INDEX IF NOT EXISTS idx_payments_telegram_id ON payments(telegram_id, id);
+CREATE INDEX IF NOT EXISTS idx_payments_charge_id ON payments(charge_id, id);
+
+-- Broadcast jobs (progress is persisted so a restart resumes the mailing)
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    text TEXT NOT NULL,
+    recipients TEXT NOT NULL, -- JSON array of telegram_id snapshot
+    notify_chat_id INTEGER,
+    status TEXT NOT NULL, -- running / done / cancelled
+    position INTEGER DEFAULT 0,
+    sent INTEGER DEFAULT 0,
+    failed INTEGER DEFAULT 0,
+    blocked INTEGER DEFAULT 0,
+    created_at TEXT DEFAULT (datetime('now')),
+    updated_at TEXT DEFAULT (datetime('now'))
 );
+
+CREATE INDEX IF NOT EXISTS idx_broadcasts_status ON broadcasts(status);
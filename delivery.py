@@ -0,0 +1,235 @@
+"""
+Доставка PDF-разбора пользователю.
+
+Единая точка для всех сценариев (сразу после оплаты, повторная выдача,
+send_full_result):
+- тексты LLM запрашиваются прямо в event loop (aiohttp), рендер — в пуле
+  'render', имя бота из кэша BotMetadata;
+- идемпотентность по charge_id и карте: повторный successful_payment или
+  двойное нажатие присоединяются к уже идущей доставке, а не рендерят PDF заново;
+- повторная выдача отправляет сохранённый file_id без рендера и загрузки,
+  пока карта не изменилась (пересчёт, /houses) — иначе PDF рендерится заново;
+- повторы отправки с экспоненциальной задержкой и jitter (asyncio.sleep,
+  потоки не блокируются), 429 ждёт retry_after;
+- счётчики (delivery_events) и тайминги этапов (delivery_stage_seconds)
+  в общем реестре metrics.
+"""
+
+import asyncio
+import hashlib
+import importlib
+import json
+import os
+import random
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+
+from telebot.asyncio_helper import ApiTelegramException
+
+from love_ai import generate_all_sections
+from metrics import counter, histogram, timed
+from ratelimit import limiter
+from runtime import run_blocking
+from startup import Lazy
+from states import get_data, update_data
+from tracing import set_attributes, span
+
+
+CAPTION = "Ваш полный натальный разбор в PDF\nСкачайте и сохраните ❤️"
+SEND_ATTEMPTS = 4
+BACKOFF_BASE = 2.0
+BACKOFF_CAP = 60.0
+SEND_TIMEOUT = 90
+SEND_TIMEOUT_STEP = 30
+FILE_ID_CACHE_SIZE = 10000
+
+ProgressCallback = Callable[[str], Awaitable[None]]
+
+# ReportLab импортируется при первом рендере или фоновым прогревом, не при старте бота
+_pdf_generator = Lazy("reportlab", lambda: importlib.import_module("pdf_generator"))
+
+EVENTS = ("requested", "delivered", "failed", "renders", "reused_uploads", "deduplicated", "send_attempts", "send_retries")
+_events = counter("delivery_events", "События доставки PDF")
+_bytes_uploaded = counter("delivery_bytes_uploaded", "Объём загруженных PDF, байт")
+_stage_seconds = histogram("delivery_stage_seconds", "Этапы доставки PDF: llm, render, upload")
+_cache_lookups = counter("cache_lookups", "Обращения к кэшам: cache, result=hit|miss")
+
+
+def stats() -> Dict[str, float]:
+	"""Счётчики доставки и среднее время этапов (с) — для /stats."""
+	result = {event: _events.value(event=event) for event in EVENTS}
+	for stage in ("llm", "render", "upload"):
+		count, total = _stage_seconds.stats(stage=stage)
+		result[f"{stage}_avg"] = total / count if count else 0.0
+	return result
+
+
+def backoff_delay(attempt: int, base: float = BACKOFF_BASE, cap: float = BACKOFF_CAP) -> float:
+	"""Full jitter: случайная пауза от 0 до min(cap, base * 2^(attempt-1))."""
+	return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+def _retry_after(e: Exception) -> Optional[float]:
+	if isinstance(e, ApiTelegramException) and e.error_code == 429:
+		return float((e.result_json or {}).get("parameters", {}).get("retry_after", 1))
+	return None
+
+
+def _is_retryable(e: Exception) -> bool:
+	"""Сетевые ошибки, таймауты, 429 и 5xx повторяем; прочие ответы Bot API — нет."""
+	if isinstance(e, ApiTelegramException):
+		return e.error_code == 429 or e.error_code >= 500
+	return True
+
+
+def report_key(charge_id: str, chart: dict) -> str:
+	"""Ключ доставки: платёж + отпечаток карты. После пересчёта карты или смены
+	системы домов ключ другой, и сохранённый file_id старого PDF не используется."""
+	digest = hashlib.blake2b(
+		json.dumps(chart, sort_keys=True, ensure_ascii=False, default=str).encode(), digest_size=8
+	).hexdigest()
+	return f"{charge_id}:{digest}"
+
+
+class ReportDelivery:
+	def __init__(self, bot, metadata, attempts: int = SEND_ATTEMPTS):
+		self.bot = bot
+		self.metadata = metadata
+		self.attempts = attempts
+		self._inflight: Dict[str, asyncio.Task] = {}
+		self._file_ids: "OrderedDict[str, str]" = OrderedDict()
+
+	async def deliver(self, chat_id: int, uid: int, chart: dict, user_first_name: str = "",
+					  caption: str = CAPTION, progress: Optional[ProgressCallback] = None,
+					  key: Optional[str] = None) -> bool:
+		"""Рендерит и отправляет PDF. Возвращает True, если документ доставлен.
+
+		key — ключ идемпотентности (charge_id платежа). Пока доставка той же
+		карты с тем же ключом идёт, повторные вызовы ждут её результат; после
+		успеха документ переотправляется по file_id, пока карта не изменится.
+
+		progress вызывается со стадиями 'rendering' и 'uploading' — для
+		обновления сообщения о ходе генерации.
+		"""
+		if key is None:
+			return await self._deliver(chat_id, uid, chart, user_first_name, caption, progress, None)
+
+		key = report_key(key, chart)
+		task = self._inflight.get(key)
+		if task is None:
+			task = asyncio.get_running_loop().create_task(
+				self._deliver(chat_id, uid, chart, user_first_name, caption, progress, key)
+			)
+			self._inflight[key] = task
+			task.add_done_callback(lambda _: self._inflight.pop(key, None))
+		else:
+			_events.inc(event="deduplicated")
+		return await asyncio.shield(task)
+
+	def _cached_file_id(self, uid: int, key: Optional[str]) -> Optional[str]:
+		if key is None:
+			return None
+		file_id = self._file_ids.get(key)
+		if file_id is None:
+			data = get_data(uid)
+			if data.get("report_key") == key:
+				file_id = data.get("report_file_id")
+		_cache_lookups.inc(cache="report_file_id", result="hit" if file_id else "miss")
+		return file_id
+
+	def _remember_file_id(self, uid: int, key: Optional[str], file_id: Optional[str]) -> None:
+		if key is None or not file_id:
+			return
+		self._file_ids[key] = file_id
+		self._file_ids.move_to_end(key)
+		if len(self._file_ids) > FILE_ID_CACHE_SIZE:
+			self._file_ids.popitem(last=False)
+		update_data(uid, {"report_key": key, "report_file_id": file_id})
+
+	@span("delivery")
+	async def _deliver(self, chat_id: int, uid: int, chart: dict, user_first_name: str,
+					   caption: str, progress: Optional[ProgressCallback], key: Optional[str]) -> bool:
+		set_attributes(uid=uid, key=key)
+		_events.inc(event="requested")
+
+		file_id = self._cached_file_id(uid, key)
+		if file_id:
+			try:
+				await self._send_with_retries(chat_id, file_id, caption, None)
+				_events.inc(event="reused_uploads")
+				_events.inc(event="delivered")
+				return True
+			except Exception as e:
+				# file_id мог протухнуть — рендерим заново
+				print(f"[delivery] file_id для {uid} не сработал: {e}")
+
+		pdf_path = None
+		try:
+			if progress:
+				await progress("rendering")
+			# Оплаченный заказ не отбрасываем — ждём места в общем лимите рендеров
+			await limiter.wait("render")
+			with timed("delivery_stage_seconds", stage="llm"):
+				sections = await generate_all_sections(chart)
+
+			with timed("delivery_stage_seconds", stage="render"):
+				pdf_path = await run_blocking(
+					_pdf_generator.get().create_natal_pdf,
+					chart,
+					uid,
+					user_first_name,
+					self.metadata.username,
+					sections,
+					pool="render"
+				)
+			_events.inc(event="renders")
+			_bytes_uploaded.inc(os.path.getsize(pdf_path))
+
+			if progress:
+				await progress("uploading")
+			with timed("delivery_stage_seconds", stage="upload"):
+				message = await self._send_with_retries(
+					chat_id, pdf_path, caption, f"natal_chart_{user_first_name or uid}.pdf"
+				)
+
+			document = getattr(message, "document", None)
+			self._remember_file_id(uid, key, document.file_id if document else None)
+			_events.inc(event="delivered")
+			return True
+
+		except Exception as e:
+			_events.inc(event="failed")
+			print(f"[delivery] Не удалось доставить PDF пользователю {uid}: {e}")
+			try:
+				await self.bot.send_message(chat_id, f"❌ Ошибка при отправке PDF:\n{e}\nНапишите администратору.")
+			except Exception as notify_error:
+				# Пользователь заблокировал бота или сеть недоступна — заказ всё равно помечается FAILED
+				print(f"[delivery] Не удалось сообщить {uid} об ошибке: {notify_error}")
+			return False
+
+		finally:
+			if pdf_path and os.path.exists(pdf_path):
+				os.remove(pdf_path)
+
+	async def _send_with_retries(self, chat_id: int, document: str, caption: str, filename: Optional[str]):
+		"""document — путь к файлу или file_id уже загруженного документа."""
+		for attempt in range(1, self.attempts + 1):
+			_events.inc(event="send_attempts")
+			try:
+				with span("telegram.send_document", attempt=attempt, by_file_id=filename is None):
+					if filename is None:
+						return await self.bot.send_document(chat_id, document, caption=caption)
+					with open(document, "rb") as f:
+						return await self.bot.send_document(
+							chat_id,
+							f,
+							caption=caption,
+							visible_file_name=filename,
+							timeout=SEND_TIMEOUT + attempt * SEND_TIMEOUT_STEP
+						)
+			except Exception as e:
+				if attempt == self.attempts or not _is_retryable(e):
+					raise
+				_events.inc(event="send_retries")
+				delay = _retry_after(e)
+				await asyncio.sleep(delay if delay is not None else backoff_delay(attempt))
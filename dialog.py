@@ -0,0 +1,116 @@
+"""
+Диалог ввода данных рождения как конечный автомат.
+
+Состояния и переходы описаны таблицей STEPS: для каждого состояния —
+валидатор ввода, следующее состояние и подсказка. Модуль не зависит от
+Telegram и хранилища, поэтому его можно тестировать и замерять отдельно:
+
+	>>> advance(WAIT_DATE, "01.02.1990").next_state
+	'WAIT_TIME'
+
+Бот читает состояние пользователя один раз на апдейт и вызывает advance —
+поиск шага идёт по словарю за O(1).
+"""
+
+import re
+from datetime import datetime
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+
+START = "START"
+WAIT_DATE = "WAIT_DATE"
+WAIT_TIME = "WAIT_TIME"
+WAIT_PLACE = "WAIT_PLACE"
+CALCULATING = "CALCULATING"
+SHOWING_RESULT = "SHOWING_RESULT"
+
+BEGIN_BUTTON = "Рассчитать натальную карту"
+
+PROMPT_DATE = "Введите дату рождения в формате ДД.ММ.ГГГГ"
+PROMPT_TIME = "Введите время рождения (ЧЧ:ММ) или 'не знаю'"
+PROMPT_PLACE = "Введите место рождения (город, страна)"
+
+UNKNOWN_TIME_ANSWERS = {"не знаю", "незнаю", "?", "-"}
+MIN_YEAR = 1900
+MAX_PLACE_LENGTH = 200
+
+_DATE_RE = re.compile(r"^\s*(\d{1,2})[./-](\d{1,2})[./-](\d{4})\s*$")
+_TIME_RE = re.compile(r"^\s*(\d{1,2})[:.](\d{2})\s*$")
+
+
+def parse_birth_date(text: str) -> Dict[str, Any]:
+	match = _DATE_RE.match(text)
+	if not match:
+		raise ValueError("Не понял дату. " + PROMPT_DATE + ", например 07.03.1994")
+	day, month, year = (int(g) for g in match.groups())
+	try:
+		date = datetime(year, month, day)
+	except ValueError:
+		raise ValueError("Такой даты не существует. Проверьте день и месяц.")
+	if year < MIN_YEAR or date > datetime.now():
+		raise ValueError(f"Дата должна быть между {MIN_YEAR} годом и сегодняшним днём.")
+	return {"birth_date": date.strftime("%d.%m.%Y")}
+
+
+def parse_birth_time(text: str) -> Dict[str, Any]:
+	answer = text.lower().strip()
+	if answer in UNKNOWN_TIME_ANSWERS:
+		return {"birth_time": "12:00", "birth_time_unknown": True}
+	match = _TIME_RE.match(answer)
+	if not match:
+		raise ValueError("Не понял время. " + PROMPT_TIME + ", например 14:35")
+	hour, minute = (int(g) for g in match.groups())
+	if hour > 23 or minute > 59:
+		raise ValueError("Часы должны быть от 0 до 23, минуты — от 0 до 59.")
+	return {"birth_time": f"{hour:02d}:{minute:02d}", "birth_time_unknown": False}
+
+
+def parse_place(text: str) -> Dict[str, Any]:
+	place = " ".join(text.split())
+	if not place or place.replace(",", "").replace(" ", "").isdigit():
+		raise ValueError("Введите название места, например «Казань, Россия».")
+	if len(place) > MAX_PLACE_LENGTH:
+		raise ValueError("Слишком длинное название места.")
+	return {"place": place}
+
+
+class Step(NamedTuple):
+	validate: Callable[[str], Dict[str, Any]]
+	next_state: str
+	prompt: Optional[str]
+
+
+class Transition(NamedTuple):
+	next_state: str
+	data: Dict[str, Any]
+	reply: Optional[str]
+	error: bool = False
+
+
+STEPS: Dict[str, Step] = {
+	WAIT_DATE: Step(parse_birth_date, WAIT_TIME, PROMPT_TIME),
+	WAIT_TIME: Step(parse_birth_time, WAIT_PLACE, PROMPT_PLACE),
+	# Дальше бот сам считает карту и переводит пользователя в SHOWING_RESULT
+	WAIT_PLACE: Step(parse_place, CALCULATING, None),
+}
+
+# Ввод, который срабатывает из любого состояния
+TRIGGERS: Dict[str, Transition] = {
+	BEGIN_BUTTON: Transition(WAIT_DATE, {}, PROMPT_DATE),
+}
+
+
+def advance(state: str, text: str) -> Optional[Transition]:
+	"""Обрабатывает текст в состоянии state. None — в этом состоянии текст не ожидается."""
+	trigger = TRIGGERS.get(text)
+	if trigger is not None:
+		return trigger
+
+	step = STEPS.get(state)
+	if step is None:
+		return None
+	try:
+		data = step.validate(text)
+	except ValueError as e:
+		return Transition(state, {}, str(e), error=True)
+	return Transition(step.next_state, data, step.prompt)
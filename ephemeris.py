@@ -0,0 +1,283 @@
+"""
+Общие развёртки эфемерид и поиск корней для транзитов, прогрессий и
+возвратов.
+
+Развёртка планеты — узлы (jd, долгота, скорость) на глобальной сетке
+jd = k * SWEEP_STEP плюс станции (нули скорости, уточнённые методом
+Брента). Между соседними узлами долгота монотонна и меняется меньше чем на
+180°, поэтому проход через любую долготу берётся в скобку без перебора по
+дням. Начальное приближение даёт кубическая интерполяция Эрмита по
+долготам и скоростям узлов (без вызовов эфемерид), затем метод Ньютона
+(производная — скорость) уточняет его до LON_TOL, обычно за один-два
+вызова swe.calc_ut; скорость в корне — из последнего вызова.
+
+Сетка общая для всех запросов, поэтому узлы и станции кэшируются:
+транзиты на три года, десяток солнечных и лунных возвратов одного
+пользователя и соседние окна разных пользователей не повторяют вызовы
+swe.calc_ut. Размер кэша — EPHEMERIS_CACHE_SIZE узлов (LRU).
+
+	for jd, speed in passes(swe.SUN, jd_start, jd_end, natal_sun):
+		...
+"""
+
+import bisect
+import math
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Iterable, List, Optional, Tuple
+
+import pytz
+import swisseph as swe
+
+from metrics import counter
+
+
+SWEEP_STEP = 4.0  # суток; Луна проходит за шаг ~55°, ретроградные петли длиннее шага
+XTOL = 1e-5  # суток, ≈ 1 с
+LON_TOL = 1e-5  # °, ≈ 0.04″: Луна проходит за ~0.1 с, Солнце — за ~1 с
+EPHEMERIS_CACHE_SIZE = int(os.getenv("EPHEMERIS_CACHE_SIZE", "200000"))
+
+FLAGS = swe.FLG_SWIEPH | swe.FLG_SPEED
+
+Node = Tuple[float, float, float]  # (jd, долгота, скорость)
+
+_cache_lookups = counter("cache_lookups", "Обращения к кэшам: cache, result=hit|miss")
+
+
+def wrap180(deg: float) -> float:
+	"""Угол в диапазоне [-180, 180)."""
+	return (deg + 180.0) % 360.0 - 180.0
+
+
+def brent(f: Callable[[float], float], a: float, b: float, xtol: float = XTOL, maxiter: int = 100) -> float:
+	"""Корень f на [a, b] методом Брента; f(a) и f(b) разных знаков."""
+	fa, fb = f(a), f(b)
+	if fa == 0:
+		return a
+	if fb == 0:
+		return b
+	if (fa > 0) == (fb > 0):
+		raise ValueError("brent: корень не взят в скобку")
+	if abs(fa) < abs(fb):
+		a, b, fa, fb = b, a, fb, fa
+	c, fc = a, fa
+	d = c
+	bisected = True
+	for _ in range(maxiter):
+		if fb == 0 or abs(b - a) < xtol:
+			return b
+		if fa != fc and fb != fc:
+			# обратная квадратичная интерполяция
+			s = (a * fb * fc / ((fa - fb) * (fa - fc))
+				 + b * fa * fc / ((fb - fa) * (fb - fc))
+				 + c * fa * fb / ((fc - fa) * (fc - fb)))
+		else:
+			s = b - fb * (b - a) / (fb - fa)  # секущая
+		edge = (3 * a + b) / 4
+		if (not (min(edge, b) < s < max(edge, b))
+				or (bisected and abs(s - b) >= abs(b - c) / 2)
+				or (not bisected and abs(s - b) >= abs(c - d) / 2)
+				or (bisected and abs(b - c) < xtol)
+				or (not bisected and abs(c - d) < xtol)):
+			s = (a + b) / 2
+			bisected = True
+		else:
+			bisected = False
+		fs = f(s)
+		d, c, fc = c, b, fb
+		if (fa > 0) == (fs > 0):
+			a, fa = s, fs
+		else:
+			b, fb = s, fs
+		if abs(fa) < abs(fb):
+			a, b, fa, fb = b, a, fb, fa
+	return b
+
+
+def newton_bracketed(fdf: Callable[[float], Tuple[float, float]], a: float, b: float,
+					 fa: float, fb: float, x0: Optional[float] = None, xtol: float = XTOL,
+					 ftol: float = LON_TOL, maxiter: int = 50) -> Tuple[float, Optional[float]]:
+	"""Корень f на [a, b] методом Ньютона со скобкой: шаг за пределы скобки или
+	медленное сужение заменяется бисекцией. fdf(x) → (f(x), f'(x)).
+
+	Останавливается, когда |f| < ftol или шаг меньше xtol. Возвращает
+	(корень, f' в последней вычисленной точке); f' равна None, если корень —
+	край скобки и fdf не вызывалась. x0 — начальное приближение внутри скобки
+	(по умолчанию линейная интерполяция)."""
+	if fa == 0:
+		return a, None
+	if fb == 0:
+		return b, None
+	if fa > 0:
+		a, b = b, a  # f(a) < 0 < f(b)
+	if x0 is None or not (min(a, b) < x0 < max(a, b)):
+		x0 = a + (b - a) * (-min(fa, fb)) / abs(fb - fa)
+	x = x0
+	step_old = step = abs(b - a)
+	dfx = None
+	for _ in range(maxiter):
+		fx, dfx = fdf(x)
+		if abs(fx) < ftol:
+			return x, dfx
+		if fx < 0:
+			a = x
+		else:
+			b = x
+		out = dfx == 0 or not (min(a, b) < x - fx / dfx < max(a, b))
+		if out or abs(2 * fx) > abs(step_old * dfx):
+			step_old, step = step, (b - a) / 2
+			x = a + step
+		else:
+			step_old, step = step, fx / dfx
+			x -= step
+		if abs(step) < xtol:
+			return x, dfx
+	return x, dfx
+
+
+def hermite_guess(h: float, v0: float, delta: float, v1: float, y: float, iterations: int = 8) -> float:
+	"""Доля s ∈ (0, 1) шага h, на которой кубика Эрмита (0 → delta, скорости v0 и v1
+	на концах) проходит через y. Считается без эфемерид: это только
+	начальное приближение для newton_bracketed."""
+	m0, m1 = v0 * h, v1 * h
+	lo, hi = 0.0, 1.0
+	s = y / delta
+	for _ in range(iterations):
+		s2, s3 = s * s, s * s * s
+		value = (-2 * s3 + 3 * s2) * delta + (s3 - 2 * s2 + s) * m0 + (s3 - s2) * m1 - y
+		slope = (-6 * s2 + 6 * s) * delta + (3 * s2 - 4 * s + 1) * m0 + (3 * s2 - 2 * s) * m1
+		if (value < 0) == (delta > 0):
+			lo = s
+		else:
+			hi = s
+		if slope == 0 or not (lo < s - value / slope < hi):
+			s = (lo + hi) / 2
+		else:
+			s -= value / slope
+	return s
+
+
+def calc(jd: float, pid: int) -> Tuple[float, float]:
+	"""Долгота (0–360) и скорость, °/сут."""
+	xx = swe.calc_ut(jd, pid, FLAGS)[0]
+	return xx[0] % 360.0, xx[3]
+
+
+class SweepCache:
+	"""LRU узлов сетки: (pid, step, k) → (долгота, скорость) и станции между k и k + 1."""
+
+	def __init__(self, size: int = EPHEMERIS_CACHE_SIZE):
+		self.size = size
+		self._nodes: "OrderedDict[tuple, Tuple[float, float]]" = OrderedDict()
+		self._stations: "OrderedDict[tuple, Optional[Node]]" = OrderedDict()
+		self._lock = threading.Lock()
+
+	def _get(self, store: OrderedDict, key: tuple):
+		with self._lock:
+			if key in store:
+				store.move_to_end(key)
+				return True, store[key]
+		return False, None
+
+	def _put(self, store: OrderedDict, key: tuple, value) -> None:
+		with self._lock:
+			store[key] = value
+			if len(store) > self.size:
+				store.popitem(last=False)
+
+	def node(self, pid: int, step: float, k: int) -> Node:
+		key = (pid, step, k)
+		found, value = self._get(self._nodes, key)
+		_cache_lookups.inc(cache="ephemeris", result="hit" if found else "miss")
+		if not found:
+			value = calc(k * step, pid)
+			self._put(self._nodes, key, value)
+		return (k * step,) + value
+
+	def station(self, pid: int, step: float, k: int, left: Node, right: Node) -> Optional[Node]:
+		"""Станция между соседними узлами сетки или None."""
+		if left[2] == 0 or right[2] == 0 or (left[2] < 0) == (right[2] < 0):
+			return None
+		key = (pid, step, k)
+		found, value = self._get(self._stations, key)
+		if not found:
+			jd = brent(lambda t: calc(t, pid)[1], left[0], right[0])
+			value = (jd, calc(jd, pid)[0], 0.0)
+			self._put(self._stations, key, value)
+		return value
+
+	def clear(self) -> None:
+		with self._lock:
+			self._nodes.clear()
+			self._stations.clear()
+
+
+cache = SweepCache()
+
+
+def sweep(pid: int, jd_start: float, jd_end: float, step: float = SWEEP_STEP) -> List[Node]:
+	"""Узлы сетки, покрывающие [jd_start, jd_end], со станциями; между соседними
+	узлами движение монотонно."""
+	first, last = math.floor(jd_start / step), math.ceil(jd_end / step)
+	nodes = [cache.node(pid, step, first)]
+	for k in range(first + 1, last + 1):
+		node = cache.node(pid, step, k)
+		station = cache.station(pid, step, k - 1, nodes[-1], node)
+		if station is not None:
+			nodes.append(station)
+		nodes.append(node)
+	return nodes
+
+
+def _in_arc(lons: List[float], lo: float, hi: float) -> Iterable[int]:
+	"""Индексы целей с lo < x <= hi по кругу (hi может быть больше 360)."""
+	if hi < 360.0:
+		return range(bisect.bisect_right(lons, lo), bisect.bisect_right(lons, hi))
+	return list(range(bisect.bisect_right(lons, lo), len(lons))) + list(range(0, bisect.bisect_right(lons, hi - 360.0)))
+
+
+def crossings(pid: int, jd_start: float, jd_end: float, lons: List[float],
+			  step: float = SWEEP_STEP) -> Iterable[Tuple[int, float, float]]:
+	"""(индекс цели, jd, скорость) для каждого прохода планеты через долготы
+	lons (по возрастанию) в [jd_start, jd_end], по времени."""
+	nodes = sweep(pid, jd_start, jd_end, step)
+	for (t0, l0, v0), (t1, l1, v1) in zip(nodes, nodes[1:]):
+		delta = wrap180(l1 - l0)
+		if delta == 0 or t1 < jd_start or t0 > jd_end:
+			continue
+		lo, hi = (l0, l0 + delta) if delta > 0 else (l1, l1 - delta)
+		found = []
+		for index in _in_arc(lons, lo, hi):
+			x = lons[index]
+
+			def fdf(t, x=x):
+				lon, speed = calc(t, pid)
+				return wrap180(lon - x), speed
+
+			guess = t0 + (t1 - t0) * hermite_guess(t1 - t0, v0, delta, v1, wrap180(x - l0))
+			jd, speed = newton_bracketed(fdf, t0, t1, wrap180(l0 - x), wrap180(l1 - x), x0=guess)
+			if jd_start <= jd <= jd_end:
+				if speed is None:
+					speed = calc(jd, pid)[1]
+				found.append((index, jd, speed))
+		found.sort(key=lambda f: f[1])
+		yield from found
+
+
+def passes(pid: int, jd_start: float, jd_end: float, lon: float,
+		   step: float = SWEEP_STEP) -> List[Tuple[float, float]]:
+	"""(jd, скорость) каждого прохода планеты через долготу lon."""
+	return [(jd, speed) for _, jd, speed in crossings(pid, jd_start, jd_end, [lon % 360.0], step)]
+
+
+def to_jd(dt: datetime) -> float:
+	"""Юлианский день UT для aware datetime (naive считается UTC)."""
+	dt = dt.astimezone(pytz.utc) if dt.tzinfo else dt
+	return swe.utc_to_jd(dt.year, dt.month, dt.day, dt.hour, dt.minute, dt.second, swe.GREG_CAL)[1]
+
+
+def jd_to_datetime(jd: float) -> datetime:
+	year, month, day, hour, minute, second = swe.jdut1_to_utc(jd, swe.GREG_CAL)
+	return pytz.utc.localize(datetime(year, month, day, hour, minute, int(second)))
@@ -0,0 +1,179 @@
+"""
+Системы домов: выбор пользователя, запасная система для полярных широт
+и куспиды нескольких систем за один проход.
+
+	result = chart_houses(jd, lat, lon, 'koch')
+	result['cusps'], result['system'], result['fallback']
+
+	compare_systems(chart, ('placidus', 'whole_sign', 'equal'))   # без пересчёта карты
+
+Все системы считаются через swe.houses_armc от общих ARMC (звёздное время
++ долгота) и наклона эклиптики: их достаточно вычислить один раз на карту,
+и они сохраняются в карте (armc, obliquity), поэтому сравнение систем в
+PDF не пересчитывает карту и эфемериды.
+
+Placidus и Koch не определены за полярным кругом
+(|широта| > 90° − наклон): там берётся HOUSE_FALLBACK, а в результате
+отмечается fallback — система, которую выбрал пользователь.
+"""
+
+import os
+from typing import Dict, Iterable, Optional, Tuple
+
+import swisseph as swe
+
+
+HOUSE_SYSTEMS = {
+	'placidus': b'P',
+	'koch': b'K',
+	'whole_sign': b'W',
+	'equal': b'E',
+	'porphyry': b'O',
+	'regiomontanus': b'R',
+	'campanus': b'C',
+	'alcabitius': b'B',
+	'topocentric': b'T',
+	'morinus': b'M',
+}
+
+HOUSE_NAMES_RU = {
+	'placidus': 'Плацидус',
+	'koch': 'Кох',
+	'whole_sign': 'Целые знаки',
+	'equal': 'Равнодомная',
+	'porphyry': 'Порфирий',
+	'regiomontanus': 'Региомонтан',
+	'campanus': 'Кампанус',
+	'alcabitius': 'Алькабитиус',
+	'topocentric': 'Топоцентрическая',
+	'morinus': 'Моринус',
+}
+
+# Не определены, когда часть эклиптики не восходит (за полярным кругом)
+POLAR_UNDEFINED = {b'P', b'K'}
+
+DEFAULT_HOUSE_SYSTEM = os.getenv("HOUSE_SYSTEM", "placidus")
+HOUSE_FALLBACK = os.getenv("HOUSE_FALLBACK", "porphyry")
+# Системы для сравнения в PDF
+COMPARE_SYSTEMS = tuple(
+	s.strip() for s in os.getenv("HOUSE_COMPARE", "placidus,koch,whole_sign,equal").split(",") if s.strip()
+)
+
+
+def resolve(system: Optional[str]) -> str:
+	"""Имя системы (по умолчанию DEFAULT_HOUSE_SYSTEM); ValueError для неизвестной."""
+	system = (system or DEFAULT_HOUSE_SYSTEM).lower()
+	if system not in HOUSE_SYSTEMS:
+		raise ValueError(f"Неизвестная система домов: {system}. Доступны: {', '.join(HOUSE_SYSTEMS)}")
+	return system
+
+
+def sidereal_frame(jd: float, lon: float) -> Tuple[float, float]:
+	"""(ARMC, истинный наклон эклиптики) на момент jd (UT) для долготы lon."""
+	armc = (swe.sidtime(jd) * 15.0 + lon) % 360.0
+	obliquity = swe.calc_ut(jd, swe.ECL_NUT)[0][0]
+	return armc, obliquity
+
+
+def is_polar(lat: float, obliquity: float) -> bool:
+	return abs(lat) >= 90.0 - obliquity
+
+
+def effective_system(system: Optional[str], lat: float, obliquity: float) -> str:
+	"""Система, которая реально будет посчитана на широте lat (с учётом полярной замены)."""
+	system = resolve(system)
+	if HOUSE_SYSTEMS[system] in POLAR_UNDEFINED and is_polar(lat, obliquity):
+		return resolve(HOUSE_FALLBACK)
+	return system
+
+
+def houses_at(armc: float, lat: float, obliquity: float, system: Optional[str] = None) -> Dict:
+	"""Куспиды, ASC и MC одной системы от готовых ARMC и наклона.
+
+	Возвращает {'system', 'fallback', 'cusps', 'asc', 'mc'}; fallback — выбранная
+	система, если вместо неё пришлось взять HOUSE_FALLBACK, иначе None.
+	"""
+	system = resolve(system)
+	used = effective_system(system, lat, obliquity)
+	try:
+		cusps, ascmc = swe.houses_armc(armc, lat, obliquity, HOUSE_SYSTEMS[used])
+	except Exception as e:
+		if used == resolve(HOUSE_FALLBACK):
+			raise RuntimeError(f"Ошибка расчёта домов: {e}")
+		# Библиотека отказалась считать систему — пробуем запасную
+		print(f"Система домов {used} не посчиталась ({e}), используется {HOUSE_FALLBACK}")
+		used = resolve(HOUSE_FALLBACK)
+		try:
+			cusps, ascmc = swe.houses_armc(armc, lat, obliquity, HOUSE_SYSTEMS[used])
+		except Exception as e:
+			raise RuntimeError(f"Ошибка расчёта домов: {e}")
+	return {
+		'system': used,
+		'fallback': system if used != system else None,
+		'cusps': cusps[:13],
+		'asc': ascmc[0] % 360,
+		'mc': ascmc[1] % 360,
+	}
+
+
+def batch_houses(armc: float, lat: float, obliquity: float, systems: Iterable[str]) -> Dict[str, Dict]:
+	"""houses_at для нескольких систем от одних ARMC и наклона: система → результат."""
+	return {system: houses_at(armc, lat, obliquity, system) for system in dict.fromkeys(systems)}
+
+
+def chart_houses(jd: float, lat: float, lon: float, system: Optional[str] = None) -> Dict:
+	"""Дома на момент jd в точке (lat, lon); в результате также armc и obliquity."""
+	armc, obliquity = sidereal_frame(jd, lon)
+	result = houses_at(armc, lat, obliquity, system)
+	result['armc'] = armc
+	result['obliquity'] = obliquity
+	return result
+
+
+def chart_frame(chart: Dict) -> Tuple[float, float]:
+	"""ARMC и наклон карты: сохранённые при расчёте или (для старых карт) из jd."""
+	if chart.get('armc') is not None and chart.get('obliquity') is not None:
+		return chart['armc'], chart['obliquity']
+	if chart.get('jd') is None:
+		raise ValueError("В карте нет момента рождения — пересчитайте карту")
+	return sidereal_frame(chart['jd'], chart['lon'])
+
+
+def chosen_system(chart: Dict) -> str:
+	"""Система, выбранная для карты (до полярной замены)."""
+	return resolve(chart.get('house_fallback') or chart.get('house_system'))
+
+
+def rehouse(chart: Dict, system: str) -> Dict:
+	"""Пересчитывает дома карты в другой системе на месте (эфемериды не нужны)."""
+	armc, obliquity = chart_frame(chart)
+	result = houses_at(armc, chart['lat'], obliquity, system)
+	chart.update(
+		cusps=result['cusps'], asc=result['asc'], mc=result['mc'],
+		house_system=result['system'], house_fallback=result['fallback'],
+		armc=armc, obliquity=obliquity,
+	)
+	return chart
+
+
+def parse_system(text: str) -> str:
+	"""Система по вводу пользователя: ключ (koch) или русское название (Кох)."""
+	answer = " ".join(text.lower().replace('-', ' ').split())
+	for system, name in HOUSE_NAMES_RU.items():
+		if answer in (system, system.replace('_', ' '), name.lower()):
+			return system
+	raise ValueError(f"Неизвестная система домов: {text}. Доступны: {', '.join(HOUSE_NAMES_RU.values())}")
+
+
+def compare_systems(chart: Dict, systems: Iterable[str] = COMPARE_SYSTEMS) -> Dict[str, Dict]:
+	"""Куспиды и дома планет карты в нескольких системах без пересчёта эфемерид:
+	система → {'system', 'fallback', 'cusps', 'asc', 'mc', 'houses': {планета: дом}}."""
+	from texts import get_house
+
+	armc, obliquity = chart_frame(chart)
+	results = batch_houses(armc, chart['lat'], obliquity, systems)
+	for result in results.values():
+		result['houses'] = {
+			planet: get_house(result['cusps'], lon) for planet, lon in chart['positions'].items()
+		}
+	return results
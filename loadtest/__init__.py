@@ -0,0 +1 @@
+"""Офлайн-инструменты нагрузочного тестирования бота (без настоящего Telegram)."""
@@ -0,0 +1,124 @@
+"""
+Замер масштабирования кластера (cluster.py) по числу процессов-воркеров.
+
+Для каждого значения --workers поднимает заглушку Bot API, временную
+общую БД и маршрутизатор с N воркерами, затем прогоняет виртуальных
+пользователей по диалогу /start → кнопка → дата → время (без геокодера
+и LLM) и печатает пропускную способность:
+
+	python -m loadtest.cluster_bench --workers 1 2 4 --users 300
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import aiohttp
+from cryptography.fernet import Fernet
+
+from loadtest.fake_telegram import FakeTelegramAPI
+from loadtest.webhook_bench import make_command_update
+
+
+def make_text_update(update_id: int, chat_id: int, text: str) -> dict:
+	update = make_command_update(update_id, chat_id, text)
+	del update["message"]["entities"]
+	return update
+
+
+def user_script(uid: int, first_update_id: int) -> list:
+	texts = ["Рассчитать натальную карту", f"{1 + uid % 28:02d}.0{1 + uid % 9}.1990", "14:35"]
+	updates = [make_command_update(first_update_id, uid, "/start")]
+	updates += [make_text_update(first_update_id + i + 1, uid, t) for i, t in enumerate(texts)]
+	return updates
+
+
+async def _run_users(url: str, users: int) -> dict:
+	statuses = {}
+
+	async with aiohttp.ClientSession() as session:
+		async def user(uid):
+			# Апдейты одного пользователя уходят по порядку, пользователи — параллельно
+			for update in user_script(uid, uid * 10):
+				async with session.post(url, json=update) as resp:
+					statuses[resp.status] = statuses.get(resp.status, 0) + 1
+
+		await asyncio.gather(*(user(10000 + i) for i in range(users)))
+	return statuses
+
+
+async def _wait_ready(router, timeout: float) -> bool:
+	deadline = time.monotonic() + timeout
+	while not router.ready():
+		if time.monotonic() >= deadline:
+			return False
+		await asyncio.sleep(0.1)
+	return True
+
+
+async def run_once(workers: int, args) -> float:
+	from cluster import ClusterRouter
+
+	fake = FakeTelegramAPI(port=args.api_port, latency=args.api_latency)
+	await fake.start()
+
+	with tempfile.TemporaryDirectory() as tmp:
+		env = {
+			"TOKEN": "123456:LOADTEST",
+			"TELEGRAM_API_URL": fake.api_url,
+			"DB_FERNET_KEY": Fernet.generate_key().decode(),
+			"DB_PATH": os.path.join(tmp, "data.sqlite"),
+			"RATE_LIMIT_BACKEND": "sqlite",
+			"RATE_LIMIT_DB": os.path.join(tmp, "ratelimit.sqlite"),
+		}
+		router = ClusterRouter(workers=workers, path="/hook", env=env)
+		await router.start(host="127.0.0.1", port=args.port)
+		# Воркеры импортируют bot и открывают БД — ждём getMe от каждого
+		await fake.wait_for("getMe", workers, timeout=args.timeout)
+		# ...и прогрева (warmup.wait_ready): иначе первые апдейты ждут в очереди
+		# за рендером тестового PDF и попадают в замер
+		if not await _wait_ready(router, args.timeout):
+			print(f"воркеров: {workers}  не прошли прогрев за {args.timeout:.0f} с: {router.readiness()}")
+
+		baseline = fake.calls["sendMessage"]
+		started = time.perf_counter()
+		statuses = await _run_users(f"http://127.0.0.1:{args.port}/hook", args.users)
+		completed = await fake.wait_for("sendMessage", baseline + args.users * 4, timeout=args.timeout)
+		elapsed = time.perf_counter() - started
+
+		await router.stop()
+	await fake.stop()
+
+	throughput = (fake.calls["sendMessage"] - baseline) / elapsed
+	print(f"воркеров: {workers}  статусы: {statuses}  распределение: {router.stats['routed']}  "
+		  f"{throughput:.0f} ответов/с за {elapsed:.2f} с" + ("" if completed else " (не дождались всех ответов)"))
+	return throughput
+
+
+async def run(args) -> None:
+	results = {}
+	for workers in args.workers:
+		results[workers] = await run_once(workers, args)
+	base = results[args.workers[0]]
+	if not base:
+		print(f"{args.workers[0]} воркер(а) не ответили ни разу — ускорение не считаем")
+		return
+	for workers, throughput in results.items():
+		print(f"{workers} воркер(а): ускорение ×{throughput / base:.2f}")
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+	parser.add_argument("--users", type=int, default=200)
+	parser.add_argument("--port", type=int, default=8092)
+	parser.add_argument("--api-port", type=int, default=8093)
+	parser.add_argument("--api-latency", type=float, default=0.0, help="задержка ответа заглушки Bot API, с")
+	parser.add_argument("--timeout", type=float, default=120)
+	asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+	main()
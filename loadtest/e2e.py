@@ -0,0 +1,268 @@
+"""
+Сквозной нагрузочный тест: виртуальные пользователи проходят весь путь
+/start → дата → время → место → покупка → оплата и получают PDF.
+
+Окружение поднимается локально:
+- заглушка Bot API (fake_telegram) — бот забирает апдейты через getUpdates;
+- заглушка LLM (fake_llm) вместо love_ai.LM_API_URL с задержкой --llm-latency;
+- геокодер заменён таблицей координат из benchmarks.corpus;
+- временная зашифрованная БД.
+
+Нагрузка подаётся ступенями (--rates, пользователей в секунду, прибытие по
+Пуассону). Для каждой ступени печатаются p50/p95/p99 по этапам и
+фактическая пропускная способность; точка насыщения — первая ступень, где
+бот не успевает за входящим потоком или p95 оплаты резко растёт:
+
+	python -m loadtest.e2e --rates 0.5 1 2 4 --duration 30 --llm-latency 2
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from cryptography.fernet import Fernet
+
+from loadtest.fake_llm import FakeLLMServer
+from loadtest.fake_telegram import FakeTelegramAPI
+
+
+STAGES = ("start", "date", "time", "place", "buy", "pay")
+PERCENTILES = (50, 95, 99)
+# Ступень насыщена, если обслужено меньше этой доли входящего потока
+SATURATION_RATIO = 0.9
+# ...или p95 оплаты вырос во столько раз относительно первой ступени
+SATURATION_SLOWDOWN = 3.0
+
+
+class StageError(Exception):
+	pass
+
+
+def percentile(values: List[float], q: float) -> float:
+	"""Перцентиль методом ближайшего ранга; 0 для пустого списка."""
+	if not values:
+		return 0.0
+	ordered = sorted(values)
+	rank = max(1, int(round(q / 100 * len(ordered) + 0.5)))
+	return ordered[min(rank, len(ordered)) - 1]
+
+
+def _user(uid: int) -> dict:
+	return {"id": uid, "is_bot": False, "first_name": f"Load{uid}"}
+
+
+def _message(uid: int, **fields) -> dict:
+	message = {
+		"message_id": int(time.time() * 1000) % 1_000_000_000,
+		"date": int(time.time()),
+		"chat": {"id": uid, "type": "private"},
+		"from": _user(uid),
+	}
+	message.update(fields)
+	return {"message": message}
+
+
+def _text(uid: int, text: str) -> dict:
+	if text.startswith("/"):
+		return _message(uid, text=text, entities=[{"type": "bot_command", "offset": 0, "length": len(text)}])
+	return _message(uid, text=text)
+
+
+def _callback(uid: int, data: str) -> dict:
+	return {"callback_query": {
+		"id": f"cb-{uid}-{time.monotonic_ns()}",
+		"from": _user(uid),
+		"message": {"message_id": 1, "date": int(time.time()), "chat": {"id": uid, "type": "private"}},
+		"chat_instance": str(uid),
+		"data": data,
+	}}
+
+
+def _payment(uid: int) -> List[dict]:
+	invoice = {"currency": "XTR", "total_amount": 100, "invoice_payload": f"natal_full_{uid}_loadtest"}
+	pre_checkout = {"pre_checkout_query": dict(invoice, id=f"pcq-{uid}", **{"from": _user(uid)})}
+	paid = _message(uid, successful_payment=dict(
+		invoice, telegram_payment_charge_id=f"loadtest-{uid}", provider_payment_charge_id=""
+	))
+	return [pre_checkout, paid]
+
+
+def _has_buy_button(params: dict) -> bool:
+	return "buy_full" in str(params.get("reply_markup", ""))
+
+
+def _is_failure(params: dict) -> bool:
+	text = str(params.get("text", ""))
+	return text.startswith(("Ошибка", "❌", "Слишком"))
+
+
+async def virtual_user(fake: FakeTelegramAPI, uid: int, record: dict, timeout: float) -> Dict[str, float]:
+	"""Проходит сценарий и возвращает длительность каждого этапа, с."""
+	import dialog
+
+	latencies: Dict[str, float] = {}
+
+	async def stage(name, updates, methods, predicate=None):
+		started = time.perf_counter()
+		for update in updates:
+			fake.push_update(update)
+		# Сообщения об ошибках приходят через sendMessage на любом этапе
+		watched = set(methods) | {"sendMessage"}
+		while True:
+			try:
+				method, params = await fake.next_reply(
+					uid, watched, timeout=started + timeout - time.perf_counter()
+				)
+			except asyncio.TimeoutError:
+				raise StageError(f"{name}: нет ответа за {timeout} с")
+			if _is_failure(params):
+				raise StageError(f"{name}: {params.get('text')}")
+			if method in methods and (predicate is None or predicate(params)):
+				break
+		latencies[name] = time.perf_counter() - started
+
+	await stage("start", [_text(uid, "/start"), _text(uid, dialog.BEGIN_BUTTON)], {"sendMessage"},
+				lambda p: p.get("text") == dialog.PROMPT_DATE)
+	await stage("date", [_text(uid, record["birth_date"])], {"sendMessage"})
+	await stage("time", [_text(uid, record["birth_time"])], {"sendMessage"})
+	await stage("place", [_text(uid, record["place"])], {"sendMessage"}, _has_buy_button)
+	await stage("buy", [_callback(uid, "buy_full")], {"sendInvoice"})
+	await stage("pay", _payment(uid), {"sendDocument"})
+	return latencies
+
+
+async def run_step(fake: FakeTelegramAPI, rate: float, duration: float, first_uid: int, timeout: float) -> dict:
+	"""Одна ступень нагрузки: пользователи приходят с интенсивностью rate в секунду."""
+	from benchmarks.corpus import birth_records
+
+	count = max(1, int(rate * duration))
+	records = birth_records(count, seed=first_uid)
+	latencies: Dict[str, List[float]] = {name: [] for name in STAGES}
+	errors: List[str] = []
+
+	async def one(uid, record):
+		try:
+			result = await virtual_user(fake, uid, record, timeout)
+		except StageError as e:
+			errors.append(str(e))
+			return
+		for name, seconds in result.items():
+			latencies[name].append(seconds)
+
+	started = time.perf_counter()
+	tasks = []
+	for i, record in enumerate(records):
+		tasks.append(asyncio.create_task(one(first_uid + i, record)))
+		await asyncio.sleep(random.expovariate(rate))
+	await asyncio.gather(*tasks)
+	elapsed = time.perf_counter() - started
+
+	completed = len(latencies["pay"])
+	return {
+		"rate": rate,
+		"users": count,
+		"completed": completed,
+		"errors": errors,
+		"throughput": completed / elapsed,
+		"latencies": latencies,
+	}
+
+
+def print_step(result: dict) -> None:
+	print(f"\n== {result['rate']:g} польз/с: завершили {result['completed']}/{result['users']}, "
+		  f"ошибок {len(result['errors'])}, обслужено {result['throughput']:.2f} польз/с")
+	print(f"{'этап':8}" + "".join(f"{'p' + str(q):>10}" for q in PERCENTILES))
+	for name in STAGES:
+		values = result["latencies"][name]
+		print(f"{name:8}" + "".join(f"{percentile(values, q):>9.2f}s" for q in PERCENTILES))
+	for error in result["errors"][:5]:
+		print(f"  ! {error}")
+
+
+def find_saturation(results: List[dict]) -> Optional[float]:
+	base_p95 = percentile(results[0]["latencies"]["pay"], 95) if results else 0.0
+	for result in results:
+		p95 = percentile(result["latencies"]["pay"], 95)
+		if result["throughput"] < result["rate"] * SATURATION_RATIO:
+			return result["rate"]
+		if base_p95 and p95 > base_p95 * SATURATION_SLOWDOWN:
+			return result["rate"]
+	return None
+
+
+async def run(args) -> None:
+	fake = FakeTelegramAPI(port=args.api_port, latency=args.api_latency, record_replies=True)
+	llm = FakeLLMServer(port=args.llm_port, latency=args.llm_latency, jitter=args.llm_jitter,
+						max_concurrency=args.llm_concurrency)
+	await fake.start()
+	await llm.start()
+
+	tmp = tempfile.TemporaryDirectory()
+	os.environ.update({
+		"TOKEN": "123456:LOADTEST",
+		"TELEGRAM_API_URL": fake.api_url,
+		"DB_FERNET_KEY": Fernet.generate_key().decode(),
+		"DB_PATH": os.path.join(tmp.name, "data.sqlite"),
+	})
+	if not args.real_limits:
+		# Общие лимиты защищают Nominatim и CPU в бою; здесь меряем саму обработку
+		os.environ.setdefault("CHART_GLOBAL_RATE", "1000")
+		os.environ.setdefault("RENDER_GLOBAL_RATE", "1000")
+
+	import bot as bot_module
+	import calculator
+	import love_ai
+	from benchmarks.corpus import fake_geocode
+
+	calculator.geocode = fake_geocode
+	love_ai.LM_API_URL = llm.url
+
+	await bot_module.start_services(leader=False)
+	polling = asyncio.create_task(bot_module.bot.polling(non_stop=True, timeout=1))
+
+	results = []
+	first_uid = 100000
+	try:
+		for rate in args.rates:
+			result = await run_step(fake, rate, args.duration, first_uid, args.timeout)
+			first_uid += result["users"]
+			results.append(result)
+			print_step(result)
+	finally:
+		polling.cancel()
+		await asyncio.gather(polling, return_exceptions=True)
+		await bot_module.stop_services()
+		await llm.stop()
+		await fake.stop()
+		tmp.cleanup()
+
+	saturation = find_saturation(results)
+	print(f"\nЗапросов к LLM: {llm.requests}, одновременно максимум {llm.peak_active}")
+	print(f"Вызовы Bot API: {dict(fake.calls)}")
+	if saturation is None:
+		print("Насыщение не достигнуто — увеличьте --rates")
+	else:
+		print(f"Насыщение на {saturation:g} польз/с")
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--rates", type=float, nargs="+", default=[0.5, 1, 2, 4], help="пользователей в секунду")
+	parser.add_argument("--duration", type=float, default=30, help="длительность ступени, с")
+	parser.add_argument("--timeout", type=float, default=300, help="ожидание ответа на этапе, с")
+	parser.add_argument("--api-port", type=int, default=8095)
+	parser.add_argument("--api-latency", type=float, default=0.05)
+	parser.add_argument("--llm-port", type=int, default=8094)
+	parser.add_argument("--llm-latency", type=float, default=2.0)
+	parser.add_argument("--llm-jitter", type=float, default=0.5)
+	parser.add_argument("--llm-concurrency", type=int, default=4, help="параллельных генераций у модели")
+	parser.add_argument("--real-limits", action="store_true", help="не ослаблять общие лимиты ratelimit")
+	asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+	main()
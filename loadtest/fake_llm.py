@@ -0,0 +1,83 @@
+"""
+Заглушка OpenAI-совместимого сервера для love_ai.
+
+Отвечает на POST /v1/chat/completions готовым текстом через latency ± jitter
+секунд и считает запросы и максимальное число одновременных генераций.
+Подключение:
+
+	import love_ai
+	love_ai.LM_API_URL = fake.url
+"""
+
+import asyncio
+import random
+import time
+from typing import Optional
+
+from aiohttp import web
+
+
+SAMPLE_TEXT = (
+	"Вы тонко чувствуете настроение близких и умеете поддержать в трудную минуту. "
+	"Ваша сила — в искренности и готовности учиться на собственном опыте. "
+	"Доверяйте интуиции, но проверяйте решения спокойным анализом."
+)
+
+
+class FakeLLMServer:
+	def __init__(self, host: str = "127.0.0.1", port: int = 8094, latency: float = 2.0,
+				 jitter: float = 0.5, max_concurrency: Optional[int] = None):
+		self.host = host
+		self.port = port
+		self.latency = latency
+		self.jitter = jitter
+		# Локальная модель обслуживает ограниченное число запросов одновременно
+		self._slots = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+		self.requests = 0
+		self.active = 0
+		self.peak_active = 0
+		self._runner: Optional[web.AppRunner] = None
+
+	@property
+	def url(self) -> str:
+		return f"http://{self.host}:{self.port}/v1/chat/completions"
+
+	async def start(self) -> None:
+		app = web.Application()
+		app.router.add_post("/v1/chat/completions", self.handle_completion)
+		self._runner = web.AppRunner(app)
+		await self._runner.setup()
+		await web.TCPSite(self._runner, self.host, self.port).start()
+
+	async def stop(self) -> None:
+		if self._runner is not None:
+			await self._runner.cleanup()
+			self._runner = None
+
+	async def _generate(self) -> None:
+		self.active += 1
+		self.peak_active = max(self.peak_active, self.active)
+		try:
+			await asyncio.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+		finally:
+			self.active -= 1
+
+	async def handle_completion(self, request: web.Request) -> web.Response:
+		payload = await request.json()
+		self.requests += 1
+		if self._slots is not None:
+			async with self._slots:
+				await self._generate()
+		else:
+			await self._generate()
+		return web.json_response({
+			"id": f"chatcmpl-{self.requests}",
+			"object": "chat.completion",
+			"created": int(time.time()),
+			"model": payload.get("model", "fake"),
+			"choices": [{
+				"index": 0,
+				"message": {"role": "assistant", "content": SAMPLE_TEXT},
+				"finish_reason": "stop",
+			}],
+		})
@@ -0,0 +1,167 @@
+"""
+Локальная заглушка Telegram Bot API.
+
+Отвечает на /bot<token>/<method> правдоподобными JSON-ответами и считает
+вызовы, чтобы нагрузочные скрипты могли проверить, сколько сообщений бот
+реально отправил. Апдейты для polling-режима подкладываются через
+push_update и отдаются боту в getUpdates; с record_replies=True ответы
+бота складываются в очередь чата (next_reply). Подключение бота:
+
+	import telebot.asyncio_helper as asyncio_helper
+	asyncio_helper.API_URL = fake.api_url
+"""
+
+import asyncio
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl
+
+from aiohttp import web
+
+
+BOT_USER = {"id": 100000001, "is_bot": True, "first_name": "FakeBot", "username": "fake_natal_bot"}
+
+
+class FakeTelegramAPI:
+	def __init__(self, host: str = "127.0.0.1", port: int = 8081, latency: float = 0.0,
+				 record_replies: bool = False):
+		self.host = host
+		self.port = port
+		self.latency = latency
+		self.record_replies = record_replies
+		self.calls: Counter = Counter()
+		self._message_id = 0
+		self._runner: Optional[web.AppRunner] = None
+		self._updates: List[Dict[str, Any]] = []
+		self._update_id = 0
+		self._new_updates = asyncio.Event()
+		self._replies: Dict[int, asyncio.Queue] = {}
+
+	@property
+	def api_url(self) -> str:
+		return f"http://{self.host}:{self.port}/bot{{0}}/{{1}}"
+
+	def make_app(self) -> web.Application:
+		app = web.Application(client_max_size=64 * 1024 * 1024)
+		app.router.add_route("*", "/bot{token}/{method}", self.handle_method)
+		return app
+
+	async def start(self) -> None:
+		self._runner = web.AppRunner(self.make_app())
+		await self._runner.setup()
+		await web.TCPSite(self._runner, self.host, self.port).start()
+
+	async def stop(self) -> None:
+		if self._runner is not None:
+			await self._runner.cleanup()
+			self._runner = None
+
+	def push_update(self, update: Dict[str, Any]) -> int:
+		"""Ставит апдейт в очередь getUpdates; update_id назначается по порядку."""
+		self._update_id += 1
+		update["update_id"] = self._update_id
+		self._updates.append(update)
+		self._new_updates.set()
+		return self._update_id
+
+	async def _get_updates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+		offset = int(params.get("offset", 0) or 0)
+		self._updates = [u for u in self._updates if u["update_id"] >= offset]
+		if not self._updates:
+			self._new_updates.clear()
+			try:
+				await asyncio.wait_for(self._new_updates.wait(), timeout=float(params.get("timeout", 0) or 0))
+			except asyncio.TimeoutError:
+				pass
+		limit = int(params.get("limit", 100) or 100)
+		return self._updates[:limit]
+
+	def replies(self, chat_id: int) -> asyncio.Queue:
+		queue = self._replies.get(chat_id)
+		if queue is None:
+			queue = self._replies[chat_id] = asyncio.Queue()
+		return queue
+
+	async def next_reply(self, chat_id: int, methods: Set[str], predicate=None, timeout: float = 60) -> Tuple[str, Dict[str, Any]]:
+		"""Ждёт вызов одного из methods, адресованный чату (остальные пропускает)."""
+		queue = self.replies(chat_id)
+		deadline = time.monotonic() + timeout
+		while True:
+			method, params = await asyncio.wait_for(queue.get(), timeout=max(0.0, deadline - time.monotonic()))
+			if method in methods and (predicate is None or predicate(params)):
+				return method, params
+
+	async def wait_for(self, method: str, count: int, timeout: float = 60) -> bool:
+		"""Ждёт, пока method будет вызван не меньше count раз."""
+		deadline = time.monotonic() + timeout
+		while self.calls[method] < count:
+			if time.monotonic() > deadline:
+				return False
+			await asyncio.sleep(0.01)
+		return True
+
+	async def _params(self, request: web.Request) -> Dict[str, Any]:
+		"""Параметры из query и тела. telebot шлёт getUpdates методом GET с формой
+		в теле, а request.post() для GET тело не читает — разбираем сами."""
+		params: Dict[str, Any] = dict(request.query)
+		if not request.body_exists:
+			return params
+		if request.content_type == "application/json":
+			params.update(await request.json())
+		elif request.method in request.POST_METHODS:
+			params.update((await request.post()).items())
+		elif request.content_type == "application/x-www-form-urlencoded":
+			params.update(parse_qsl(await request.text(), keep_blank_values=True))
+		elif request.content_type.startswith("multipart/"):
+			reader = await request.multipart()
+			async for part in reader:
+				params[part.name] = await part.read() if part.filename else await part.text()
+		return params
+
+	def _message(self, params: Dict[str, Any], **extra: Any) -> Dict[str, Any]:
+		self._message_id += 1
+		chat_id = int(params.get("chat_id", 0) or 0)
+		message = {
+			"message_id": self._message_id,
+			"date": int(time.time()),
+			"chat": {"id": chat_id, "type": "private"},
+			"from": BOT_USER,
+		}
+		if "text" in params:
+			message["text"] = str(params["text"])
+		message.update(extra)
+		return message
+
+	def result_for(self, method: str, params: Dict[str, Any]) -> Any:
+		if method == "getMe":
+			return BOT_USER
+		if method in ("sendMessage", "editMessageText"):
+			return self._message(params)
+		if method == "sendDocument":
+			return self._message(params, document={
+				"file_id": f"fake-file-{self._message_id + 1}",
+				"file_unique_id": f"fake-unique-{self._message_id + 1}",
+				"file_name": "report.pdf",
+			})
+		if method == "sendInvoice":
+			return self._message(params, invoice={
+				"title": params.get("title", ""), "description": params.get("description", ""),
+				"start_parameter": "", "currency": params.get("currency", "XTR"), "total_amount": 0,
+			})
+		return True
+
+	async def handle_method(self, request: web.Request) -> web.Response:
+		method = request.match_info["method"]
+		params = await self._params(request)
+		if method == "getUpdates":
+			self.calls[method] += 1
+			return web.json_response({"ok": True, "result": await self._get_updates(params)})
+
+		if self.latency:
+			await asyncio.sleep(self.latency)
+		self.calls[method] += 1
+		result = self.result_for(method, params)
+		if self.record_replies and params.get("chat_id"):
+			self.replies(int(params["chat_id"])).put_nowait((method, params))
+		return web.json_response({"ok": True, "result": result})
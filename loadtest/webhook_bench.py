@@ -0,0 +1,103 @@
+"""
+Офлайн-замер пропускной способности webhook-режима.
+
+Поднимает заглушку Bot API, webhook-сервер с настоящими хендлерами bot.py
+и заваливает его апдейтами от множества чатов:
+
+	python -m loadtest.webhook_bench --updates 5000 --chats 500 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+import aiohttp
+
+from loadtest.fake_telegram import FakeTelegramAPI
+
+
+def make_command_update(update_id: int, chat_id: int, command: str = "/info") -> dict:
+	return {
+		"update_id": update_id,
+		"message": {
+			"message_id": update_id,
+			"date": int(time.time()),
+			"chat": {"id": chat_id, "type": "private"},
+			"from": {"id": chat_id, "is_bot": False, "first_name": f"Load{chat_id}"},
+			"text": command,
+			"entities": [{"type": "bot_command", "offset": 0, "length": len(command)}],
+		},
+	}
+
+
+async def _post_all(url: str, updates: list, concurrency: int) -> dict:
+	statuses = {}
+	semaphore = asyncio.Semaphore(concurrency)
+
+	async with aiohttp.ClientSession() as session:
+		async def post(update):
+			async with semaphore:
+				async with session.post(url, json=update) as resp:
+					statuses[resp.status] = statuses.get(resp.status, 0) + 1
+
+		await asyncio.gather(*(post(u) for u in updates))
+	return statuses
+
+
+async def run(args) -> None:
+	fake = FakeTelegramAPI(port=args.api_port, latency=args.api_latency)
+	await fake.start()
+
+	os.environ.setdefault("TOKEN", "123456:LOADTEST")
+	import telebot.asyncio_helper as asyncio_helper
+	asyncio_helper.API_URL = fake.api_url
+
+	import bot as bot_module
+	from webhook import WebhookServer
+
+	server = WebhookServer(bot_module.bot, path="/hook", queue_size=args.queue, workers=args.workers)
+	await server.start(host="127.0.0.1", port=args.port)
+
+	updates = [
+		make_command_update(i + 1, 1000 + i % args.chats)
+		for i in range(args.updates)
+	]
+	# Каждый десятый апдейт — повтор, его должна отсечь дедупликация
+	updates += updates[::10]
+
+	started = time.perf_counter()
+	statuses = await _post_all(f"http://127.0.0.1:{args.port}/hook", updates, args.concurrency)
+	accepted = time.perf_counter() - started
+
+	expected = args.updates - statuses.get(503, 0)
+	completed = await fake.wait_for("sendMessage", expected, timeout=args.timeout)
+	processed = time.perf_counter() - started
+
+	await server.stop()
+	await fake.stop()
+
+	print(f"Апдейтов отправлено: {len(updates)} (из них повторов: {len(updates) - args.updates})")
+	print(f"HTTP-статусы: {statuses}")
+	print(f"Статистика сервера: {server.stats}")
+	print(f"Приём: {len(updates) / accepted:.0f} апд/с за {accepted:.2f} с")
+	print(f"Обработка: {fake.calls['sendMessage'] / processed:.0f} ответов/с за {processed:.2f} с"
+		  + ("" if completed else " (не дождались всех ответов)"))
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--updates", type=int, default=2000)
+	parser.add_argument("--chats", type=int, default=200)
+	parser.add_argument("--concurrency", type=int, default=64)
+	parser.add_argument("--workers", type=int, default=32)
+	parser.add_argument("--queue", type=int, default=1000)
+	parser.add_argument("--port", type=int, default=8090)
+	parser.add_argument("--api-port", type=int, default=8091)
+	parser.add_argument("--api-latency", type=float, default=0.0, help="задержка ответа заглушки Bot API, с")
+	parser.add_argument("--timeout", type=float, default=120)
+	asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+	main()
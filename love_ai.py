@@ -12,12 +12,14 @@
 """
 
 import asyncio
-from typing import Dict
+from typing import Dict, Optional
 
 import aiohttp
 
 from calculator import deg_to_sign
-from texts import get_house
+from metrics import counter, timed
+from tracing import span
+from texts import format_ranges, get_house
 
 
 MODEL_NAME = "qwen2.5-3b-instruct"
@@ -27,6 +29,8 @@ REQUEST_TIMEOUT = 1000
 TEMPERATURE = 0.3
 MAX_TOKENS = 300
 
+_fallbacks = counter("llm_fallbacks", "Разделы, заменённые запасным текстом")
+
 
 FALLBACK_TEXTS: Dict[str, str] = {
 	"love": (
@@ -73,45 +77,53 @@ SECTION_CONFIG: Dict[str, Dict[str, str]] = {
 }
 
 
+def _placement(chart: Dict, planet: str, label: str, with_sign: bool = True) -> str:
+	"""«Венера в 5-м доме, знак Рак». Без времени рождения дом называется, только
+	если он один на все сутки (иначе вместо дома — знак), а знак, сменившийся
+	за сутки, — диапазонами."""
+	lon = chart.get("positions", {}).get(planet, 0)
+	sign = deg_to_sign(lon).split('°')[-1].strip()
+	unknown = chart.get("unknown_time")
+	if not unknown:
+		return f"{label} в {get_house(chart.get('cusps', []), lon)}-м доме" + (f", знак {sign}" if with_sign else "")
+
+	signs = unknown.get("signs", {}).get(planet, [])
+	if len(signs) > 1:
+		sign = f"зависит от времени рождения ({format_ranges(signs)})"
+	houses = unknown.get("houses", {}).get(planet, [])
+	if len(houses) != 1:
+		return f"{label}: дом не определён, знак {sign}"
+	return f"{label} в {houses[0]['house']}-м доме" + (f", знак {sign}" if with_sign else "")
+
+
 def _extract_chart_facts(chart: Dict, section: str) -> str:
 	facts = []
 
 	try:
-		pos = chart.get("positions", {})
-		cusps = chart.get("cusps", [])
 		aspects = chart.get("aspects", [])
+		# Без времени рождения дома и Асцендент условные — в промпт их не передаём
+		unknown = chart.get("unknown_time")
 
 		if section == "love":
-			facts.append(
-				f"Венера в {get_house(cusps, pos.get('Venus', 0))}-м доме, "
-				f"знак {deg_to_sign(pos.get('Venus', 0)).split('°')[-1].strip()}"
-			)
-			facts.append(
-				f"Луна в {get_house(cusps, pos.get('Moon', 0))}-м доме, "
-				f"знак {deg_to_sign(pos.get('Moon', 0)).split('°')[-1].strip()}"
-			)
+			facts.append(_placement(chart, "Venus", "Венера"))
+			facts.append(_placement(chart, "Moon", "Луна"))
 
 		elif section == "money":
-			facts.append(
-				f"Юпитер в {get_house(cusps, pos.get('Jupiter', 0))}-м доме, "
-				f"знак {deg_to_sign(pos.get('Jupiter', 0)).split('°')[-1].strip()}"
-			)
+			facts.append(_placement(chart, "Jupiter", "Юпитер"))
 
 		elif section == "shadow":
-			facts.append(f"Сатурн в {get_house(cusps, pos.get('Saturn', 0))}-м доме")
-			facts.append(f"Плутон в {get_house(cusps, pos.get('Pluto', 0))}-м доме")
+			facts.append(_placement(chart, "Saturn", "Сатурн", with_sign=False))
+			facts.append(_placement(chart, "Pluto", "Плутон", with_sign=False))
 			tense = [f"{a['p1']} {a['type']} {a['p2']}" for a in aspects if a.get("type") in ("square", "opp", "conjunction")]
 			if tense:
 				facts.append(f"Напряжённые аспекты (max 3): {', '.join(tense[:3])}")
 
 		elif section == "task":
-			facts.append(
-				f"Солнце в {get_house(cusps, pos.get('Sun', 0))}-м доме, "
-				f"знак {deg_to_sign(pos.get('Sun', 0)).split('°')[-1].strip()}"
-			)
-			facts.append(
-				f"Асцендент: {deg_to_sign(chart.get('asc', 0)).split('°')[-1].strip()}"
-			)
+			facts.append(_placement(chart, "Sun", "Солнце"))
+			if not unknown:
+				facts.append(
+					f"Асцендент: {deg_to_sign(chart.get('asc', 0)).split('°')[-1].strip()}"
+				)
 
 	except Exception:
 		facts.append("Базовые данные карты доступны")
@@ -140,7 +152,18 @@ async def generate_section(section: str, chart: Dict, session: aiohttp.ClientSes
 	"""Генерирует текст для одного раздела с помощью локальной LLM."""
 	if section not in FALLBACK_TEXTS:
 		return FALLBACK_TEXTS["love"]
-	
+
+	with span("llm.section", section=section) as s, timed("llm_section_seconds", "Генерация раздела LLM", section=section):
+		text = await _request_section(section, chart, session)
+		s.set(fallback=text is None)
+	if text is None:
+		_fallbacks.inc(section=section)
+		return FALLBACK_TEXTS[section]
+	return text
+
+
+async def _request_section(section: str, chart: Dict, session: aiohttp.ClientSession) -> Optional[str]:
+	"""Запрос к LLM; None — модель недоступна или ответила слишком коротко."""
 	messages = [
 		{
 			"role": "system",
@@ -186,7 +209,23 @@ async def generate_section(section: str, chart: Dict, session: aiohttp.ClientSes
 	except Exception as e:
 		print(f"[{section}] Ошибка генерации: {type(e).__name__}: {e}")
 
-	return FALLBACK_TEXTS[section]
+	return None
+
+
+async def ping(timeout: float = 120) -> None:
+	"""Минимальный запрос к модели (1 токен): заставляет LM Studio загрузить её.
+	Поднимает исключение, если модель не ответила."""
+	payload = {
+		"model": MODEL_NAME,
+		"messages": [{"role": "user", "content": "Привет"}],
+		"max_tokens": 1,
+		"stream": False
+	}
+	async with aiohttp.ClientSession() as session:
+		async with session.post(LM_API_URL, json=payload, timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+			if resp.status != 200:
+				raise RuntimeError(f"LLM ответила {resp.status}")
+			await resp.json()
 
 
 async def generate_all_sections(chart: Dict) -> Dict[str, str]:
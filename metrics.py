@@ -0,0 +1,304 @@
+"""
+Метрики бота: счётчики, гистограммы и gauge в памяти процесса.
+
+	from metrics import counter, histogram, timed
+
+	with timed("chart_stage_seconds", stage="ephemeris"):
+		...
+
+	@timed("pdf_build_seconds")
+	def build(): ...
+
+Наблюдение — это поиск корзины bisect'ом и инкремент под threading.Lock,
+поэтому инструменты можно держать включёнными под нагрузкой. Модуль не
+зависит от aiohttp: HTTP-экспорт (/metrics в формате Prometheus)
+подключается через handle_metrics или start_exporter.
+"""
+
+import asyncio
+import bisect
+import functools
+import hmac
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0 — отдельный экспортер не поднимается
+# Bearer-токен для /metrics на публичном порту webhook; без него там /metrics нет
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Корзины по умолчанию, с: от геокодинга до многоминутного рендера
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+	return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+	pairs = list(labels) + ([extra] if extra else [])
+	if not pairs:
+		return ""
+	return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+	return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+	kind = "counter"
+
+	def __init__(self, name: str, help: str = ""):
+		self.name = name
+		self.help = help
+		self._values: Dict[Labels, float] = {}
+		self._lock = threading.Lock()
+
+	def inc(self, amount: float = 1, **labels) -> None:
+		key = _labels(labels)
+		with self._lock:
+			self._values[key] = self._values.get(key, 0) + amount
+
+	def value(self, **labels) -> float:
+		return self._values.get(_labels(labels), 0)
+
+	def samples(self) -> Iterable[Tuple[str, Labels, float]]:
+		with self._lock:
+			items = list(self._values.items())
+		for labels, value in items:
+			yield self.name + "_total", labels, value
+
+
+class Gauge:
+	"""Текущее значение; func вызывается при каждом чтении (глубина очереди и т.п.)."""
+
+	kind = "gauge"
+
+	def __init__(self, name: str, help: str = "", func: Optional[Callable[[], float]] = None):
+		self.name = name
+		self.help = help
+		self.func = func
+		self._values: Dict[Labels, float] = {}
+
+	def set(self, value: float, **labels) -> None:
+		self._values[_labels(labels)] = value
+
+	def value(self, **labels) -> float:
+		if self.func is not None:
+			return self.func()
+		return self._values.get(_labels(labels), 0)
+
+	def samples(self) -> Iterable[Tuple[str, Labels, float]]:
+		if self.func is not None:
+			try:
+				yield self.name, (), float(self.func())
+			except Exception as e:
+				print(f"[metrics] Не удалось прочитать {self.name}: {e}")
+			return
+		for labels, value in list(self._values.items()):
+			yield self.name, labels, value
+
+
+class Histogram:
+	kind = "histogram"
+
+	def __init__(self, name: str, help: str = "", buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+		self.name = name
+		self.help = help
+		self.buckets = tuple(sorted(buckets))
+		# labels → [счётчики корзин (+Inf последней), сумма, количество]
+		self._series: Dict[Labels, List] = {}
+		self._lock = threading.Lock()
+
+	def observe(self, value: float, **labels) -> None:
+		key = _labels(labels)
+		index = bisect.bisect_left(self.buckets, value)
+		with self._lock:
+			series = self._series.get(key)
+			if series is None:
+				series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+			series[0][index] += 1
+			series[1] += value
+			series[2] += 1
+
+	def stats(self, **labels) -> Tuple[int, float]:
+		"""(количество, сумма) наблюдений."""
+		series = self._series.get(_labels(labels))
+		return (series[2], series[1]) if series else (0, 0.0)
+
+	def quantile(self, q: float, **labels) -> float:
+		"""Оценка квантиля по корзинам (верхняя граница корзины)."""
+		series = self._series.get(_labels(labels))
+		if not series or not series[2]:
+			return 0.0
+		rank = q * series[2]
+		seen = 0
+		for bound, count in zip(self.buckets + (float("inf"),), series[0]):
+			seen += count
+			if seen >= rank:
+				return bound
+		return float("inf")
+
+	def series(self) -> List[Labels]:
+		return list(self._series)
+
+	def samples(self) -> Iterable[Tuple[str, Labels, float]]:
+		with self._lock:
+			items = [(labels, list(s[0]), s[1], s[2]) for labels, s in self._series.items()]
+		for labels, counts, total, count in items:
+			cumulative = 0
+			for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+				cumulative += bucket_count
+				le = "+Inf" if bound == float("inf") else repr(bound)
+				yield self.name + "_bucket", labels + (("le", le),), cumulative
+			yield self.name + "_sum", labels, total
+			yield self.name + "_count", labels, count
+
+
+class Registry:
+	def __init__(self):
+		self._metrics: Dict[str, object] = {}
+		self._lock = threading.Lock()
+
+	def _get_or_create(self, cls, name: str, *args, **kwargs):
+		with self._lock:
+			metric = self._metrics.get(name)
+			if metric is None:
+				metric = self._metrics[name] = cls(name, *args, **kwargs)
+			elif not isinstance(metric, cls):
+				raise ValueError(f"Метрика {name} уже зарегистрирована как {metric.kind}")
+			return metric
+
+	def get(self, name: str):
+		return self._metrics.get(name)
+
+	def render(self) -> str:
+		"""Текстовый формат экспозиции Prometheus."""
+		lines = []
+		for metric in list(self._metrics.values()):
+			family = metric.name + "_total" if metric.kind == "counter" else metric.name
+			if metric.help:
+				lines.append(f"# HELP {family} {metric.help}")
+			lines.append(f"# TYPE {family} {metric.kind}")
+			for name, labels, value in metric.samples():
+				lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+		return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help: str = "") -> Counter:
+	return REGISTRY._get_or_create(Counter, name, help)
+
+
+def gauge(name: str, help: str = "", func: Optional[Callable[[], float]] = None) -> Gauge:
+	metric = REGISTRY._get_or_create(Gauge, name, help)
+	if func is not None:
+		metric.func = func
+	return metric
+
+
+def histogram(name: str, help: str = "", buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+	return REGISTRY._get_or_create(Histogram, name, help, buckets)
+
+
+class timed:
+	"""Замер длительности в гистограмму name: контекстный менеджер и декоратор
+	(для обычных и async-функций)."""
+
+	def __init__(self, name: str, help: str = "", **labels):
+		self.histogram = histogram(name, help)
+		self.labels = labels
+		self._started: List[float] = []
+
+	def __enter__(self) -> "timed":
+		self._started.append(time.perf_counter())
+		return self
+
+	def __exit__(self, exc_type, exc, tb) -> None:
+		self.histogram.observe(time.perf_counter() - self._started.pop(), **self.labels)
+
+	def __call__(self, func: Callable) -> Callable:
+		if asyncio.iscoroutinefunction(func):
+			@functools.wraps(func)
+			async def async_wrapper(*args, **kwargs):
+				started = time.perf_counter()
+				try:
+					return await func(*args, **kwargs)
+				finally:
+					self.histogram.observe(time.perf_counter() - started, **self.labels)
+			return async_wrapper
+
+		@functools.wraps(func)
+		def wrapper(*args, **kwargs):
+			started = time.perf_counter()
+			try:
+				return func(*args, **kwargs)
+			finally:
+				self.histogram.observe(time.perf_counter() - started, **self.labels)
+		return wrapper
+
+
+# ---------------------------------------------------------------------------
+# Сводка для администратора и HTTP-экспорт
+# ---------------------------------------------------------------------------
+
+def summary() -> str:
+	"""Короткая сводка: счётчики и p50/p95 по каждой гистограмме."""
+	lines = []
+	for metric in list(REGISTRY._metrics.values()):
+		if isinstance(metric, Histogram):
+			for labels in metric.series():
+				kwargs = dict(labels)
+				count, total = metric.stats(**kwargs)
+				if not count:
+					continue
+				lines.append(
+					f"{metric.name}{_format_labels(labels)}: {count} шт., ср. {total / count:.3f} с, "
+					f"p50 ≤{metric.quantile(0.5, **kwargs):g} с, p95 ≤{metric.quantile(0.95, **kwargs):g} с"
+				)
+		else:
+			for name, labels, value in metric.samples():
+				lines.append(f"{name}{_format_labels(labels)}: {value:g}")
+	return "\n".join(lines) if lines else "Метрик пока нет"
+
+
+async def handle_metrics(request):
+	from aiohttp import web
+	return web.Response(text=REGISTRY.render(), content_type="text/plain", charset="utf-8")
+
+
+async def handle_protected_metrics(request):
+	"""/metrics на публичном порту: только с заголовком Authorization: Bearer METRICS_TOKEN."""
+	from aiohttp import web
+	expected = f"Bearer {METRICS_TOKEN}"
+	if not METRICS_TOKEN or not hmac.compare_digest(request.headers.get("Authorization", ""), expected):
+		return web.Response(status=401)
+	return await handle_metrics(request)
+
+
+async def start_exporter(host: str = METRICS_HOST, port: int = METRICS_PORT, routes=()):
+	"""Отдельный HTTP-сервер /metrics (по умолчанию на 127.0.0.1). Возвращает runner или None.
+
+	routes — дополнительные GET-обработчики (path, handler), например /healthz и /readyz.
+	"""
+	if not port:
+		return None
+	from aiohttp import web
+
+	app = web.Application()
+	app.router.add_get("/metrics", handle_metrics)
+	for path, handler in routes:
+		app.router.add_get(path, handler)
+	runner = web.AppRunner(app)
+	await runner.setup()
+	await web.TCPSite(runner, host, port).start()
+	print(f"[metrics] /metrics на {host}:{port}")
+	return runner
@@ -1,19 +1,25 @@
+import asyncio
 import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 from dotenv import load_dotenv
 from telebot.types import LabeledPrice
 
+from runtime import spawn
+from states import get_db
+
 load_dotenv()
 
 PRICE_STARS = int(os.getenv("PRICE_STARS", "100"))
 
 
-def send_full_chart_invoice(bot, chat_id):
+async def send_full_chart_invoice(bot, chat_id):
 	"""
 	Отправляет инвойс на оплату полного натального разбора (Telegram Stars / XTR)
 	"""
 	prices = [LabeledPrice(label="Полный натальный разбор", amount=PRICE_STARS)]
 
-	bot.send_invoice(
+	await bot.send_invoice(
 		chat_id=chat_id,
 		title="Полный натальный разбор",
 		description="Все планеты в знаках и домах, ключевые аспекты, "
@@ -23,3 +29,176 @@ def send_full_chart_invoice(bot, chat_id):
 		currency="XTR",
 		prices=prices,
 	)
+
+
+# ---------------------------------------------------------------------------
+# Журнал платежей и выполнение заказов
+#
+# Каждый платёж (charge_id) проходит состояния
+#	paid → rendering → delivered
+# а при ошибке rendering → failed → rendering (повтор). Переходы дописываются
+# в таблицу payments и никогда не переписываются, поэтому после падения
+# процесса видно, на каком шаге остановился заказ.
+# ---------------------------------------------------------------------------
+
+PAID = "paid"
+RENDERING = "rendering"
+DELIVERED = "delivered"
+FAILED = "failed"
+
+_TRANSITIONS = {
+	None: {PAID},
+	PAID: {RENDERING},
+	RENDERING: {RENDERING, DELIVERED, FAILED},
+	FAILED: {RENDERING},
+	DELIVERED: set(),
+}
+
+RECONCILE_INTERVAL = int(os.getenv("RECONCILE_INTERVAL", "60"))
+PAID_STALE_AFTER = 120          # оплачен, но рендер так и не начался
+RENDERING_STALE_AFTER = 1800    # рендер «идёт» дольше любого реального рендера
+FAILED_RETRY_AFTER = 600
+MAX_FULFILLMENT_ATTEMPTS = 3
+
+# In-memory журнал, если БД не настроена
+_in_memory_ledger: List[Dict[str, Any]] = []
+
+
+def _events(charge_id: str) -> List[Dict[str, Any]]:
+	return [e for e in _in_memory_ledger if e["charge_id"] == charge_id]
+
+
+def payment_status(charge_id: str) -> Optional[str]:
+	db = get_db()
+	if db:
+		return db.get_payment_status(charge_id)
+	events = _events(charge_id)
+	return events[-1]["status"] if events else None
+
+
+def _append(uid: int, charge_id: str, status: str, payload: Optional[Dict[str, Any]] = None,
+			provider_invoice_id: Optional[str] = None) -> None:
+	db = get_db()
+	if db:
+		db.append_payment_event(uid, charge_id, status, payload, provider_invoice_id)
+		return
+	_in_memory_ledger.append({
+		"telegram_id": uid, "charge_id": charge_id, "status": status,
+		"payload": payload, "created_at": time.time(),
+	})
+
+
+def advance(uid: int, charge_id: str, status: str, payload: Optional[Dict[str, Any]] = None) -> bool:
+	"""Переводит платёж в status. Недопустимый переход (в т.ч. повтор) игнорируется → False."""
+	current = payment_status(charge_id)
+	if status not in _TRANSITIONS.get(current, set()):
+		return False
+	_append(uid, charge_id, status, payload)
+	return True
+
+
+def record_payment(uid: int, successful_payment) -> bool:
+	"""Записывает successful_payment в журнал. False, если этот charge_id уже записан."""
+	charge_id = successful_payment.telegram_payment_charge_id
+	if payment_status(charge_id) is not None:
+		return False
+	_append(
+		uid,
+		charge_id,
+		PAID,
+		{
+			"amount": successful_payment.total_amount,
+			"currency": successful_payment.currency,
+			"invoice_payload": successful_payment.invoice_payload,
+		},
+		provider_invoice_id=successful_payment.provider_payment_charge_id,
+	)
+	return True
+
+
+def latest_payment(uid: int) -> Optional[Dict[str, Any]]:
+	db = get_db()
+	if db:
+		return db.get_latest_payment(uid)
+	for event in reversed(_in_memory_ledger):
+		if event["telegram_id"] == uid:
+			return dict(event)
+	return None
+
+
+def open_payments() -> List[Dict[str, Any]]:
+	"""Незавершённые заказы: последний статус paid / rendering / failed."""
+	statuses = [PAID, RENDERING, FAILED]
+	db = get_db()
+	if db:
+		return db.get_open_payments(statuses)
+
+	latest: Dict[str, Dict[str, Any]] = {}
+	attempts: Dict[str, int] = {}
+	for event in _in_memory_ledger:
+		latest[event["charge_id"]] = event
+		if event["status"] == RENDERING:
+			attempts[event["charge_id"]] = attempts.get(event["charge_id"], 0) + 1
+	now = time.time()
+	return [
+		{
+			"telegram_id": e["telegram_id"], "charge_id": cid, "status": e["status"],
+			"attempts": attempts.get(cid, 0), "age": int(now - e["created_at"]),
+		}
+		for cid, e in latest.items() if e["status"] in statuses
+	]
+
+
+def _is_stale(order: Dict[str, Any]) -> bool:
+	if order["attempts"] >= MAX_FULFILLMENT_ATTEMPTS:
+		return False
+	stale_after = {
+		PAID: PAID_STALE_AFTER,
+		RENDERING: RENDERING_STALE_AFTER,
+		FAILED: FAILED_RETRY_AFTER,
+	}[order["status"]]
+	return order["age"] >= stale_after
+
+
+class FulfillmentReconciler:
+	"""Фоновая задача: находит оплаченные, но не доставленные заказы и перезапускает доставку.
+
+	fulfil(uid, charge_id) — корутина, выполняющая заказ (рендер + отправка).
+	owns(uid) — заказы каких пользователей сверяет этот процесс: в кластере
+	каждый воркер довыполняет только своих, чтобы состояние пользователя
+	писал один процесс.
+	"""
+
+	def __init__(self, fulfil: Callable[[int, str], Awaitable[Any]], interval: float = RECONCILE_INTERVAL,
+				 owns: Optional[Callable[[int], bool]] = None):
+		self.fulfil = fulfil
+		self.interval = interval
+		self.owns = owns or (lambda uid: True)
+		self._task: Optional[asyncio.Task] = None
+
+	async def reconcile_once(self) -> int:
+		restarted = 0
+		for order in open_payments():
+			if not _is_stale(order) or not self.owns(order["telegram_id"]):
+				continue
+			print(f"[payments] Перезапуск заказа {order['charge_id']} ({order['status']}, попыток {order['attempts']})")
+			spawn(self.fulfil(order["telegram_id"], order["charge_id"]), name=f"reconcile-{order['charge_id']}")
+			restarted += 1
+		return restarted
+
+	def start(self) -> None:
+		if self._task is None:
+			self._task = spawn(self._loop(), name="payments-reconciler")
+
+	def stop(self) -> None:
+		if self._task is not None:
+			self._task.cancel()
+			self._task = None
+
+	async def _loop(self) -> None:
+		while True:
+			try:
+				await self.reconcile_once()
+			except Exception as e:
+				print(f"[payments] Ошибка сверки заказов: {e}")
+			await asyncio.sleep(self.interval)
@@ -1,27 +1,75 @@
+import math
 import os
+import tempfile
 from datetime import datetime
+from functools import lru_cache
 from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, PageBreak, KeepTogether
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, PageBreak, KeepTogether, Table, TableStyle
+from reportlab.platypus.flowables import Flowable
+from reportlab.lib.styles import ParagraphStyle
 from reportlab.lib.units import mm, cm
 from reportlab.lib import colors
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.graphics.shapes import Circle, Drawing, Line, PolyLine, Rect, String
 
-from calculator import deg_to_sign
+from astrocartography import MAX_LATITUDE, lines_near, planet_lines
+from calculator import deg_to_sign, find_aspects
+from houses import COMPARE_SYSTEMS, HOUSE_NAMES_RU, chosen_system, compare_systems
 from mc_loader import get_mc_interpretation
-from texts import ASPECT_NAMES_RU, PLANET_EMOJI, get_ascendant_interpretation, get_aspect_interpretation, get_house, get_planet_interpretation, get_sign_name
+from texts import ASPECT_NAMES_RU, BODY_NAMES_RU, PLANET_EMOJI, describe_line, describe_transit, house_system_note, format_ranges, get_ascendant_interpretation, get_aspect_interpretation, get_house, get_planet_interpretation, get_sign_name
 from love_ai import get_all_sections
+import pdf_merge
+from pdf_optimize import PDF_PAGE_COMPRESSION, PDF_STRICT_SUBSET, backgrounds, image_mask, log_size
+from transits import SLOW_PLANETS, TRANSIT_YEARS, find_transits, highlights, period_years
+from metrics import timed
+from startup import Lazy
+from tracing import traced
 
 FONTS_DIR = os.path.join(os.path.dirname(__file__), 'fonts')
+
+# Сколько аспектов расширенного набора тел выводить в PDF
+MAX_EXTENDED_ASPECTS = 15
+
+# Карта астрокартографии: цвет линий планет, размер, кэш готовых рисунков по карте
+PLANET_COLORS = {
+	'Sun': '#FFD54F', 'Moon': '#E0E0E0', 'Mercury': '#80DEEA', 'Venus': '#F48FB1', 'Mars': '#EF5350',
+	'Jupiter': '#FFB74D', 'Saturn': '#A1887F', 'Uranus': '#4DD0E1', 'Neptune': '#7986CB', 'Pluto': '#BA68C8'
+}
+MAP_WIDTH = 170*mm
+MAP_CACHE_SIZE = 64
+
+# Натальный круг: радиусы в единицах формы (внешний круг — WHEEL_RADIUS)
+WHEEL_SIZE = 160*mm
+WHEEL_RADIUS = 100.0
+WHEEL_SIGN_INNER = 85.0    # внутренняя граница кольца знаков
+WHEEL_PLANET = 70.0        # глифы планет
+WHEEL_ASPECT = 50.0        # круг аспектов
+WHEEL_HOUSE_NUMBER = 42.0  # номера домов
+WHEEL_MIN_GAP = 7.0        # минимальный угол между глифами планет, °
+WHEEL_FORM = "natalWheelRing"
+ZODIAC_GLYPHS = ['♈', '♉', '♊', '♋', '♌', '♍', '♎', '♏', '♐', '♑', '♒', '♓']
+WHEEL_ASPECT_COLORS = {
+	'trine': '#64B5F6', 'sextile': '#64B5F6',
+	'square': '#EF5350', 'opp': '#EF5350',
+}
 TEMP_DIR = os.path.join(os.path.dirname(__file__), 'temp')
 
-# Регистрация шрифтов (вызывается один раз при импорте)
-try:
-	pdfmetrics.registerFont(TTFont('DejaVu', os.path.join(FONTS_DIR, 'DejaVuSans.ttf')))
-	pdfmetrics.registerFont(TTFont('DejaVuBold', os.path.join(FONTS_DIR, 'DejaVuSans-Bold.ttf')))
-except Exception as e:
-	print(f"Ошибка загрузки шрифтов: {e}. Используется стандартный шрифт.")
+
+def _register_fonts() -> bool:
+	"""Разбирает TTF и регистрирует шрифты в ReportLab (один раз, при первом PDF или прогреве)"""
+	try:
+		# Встраиваются только использованные глифы; без резерва ASCII — меньше подмножеств
+		ascii_readable = not PDF_STRICT_SUBSET
+		pdfmetrics.registerFont(TTFont('DejaVu', os.path.join(FONTS_DIR, 'DejaVuSans.ttf'), asciiReadable=ascii_readable))
+		pdfmetrics.registerFont(TTFont('DejaVuBold', os.path.join(FONTS_DIR, 'DejaVuSans-Bold.ttf'), asciiReadable=ascii_readable))
+		return True
+	except Exception as e:
+		print(f"Ошибка загрузки шрифтов: {e}. Используется стандартный шрифт.")
+		return False
+
+
+fonts = Lazy("fonts", _register_fonts)
 
 
 def _sort_aspects(aspects: list) -> list:
@@ -58,19 +106,344 @@ def _group_planets_by_house(positions: dict, cusps: list) -> dict:
 	return planets_by_house
 
 
+def _extra_bodies_story(chart: dict, body_style, section_style) -> list:
+	"""Страница дополнительных тел (узлы, Лилит, Хирон, астероиды) и малых аспектов."""
+	story = [Paragraph("⚷ Дополнительные точки и малые аспекты", section_style), Spacer(1, 4*mm)]
+	cusps = chart.get('cusps') or []
+	for body, lon in chart['bodies'].items():
+		name = BODY_NAMES_RU.get(body, body)
+		line = f"{PLANET_EMOJI.get(body, '★')} <b>{name}</b>: {deg_to_sign(lon)}"
+		if cusps and not chart.get('unknown_time'):
+			line += f", {get_house(cusps, lon)} дом"
+		story.append(Paragraph(line, body_style))
+
+	# Мажорные аспекты между планетами уже есть выше — здесь остальные
+	aspects = [
+		a for a in chart.get('extended_aspects', [])
+		if a['minor'] or a['p1'] in chart['bodies'] or a['p2'] in chart['bodies']
+	][:MAX_EXTENDED_ASPECTS]
+	if aspects:
+		story.append(Spacer(1, 4*mm))
+		for asp in aspects:
+			p1 = BODY_NAMES_RU.get(asp['p1'], asp['p1'])
+			p2 = BODY_NAMES_RU.get(asp['p2'], asp['p2'])
+			typ = ASPECT_NAMES_RU.get(asp['type'], asp['type'])
+			story.append(Paragraph(f"{p1} {typ} {p2} (орб {asp['orb']:.1f}°)", body_style))
+	return story
+
+
+def _spread(lons: list, min_gap: float = WHEEL_MIN_GAP) -> list:
+	"""Углы отрисовки для долгот lons: глифы ближе min_gap раздвигаются.
+
+	Заметание по кругу за O(n log n): долготы сортируются начиная с самого
+	большого промежутка (через него кластеры не переходят), соседние глифы
+	ближе min_gap объединяются в кластеры, каждый кластер раскладывается с
+	шагом min_gap вокруг своего центра; кластеры, налезшие друг на друга
+	после раскладки, сливаются, пока пересечений не останется. Разросшийся
+	последний кластер может дойти через 360° до первого — тогда первый
+	вливается в него.
+	"""
+	n = len(lons)
+	if n < 2 or n * min_gap >= 360.0:
+		return list(lons)
+	order = sorted(range(n), key=lambda i: lons[i] % 360.0)
+	values = [lons[i] % 360.0 for i in order]
+	gaps = [(values[(k + 1) % n] - values[k]) % 360.0 for k in range(n)]
+	start = (max(range(n), key=lambda k: gaps[k]) + 1) % n
+	order = order[start:] + order[:start]
+	unrolled = []
+	for i in order:
+		lon = lons[i] % 360.0
+		while unrolled and lon < unrolled[-1]:
+			lon += 360.0
+		unrolled.append(lon)
+
+	# кластер — [первый индекс, число глифов, центр]
+	clusters = []
+
+	def merge_tail():
+		while len(clusters) > 1:
+			prev, last = clusters[-2], clusters[-1]
+			prev_end = prev[2] + (prev[1] - 1) * min_gap / 2
+			last_start = last[2] - (last[1] - 1) * min_gap / 2
+			if last_start - prev_end >= min_gap:
+				break
+			count = prev[1] + last[1]
+			center = (prev[2] * prev[1] + last[2] * last[1]) / count
+			clusters[-2:] = [[prev[0], count, center]]
+
+	for k, lon in enumerate(unrolled):
+		clusters.append([k, 1, lon])
+		merge_tail()
+
+	# Шов 360°: первый кластер (сдвинутый на оборот) переносится в конец и сливается
+	while len(clusters) > 1:
+		head, last = clusters[0], clusters[-1]
+		last_end = last[2] + (last[1] - 1) * min_gap / 2
+		head_start = head[2] + 360.0 - (head[1] - 1) * min_gap / 2
+		if head_start - last_end >= min_gap:
+			break
+		clusters.pop(0)
+		clusters.append([head[0] + n, head[1], head[2] + 360.0])
+		merge_tail()
+
+	angles = [0.0] * n
+	for first, count, center in clusters:
+		for offset in range(count):
+			angles[order[(first + offset) % n]] = (center + (offset - (count - 1) / 2) * min_gap) % 360.0
+	return angles
+
+
+def _wheel_point(lon: float, radius: float) -> tuple:
+	"""Точка круга для эклиптической долготы в системе формы (0° Овна слева)."""
+	angle = math.radians(180.0 + lon)
+	return radius * math.cos(angle), radius * math.sin(angle)
+
+
+def _build_wheel_ring(canv) -> None:
+	"""Статичное кольцо знаков как form XObject документа: круги, деления по 5°,
+	границы и глифы знаков. Строится один раз на PDF, каждый круг — doForm."""
+	canv.beginForm(WHEEL_FORM, -WHEEL_RADIUS, -WHEEL_RADIUS, WHEEL_RADIUS, WHEEL_RADIUS)
+	canv.setStrokeColor(colors.white)
+	canv.setFillColor(colors.white)
+	canv.setLineWidth(0.8)
+	for radius in (WHEEL_RADIUS, WHEEL_SIGN_INNER, WHEEL_ASPECT):
+		canv.circle(0, 0, radius, stroke=1, fill=0)
+	canv.setLineWidth(0.4)
+	for lon in range(0, 360, 5):
+		outer = WHEEL_SIGN_INNER + (4.0 if lon % 30 else WHEEL_RADIUS - WHEEL_SIGN_INNER)
+		canv.line(*_wheel_point(lon, WHEEL_SIGN_INNER), *_wheel_point(lon, outer))
+	canv.setFont('DejaVu', 9)
+	for index, glyph in enumerate(ZODIAC_GLYPHS):
+		x, y = _wheel_point(index * 30 + 15, (WHEEL_RADIUS + WHEEL_SIGN_INNER) / 2)
+		canv.drawCentredString(x, y - 3, glyph)
+	canv.endForm()
+
+
+class NatalWheel(Flowable):
+	"""Натальный круг: кольцо знаков (общий form XObject), дома, планеты, аспекты.
+
+	Асцендент слева: кольцо поворачивается на −ASC. На карту — только
+	линии куспидов, раздвинутые _spread глифы планет и линии аспектов.
+	"""
+
+	def __init__(self, chart: dict, size: float = WHEEL_SIZE):
+		super().__init__()
+		self.chart = chart
+		self.size = size
+		self.hAlign = 'CENTER'
+
+	def wrap(self, available_width, available_height):
+		return self.size, self.size
+
+	def _screen(self, lon: float, radius: float) -> tuple:
+		return _wheel_point(lon - self.rotation, radius)
+
+	def draw(self):
+		canv = self.canv
+		chart = self.chart
+		unknown = bool(chart.get('unknown_time'))
+		self.rotation = 0.0 if unknown else chart['asc']
+		if not canv.hasForm(WHEEL_FORM):
+			_build_wheel_ring(canv)
+
+		canv.saveState()
+		canv.translate(self.size / 2, self.size / 2)
+		canv.scale(self.size / (2 * WHEEL_RADIUS), self.size / (2 * WHEEL_RADIUS))
+
+		canv.saveState()
+		canv.rotate(-self.rotation)
+		canv.doForm(WHEEL_FORM)
+		canv.restoreState()
+
+		canv.setStrokeColor(colors.white)
+		canv.setFillColor(colors.white)
+		if not unknown:
+			self._draw_houses(canv, chart['cusps'])
+		positions = dict(chart['positions'], **chart.get('bodies', {}))
+		self._draw_aspects(canv, chart['positions'])
+		self._draw_planets(canv, positions)
+		canv.restoreState()
+
+	def _draw_houses(self, canv, cusps) -> None:
+		canv.setFont('DejaVu', 6)
+		for index in range(12):
+			start, end = cusps[index], cusps[(index + 1) % 12]
+			angular = index % 3 == 0  # ASC, IC, DSC, MC
+			canv.setLineWidth(1.2 if angular else 0.4)
+			canv.line(*self._screen(start, WHEEL_ASPECT), *self._screen(start, WHEEL_SIGN_INNER))
+			middle = start + ((end - start) % 360.0) / 2
+			x, y = self._screen(middle, WHEEL_HOUSE_NUMBER)
+			canv.drawCentredString(x, y - 2, str(index + 1))
+
+	def _draw_aspects(self, canv, positions) -> None:
+		canv.setLineWidth(0.5)
+		for aspect in find_aspects(positions, limit=len(positions) ** 2):
+			color = WHEEL_ASPECT_COLORS.get(aspect['type'])
+			if color is None:
+				continue
+			canv.setStrokeColor(colors.HexColor(color))
+			canv.line(*self._screen(positions[aspect['p1']], WHEEL_ASPECT),
+					  *self._screen(positions[aspect['p2']], WHEEL_ASPECT))
+		canv.setStrokeColor(colors.white)
+
+	def _draw_planets(self, canv, positions) -> None:
+		names = list(positions)
+		lons = [positions[name] for name in names]
+		angles = _spread(lons)
+		canv.setFont('DejaVu', 10)
+		canv.setLineWidth(0.3)
+		for name, lon, angle in zip(names, lons, angles):
+			# засечка на истинной долготе и выноска к раздвинутому глифу
+			canv.line(*self._screen(lon, WHEEL_SIGN_INNER), *self._screen(lon, WHEEL_SIGN_INNER - 3))
+			canv.line(*self._screen(lon, WHEEL_SIGN_INNER - 3), *self._screen(angle, WHEEL_PLANET + 6))
+			x, y = self._screen(angle, WHEEL_PLANET)
+			canv.drawCentredString(x, y - 3.5, PLANET_EMOJI.get(name, '★'))
+
+
+@lru_cache(maxsize=MAP_CACHE_SIZE)
+def _astrocartography_map(jd: float, lat: float, lon: float) -> Drawing:
+	"""Линии планет на равнопромежуточной проекции (долгота × широта до ±MAX_LATITUDE)
+	с отметкой места рождения. Рисунок кэшируется по карте и переиспользуется."""
+	height = MAP_WIDTH * (2 * MAX_LATITUDE) / 360.0
+	scale = MAP_WIDTH / 360.0
+
+	def x(lon_deg):
+		return (lon_deg + 180.0) * scale
+
+	def y(lat_deg):
+		return (lat_deg + MAX_LATITUDE) * scale
+
+	drawing = Drawing(MAP_WIDTH, height + 5*mm)
+	drawing.add(Rect(0, 0, MAP_WIDTH, height, fillColor=colors.HexColor("#0D1B3E"), strokeColor=colors.white, strokeWidth=0.5))
+	# Сетка 30° и экватор
+	for grid_lon in range(-150, 180, 30):
+		drawing.add(Line(x(grid_lon), 0, x(grid_lon), height, strokeColor=colors.HexColor("#2E3F6E"), strokeWidth=0.3))
+	for grid_lat in range(-60, 61, 30):
+		width = 0.6 if grid_lat == 0 else 0.3
+		drawing.add(Line(0, y(grid_lat), MAP_WIDTH, y(grid_lat), strokeColor=colors.HexColor("#2E3F6E"), strokeWidth=width))
+
+	for planet, lines in planet_lines(jd).items():
+		color = colors.HexColor(PLANET_COLORS.get(planet, '#FFFFFF'))
+		drawing.add(Line(x(lines['MC']), 0, x(lines['MC']), height, strokeColor=color, strokeWidth=0.8))
+		drawing.add(Line(x(lines['IC']), 0, x(lines['IC']), height, strokeColor=color, strokeWidth=0.8, strokeDashArray=[1, 2]))
+		for angle, dash in (('ASC', None), ('DSC', [3, 2])):
+			for segment in lines[angle]:
+				points = [coord for lon_deg, lat_deg in segment for coord in (x(lon_deg), y(lat_deg))]
+				drawing.add(PolyLine(points, strokeColor=color, strokeWidth=0.8, strokeDashArray=dash))
+		drawing.add(String(x(lines['MC']), height + 1*mm, PLANET_EMOJI.get(planet, '★'),
+						   fontName='DejaVu', fontSize=8, fillColor=color, textAnchor='middle'))
+
+	if abs(lat) <= MAX_LATITUDE:
+		drawing.add(Circle(x(lon), y(lat), 1.5*mm, fillColor=colors.white, strokeColor=colors.HexColor("#2B51BC")))
+	return drawing
+
+
+def _astrocartography_story(chart: dict, body_style, section_style) -> list:
+	"""Страница астрокартографии: карта линий и линии рядом с местом рождения."""
+	story = [
+		Paragraph("🌍 Астрокартография", section_style),
+		Spacer(1, 4*mm),
+		_astrocartography_map(chart['jd'], chart['lat'], chart['lon']),
+		Spacer(1, 2*mm),
+		Paragraph("Сплошная вертикаль — MC, пунктир — IC, сплошная кривая — ASC, штрих — DSC. "
+				  "Точка — место рождения.", body_style),
+	]
+	near = lines_near(chart, chart['lat'], chart['lon'])
+	if near:
+		story.append(Spacer(1, 2*mm))
+		story.append(Paragraph("<b>Рядом с местом рождения проходят линии</b>", body_style))
+		for line in near:
+			story.append(Paragraph(describe_line(line), body_style))
+	return story
+
+
+def _house_systems_story(chart: dict, body_style, section_style) -> list:
+	"""Таблица «планета × система домов» из сохранённых ARMC и наклона карты."""
+	systems = (chosen_system(chart),) + COMPARE_SYSTEMS
+	# За полярным кругом несколько систем сводятся к одной запасной — показываем её один раз
+	results = {}
+	for result in compare_systems(chart, systems).values():
+		results.setdefault(result['system'], result)
+
+	header = ["Планета"] + [HOUSE_NAMES_RU.get(system, system) for system in results]
+	rows = [header]
+	for planet in chart['positions']:
+		rows.append([f"{PLANET_EMOJI.get(planet, '★')} {planet}"] + [str(r['houses'][planet]) for r in results.values()])
+
+	table = Table(rows, hAlign='LEFT')
+	table.setStyle(TableStyle([
+		('FONTNAME', (0, 0), (-1, -1), 'DejaVu'),
+		('FONTNAME', (0, 0), (-1, 0), 'DejaVuBold'),
+		('FONTSIZE', (0, 0), (-1, -1), 10),
+		('TEXTCOLOR', (0, 0), (-1, -1), colors.white),
+		('ALIGN', (1, 0), (-1, -1), 'CENTER'),
+		('LINEBELOW', (0, 0), (-1, 0), 0.5, colors.white),
+		('INNERGRID', (0, 1), (-1, -1), 0.25, colors.HexColor("#2E3F6E")),
+	]))
+	story = [
+		Paragraph("⌂ Дома в разных системах", section_style),
+		Spacer(1, 2*mm),
+		Paragraph("Первый столбец — система вашей карты. Если дом планеты отличается между системами, "
+				  "планета стоит у границы домов и проявляет темы обоих.", body_style),
+		Spacer(1, 2*mm),
+		table,
+	]
+	note = house_system_note(chart)
+	if note:
+		story.append(Spacer(1, 2*mm))
+		story.append(Paragraph(note, body_style))
+	return story
+
+
+def _unknown_time_story(pos: dict, unknown: dict, body_style, section_style) -> list:
+	"""Планеты в знаках и диапазоны по времени суток для карты без времени рождения."""
+	header_style = ParagraphStyle('PlanetHeader', parent=body_style, fontName='DejaVuBold', fontSize=11)
+	story = [Paragraph(
+		"Время рождения неизвестно, поэтому Асцендент, MC и дома зависят от часа рождения. "
+		"Ниже указано, что известно наверняка, и как меняется картина в течение суток.", body_style
+	), Spacer(1, 0.3*cm)]
+
+	for planet, deg in pos.items():
+		emoji = PLANET_EMOJI.get(planet, '★')
+		signs = unknown['signs'].get(planet, [])
+		if len(signs) > 1:
+			story.append(Paragraph(f"{emoji} <b>{planet}</b>: {format_ranges(signs)}", header_style))
+		else:
+			story.append(Paragraph(f"{emoji} <b>{planet}</b> в знаке {deg_to_sign(deg).split('° ')[-1]}", header_style))
+			planet_text = get_planet_interpretation(planet, get_sign_name(deg))
+			if planet_text:
+				story.append(Paragraph(planet_text, body_style))
+
+		houses = unknown['houses'].get(planet, [])
+		if len(houses) == 1:
+			story.append(Paragraph(f"Дом: {houses[0]['house']} при любом времени рождения", body_style))
+		elif houses:
+			story.append(Paragraph(f"Дом по времени рождения: {format_ranges(houses, key='house')}", body_style))
+		story.append(Spacer(1, 0.15*cm))
+
+	story.append(Spacer(1, 0.3*cm))
+	story.append(Paragraph("↑ Асцендент по времени рождения", section_style))
+	story.append(Paragraph(format_ranges(unknown['asc']), body_style))
+	story.append(Paragraph("<b>Середина Неба (MC)</b> по времени рождения", section_style))
+	story.append(Paragraph(format_ranges(unknown['mc']), body_style))
+	return story
+
+
 def _draw_background_first_page(canvas, doc):
 	canvas.saveState()
 
 	page_width, page_height = A4
 
+	background = backgrounds.get()['first']
 	canvas.drawImage(
-		os.path.join(os.path.dirname(__file__), 'assets', 'main_template.png'),
+		background,
 		0,
 		0,
 		width=page_width,
 		height=page_height,
 		preserveAspectRatio=True,
-		mask="auto"
+		mask=image_mask(background)
 	)
 
 	canvas.restoreState()
@@ -80,112 +453,115 @@ def _draw_background_other_pages(canvas, doc):
 	canvas.saveState()
 
 	w, h = A4
+	background = backgrounds.get()['other']
 	canvas.drawImage(
-		os.path.join(os.path.dirname(__file__), 'assets', 'template_standart.png'),
+		background,
 		0, 0,
 		width=w,
 		height=h,
 		preserveAspectRatio=True,
-		mask="auto"
+		mask=image_mask(background)
 	)
 
 	canvas.restoreState()
 
 
-def create_natal_pdf(chart, uid, user_first_name, bot_username):
-	"""
-	Создаёт PDF с полным натальным разбором.
-	
-	Возвращает путь к файлу или поднимает исключение при ошибке.
-	"""
-	os.makedirs(TEMP_DIR, exist_ok=True)
-
-	timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-	pdf_filename = f"natal_chart_{uid}_{timestamp}.pdf"
-	pdf_path = os.path.join(TEMP_DIR, pdf_filename)
-
-	doc = SimpleDocTemplate(
-		pdf_path,
-		pagesize=A4,
-		rightMargin=10*mm,
-		leftMargin=20*mm,
-		topMargin=10*mm,
-		bottomMargin=10*mm,
-	)
-
-	styles = getSampleStyleSheet()
-
-	title_style = ParagraphStyle(
-		name='Title',
-		fontName='DejaVuBold',
-		fontSize=28,
-		textColor=colors.white,
-		spaceAfter=18,
-		alignment=1,
-		leading=34
-	)
-
-	subtitle_style = ParagraphStyle(
-		name='Subtitle',
-		fontName='DejaVu',
-		fontSize=16,
-		textColor=colors.white,
-		spaceAfter=12,
-		alignment=1
-	)
+def draw_page_number(canvas, number: int) -> None:
+	"""Номер страницы внизу по центру (одинаково при обычной и параллельной сборке)."""
+	canvas.saveState()
+	canvas.setFont('DejaVu', 9)
+	canvas.setFillColor(colors.white)
+	canvas.drawCentredString(A4[0] / 2, 6*mm, str(number))
+	canvas.restoreState()
 
-	section_style = ParagraphStyle(
-		name='Section',
-		fontName='DejaVuBold',
-		fontSize=16,
-		textColor=colors.white,
-		spaceBefore=24,
-		spaceAfter=12
-	)
 
-	body_style = ParagraphStyle(
-		name='Body',
-		fontName='DejaVu',
-		fontSize=11,
-		leading=14,
-		textColor=colors.white,
-		spaceAfter=8
-	)
+def _styles() -> dict:
+	"""Стили абзацев отчёта."""
+	return {
+		'title': ParagraphStyle(
+			name='Title',
+			fontName='DejaVuBold',
+			fontSize=28,
+			textColor=colors.white,
+			spaceAfter=18,
+			alignment=1,
+			leading=34
+		),
+		'subtitle': ParagraphStyle(
+			name='Subtitle',
+			fontName='DejaVu',
+			fontSize=16,
+			textColor=colors.white,
+			spaceAfter=12,
+			alignment=1
+		),
+		'section': ParagraphStyle(
+			name='Section',
+			fontName='DejaVuBold',
+			fontSize=16,
+			textColor=colors.white,
+			spaceBefore=24,
+			spaceAfter=12
+		),
+		'body': ParagraphStyle(
+			name='Body',
+			fontName='DejaVu',
+			fontSize=11,
+			leading=14,
+			textColor=colors.white,
+			spaceAfter=8
+		),
+		'small': ParagraphStyle(
+			name='Small',
+			fontName='DejaVu',
+			fontSize=9,
+			textColor=colors.white,
+			alignment=1,
+			spaceBefore=30
+		),
+	}
 
-	small_style = ParagraphStyle(
-		name='Small',
-		fontName='DejaVu',
-		fontSize=9,
-		textColor=colors.white,
-		alignment=1,
-		spaceBefore=30
-	)
 
+def _title_story(chart, styles) -> list:
+	"""Титульная страница и натальный круг."""
 	story = []
-
-	# Извлекаем данные из chart
-	pos = chart['positions']
-	asc = chart['asc']
-	mc = chart['mc']
-	cusps = chart['cusps']
-	aspects = chart.get('aspects', [])
-
 	story.append(Spacer(1, 30*mm))
-	story.append(Paragraph("Полный натальный разбор", title_style))
+	story.append(Paragraph("Полный натальный разбор", styles['title']))
 	story.append(Spacer(1, 6*mm))
-	story.append(Paragraph("Ваша натальная карта", subtitle_style))
+	story.append(Paragraph("Ваша натальная карта", styles['subtitle']))
 	
 	story.append(Spacer(1, 8*mm))
 
 	current_date = datetime.now().strftime("%d.%m.%Y")
-	story.append(Paragraph(f"Сгенерировано: {current_date}", small_style))
+	story.append(Paragraph(f"Сгенерировано: {current_date}", styles['small']))
 
 	story.append(PageBreak())
 
-	# Планеты
-	story.append(Paragraph("◎─◯ Планеты в знаках и домах", section_style))
+	# Натальный круг
+	story.append(Paragraph("✶ Ваша натальная карта", styles['section']))
+	story.append(Spacer(1, 6*mm))
+	story.append(NatalWheel(chart))
+	return story
+
+
+def _planets_story(chart, styles) -> list:
+	"""Планеты в знаках и домах, Асцендент, MC и сравнение систем домов."""
+	body_style, section_style = styles['body'], styles['section']
+	pos = chart['positions']
+	asc = chart['asc']
+	mc = chart['mc']
+	cusps = chart['cusps']
+
+	story = []
+	story.append(Paragraph("◎─◯ Планеты в знаках" if chart.get('unknown_time') else "◎─◯ Планеты в знаках и домах", section_style))
 	story.append(Spacer(1, 4*mm))
 
+	unknown = chart.get('unknown_time')
+	if unknown:
+		# Время рождения неизвестно: знаки без домов, дома и ASC — диапазонами по времени суток
+		story.extend(_unknown_time_story(pos, unknown, body_style, section_style))
+		return story
+
 	planets_by_house = _group_planets_by_house(pos, cusps)
 
 	for house_num in range(1, 13):
@@ -200,7 +576,7 @@ def create_natal_pdf(chart, uid, user_first_name, bot_username):
 				textColor=colors.white,
 			)))
 			story.append(Spacer(1, 0.1*cm))
-			
+		
 			# Планеты в этом доме
 			if planets_in_house:
 				for planet in planets_in_house:
@@ -208,7 +584,7 @@ def create_natal_pdf(chart, uid, user_first_name, bot_username):
 					sign_name = get_sign_name(deg)
 					sign_full = deg_to_sign(deg)
 					emoji = PLANET_EMOJI.get(planet, '★')
-					
+				
 					# Заголовок планеты
 					planet_header = f"{emoji} <b>{planet}</b> в {sign_full}"
 					story.append(Paragraph(planet_header, ParagraphStyle(
@@ -217,12 +593,12 @@ def create_natal_pdf(chart, uid, user_first_name, bot_username):
 						fontName='DejaVuBold',
 						fontSize=11
 					)))
-					
+				
 					# Интерпретация планеты
 					planet_text = get_planet_interpretation(planet, sign_name)
 					if planet_text:
 						story.append(Paragraph(planet_text, body_style))
-					
+				
 					story.append(Spacer(1, 0.15*cm))
 			else:
 				story.append(Paragraph("Пустой дом — акцент на самостоятельном развитии этой сферы жизни", body_style))
@@ -232,7 +608,7 @@ def create_natal_pdf(chart, uid, user_first_name, bot_username):
 	asc_sign_name = get_sign_name(asc)
 	asc_sign_full = deg_to_sign(asc)
 	asc_text = get_ascendant_interpretation(asc_sign_name)
-	
+
 	story.append(Spacer(1, 0.3*cm))
 	story.append(Paragraph(f"↑ <b>Асцендент</b> в {asc_sign_full}", ParagraphStyle(
 		'AscHeader',
@@ -240,17 +616,33 @@ def create_natal_pdf(chart, uid, user_first_name, bot_username):
 		fontName='DejaVuBold',
 		fontSize=11
 	)))
-	
+
 	if asc_text:
 		story.append(Paragraph(asc_text, body_style))
-	
+
 	story.append(Spacer(1, 0.3*cm))
 	mc_sign_ru = deg_to_sign(mc).split("° ")[-1].strip()
 	mc_text = get_mc_interpretation(mc_sign_ru)
 	story.append(Paragraph(f"<b>Середина Неба (MC)</b>: {deg_to_sign(mc)}", section_style))
 	story.append(Paragraph(mc_text, body_style))
 
-	story.append(PageBreak())
+	# Сравнение систем домов — от сохранённых ARMC и наклона, без пересчёта карты
+	try:
+		houses_story = _house_systems_story(chart, body_style, section_style)
+	except Exception as e:
+		print(f"Ошибка сравнения систем домов: {e}")
+		houses_story = []
+	if houses_story:
+		story.append(PageBreak())
+		story.extend(houses_story)
+	return story
+
+
+def _aspects_story(chart, styles) -> list:
+	"""Ключевые аспекты и дополнительные тела (пусто, если нечего показать)."""
+	body_style, section_style = styles['body'], styles['section']
+	aspects = chart.get('aspects', [])
+	story = []
 
 	# Аспекты
 	if aspects:
@@ -272,13 +664,22 @@ def create_natal_pdf(chart, uid, user_first_name, bot_username):
 				story.append(Paragraph(interp, body_style))
 				story.append(Spacer(1, 2*mm))
 
-		story.append(PageBreak())
+	# Дополнительные тела — только для расширенного набора
+	if chart.get('bodies'):
+		if story:
+			story.append(PageBreak())
+		story.extend(_extra_bodies_story(chart, body_style, section_style))
+	return story
+
+
+def _llm_story(chart, styles, sections) -> list:
+	"""Разделы LLM: любовь, деньги, тени, главная задача."""
+	body_style, section_style = styles['body'], styles['section']
+	story = []
 
 	# Любовь, секс и партнёрство
 	story.append(Paragraph("♥ Любовь, секс и партнёрство", section_style))
 	story.append(Spacer(1, 4*mm))
-
-	sections = get_all_sections(chart)
 	story.append(KeepTogether([
 		Paragraph(sections["love"], body_style)
 	]))
@@ -309,12 +710,55 @@ def create_natal_pdf(chart, uid, user_first_name, bot_username):
 	story.append(KeepTogether([
 		Paragraph(sections["task"], body_style)
 	]))
+	return story
+
+
+def _closing_story(chart, styles, bot_username) -> list:
+	"""Текущий период (транзиты), астрокартография и заключение."""
+	body_style, section_style = styles['body'], styles['section']
+	story = []
+
+	# Текущий период: транзиты медленных планет
+	try:
+		transit_events = find_transits(chart, years=TRANSIT_YEARS, planets=SLOW_PLANETS)
+	except Exception as e:
+		print(f"Ошибка расчёта транзитов: {e}")
+		transit_events = []
+	if transit_events:
+		start_year, end_year = period_years()
+		story.append(Paragraph(f"⏳ Текущий период ({start_year}–{end_year})", section_style))
+		story.append(Spacer(1, 4*mm))
+
+		main_transits = highlights(transit_events)
+		if main_transits:
+			story.append(Paragraph("<b>Главные транзиты</b>", body_style))
+			for event in main_transits:
+				story.append(Paragraph(describe_transit(event), body_style))
+			story.append(Spacer(1, 4*mm))
+
+		ingresses = [e for e in transit_events if e['kind'] in ('sign', 'house')]
+		if ingresses:
+			story.append(Paragraph("<b>Смена знаков и домов</b>", body_style))
+			for event in ingresses:
+				story.append(Paragraph(describe_transit(event), body_style))
+
+	# Астрокартография: нужен момент рождения (у старых сохранённых карт его нет)
+	if chart.get('jd') is not None and not chart.get('unknown_time'):
+		try:
+			astro_story = _astrocartography_story(chart, body_style, section_style)
+		except Exception as e:
+			print(f"Ошибка расчёта астрокартографии: {e}")
+			astro_story = []
+		if astro_story:
+			if story:
+				story.append(PageBreak())
+			story.extend(astro_story)
 
 	story.append(Spacer(1, 30*mm))
 
 	# Заключение
 	conclusion_text = (
-		"Расчёт выполнен с помощью Swiss Ephemeris (Placidus).  <br/><br/>"
+		f"Расчёт выполнен с помощью Swiss Ephemeris ({HOUSE_NAMES_RU.get(chart.get('house_system', 'placidus'), 'Плацидус')}).  <br/><br/>"
 		"Спасибо, что позволили заглянуть в вашу карту.  <br/>"
 		"Пусть этот разбор станет для вас маленьким светом на пути самопознания.<br/><br/>"
 		"Помните: астрология — это инструмент для размышлений, а не руководство к действию.  <br/>"
@@ -330,16 +774,123 @@ def create_natal_pdf(chart, uid, user_first_name, bot_username):
 		alignment=1,
 		leading=14
 	)))
+	return story
 
-	# Сборка
-	doc.build(
-		story,
-		onFirstPage=_draw_background_first_page,
-		onLaterPages=_draw_background_other_pages
+
+# Разделы отчёта по порядку; каждый начинается с новой страницы и собирается
+# независимо (в параллельном режиме — в отдельном процессе)
+REPORT_SECTIONS = ('title', 'planets', 'aspects', 'llm', 'closing')
+
+
+def _section_story(name: str, chart: dict, bot_username: str, sections: dict) -> list:
+	styles = _styles()
+	if name == 'title':
+		return _title_story(chart, styles)
+	if name == 'planets':
+		return _planets_story(chart, styles)
+	if name == 'aspects':
+		return _aspects_story(chart, styles)
+	if name == 'llm':
+		return _llm_story(chart, styles, sections)
+	if name == 'closing':
+		return _closing_story(chart, styles, bot_username)
+	raise ValueError(f"Неизвестный раздел отчёта: {name}")
+
+
+def _document(path: str) -> SimpleDocTemplate:
+	return SimpleDocTemplate(
+		path,
+		pagesize=A4,
+		rightMargin=10*mm,
+		leftMargin=20*mm,
+		topMargin=10*mm,
+		bottomMargin=10*mm,
+		pageCompression=PDF_PAGE_COMPRESSION,
 	)
+
+
+def render_section(name: str, chart: dict, bot_username: str, sections: dict, path: str) -> int:
+	"""Собирает один раздел в отдельный PDF path; возвращает число страниц (0 — раздел пуст).
+	Номера страниц не рисуются — их ставит pdf_merge после склейки."""
+	fonts.get()
+	story = _section_story(name, chart, bot_username, sections)
+	if not story:
+		return 0
+	doc = _document(path)
+	first_page = _draw_background_first_page if name == 'title' else _draw_background_other_pages
+	with timed("pdf_section_seconds", "Сборка раздела PDF", section=name):
+		doc.build(story, onFirstPage=first_page, onLaterPages=_draw_background_other_pages)
+	return doc.page
+
+
+def _draw_numbered_page(canvas, doc):
+	_draw_background_other_pages(canvas, doc)
+	draw_page_number(canvas, canvas.getPageNumber())
+
+
+@traced("pdf.create")
+def create_natal_pdf(chart, uid, user_first_name, bot_username, sections=None):
+	"""
+	Создаёт PDF с полным натальным разбором.
+
+	sections — готовые тексты разделов LLM (love_ai); если не переданы,
+	генерируются здесь же.
+
+	При PDF_PARALLEL=1 (по умолчанию выключено) и установленном pypdf
+	разделы REPORT_SECTIONS собираются параллельно в процессах и
+	склеиваются (pdf_merge), иначе — одним doc.build.
+	
+	Возвращает путь к файлу или поднимает исключение при ошибке.
+	"""
+	fonts.get()
+	os.makedirs(TEMP_DIR, exist_ok=True)
+
+	if sections is None:
+		sections = get_all_sections(chart)
+
+	# Уникальное имя: прогрев воркеров кластера и повторные рендеры одного uid
+	# в ту же секунду иначе пишут и удаляют один и тот же файл
+	timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+	fd, pdf_path = tempfile.mkstemp(prefix=f"natal_chart_{uid}_{timestamp}_", suffix=".pdf", dir=TEMP_DIR)
+	os.close(fd)
+	try:
+		_build(chart, bot_username, sections, pdf_path)
+	except Exception:
+		os.remove(pdf_path)
+		raise
+	log_size(pdf_path)
 	return pdf_path
 
 
+def _build(chart, bot_username, sections, pdf_path):
+	"""Собирает отчёт в pdf_path: параллельно через pdf_merge или одним doc.build."""
+	if pdf_merge.available():
+		try:
+			pdf_merge.render_parallel(
+				render_section, REPORT_SECTIONS, (chart, bot_username, sections), pdf_path, draw_page_number
+			)
+			return
+		except Exception as e:
+			print(f"Параллельная сборка PDF не удалась ({e}), собираем одним документом")
+
+	story = []
+	for name in REPORT_SECTIONS:
+		section_story = _section_story(name, chart, bot_username, sections)
+		if section_story:
+			if story:
+				story.append(PageBreak())
+			story.extend(section_story)
+
+	# Сборка
+	doc = _document(pdf_path)
+	with timed("pdf_build_seconds", "Сборка PDF в ReportLab"):
+		doc.build(
+			story,
+			onFirstPage=_draw_background_first_page,
+			onLaterPages=_draw_numbered_page
+		)
+
+
 if __name__ == "__main__":
 	# Пример тестового запуска (можно удалить или закомментировать в продакшене)
 	print("Это тестовый запуск генератора PDF натальной карты")
@@ -0,0 +1,116 @@
+"""
+Параллельная сборка PDF по разделам и склейка в один файл.
+
+Раздел отчёта — независимый story со своей первой страницей; разделы
+собираются ReportLab одновременно в пуле процессов runtime 'pdf'
+(PDF_WORKERS, по умолчанию — ядра процесса), поэтому время сборки отчёта
+определяется самым длинным разделом, а не их суммой. Фоны страниц каждый
+раздел рисует сам; сквозные номера страниц ставятся после склейки
+наложением одного сгенерированного PDF с номерами.
+
+Режим включается явно (PDF_PARALLEL=1) и требует pypdf (pip install pypdf).
+У каждой части свои подмножества шрифтов DejaVu, и compress_identical_objects
+их не сливает: на одной карте склеенный отчёт выходит ~305 КБ против ~207 КБ
+у одного doc.build (шрифты 129 КБ против 38 КБ), а на одном ядре сборка
+медленнее в ~3 раза из-за запуска процессов. Выигрыш есть только на
+нескольких свободных ядрах, когда время рендера важнее размера файла.
+По умолчанию pdf_generator собирает отчёт одним doc.build.
+"""
+
+import io
+import os
+from typing import Callable, List, Sequence, Tuple
+
+from metrics import timed
+from runtime import get_executor
+from tracing import traced
+
+try:
+	from pypdf import PdfReader, PdfWriter
+except ImportError:
+	PdfReader = PdfWriter = None
+
+
+PDF_PARALLEL = os.getenv("PDF_PARALLEL", "0") == "1"
+
+
+def available() -> bool:
+	"""Можно ли собирать параллельно: включено и установлен pypdf."""
+	return PDF_PARALLEL and PdfWriter is not None
+
+
+def _part_path(pdf_path: str, name: str) -> str:
+	root, ext = os.path.splitext(pdf_path)
+	return f"{root}.{name}{ext}"
+
+
+def render_parts(render: Callable[..., int], names: Sequence[str], args: tuple,
+				 pdf_path: str) -> List[Tuple[str, int]]:
+	"""render(name, *args, path) → число страниц для каждого раздела в пуле 'pdf';
+	(путь части, страниц) в порядке names."""
+	executor = get_executor("pdf")
+	futures = [
+		(_part_path(pdf_path, name), executor.submit(render, name, *args, _part_path(pdf_path, name)))
+		for name in names
+	]
+	return [(path, future.result()) for path, future in futures]
+
+
+def _number_overlay(total: int, draw_number: Callable, skip_first: bool) -> "PdfReader":
+	"""PDF из total пустых страниц A4 с номерами — накладывается на склеенный отчёт."""
+	from reportlab.lib.pagesizes import A4
+	from reportlab.pdfgen.canvas import Canvas
+
+	buffer = io.BytesIO()
+	canvas = Canvas(buffer, pagesize=A4, pageCompression=1)
+	for number in range(1, total + 1):
+		if number > 1 or not skip_first:
+			draw_number(canvas, number)
+		canvas.showPage()
+	canvas.save()
+	buffer.seek(0)
+	return PdfReader(buffer)
+
+
+def merge(parts: Sequence[Tuple[str, int]], pdf_path: str, draw_number: Callable = None,
+		  skip_first: bool = True) -> int:
+	"""Склеивает непустые части в pdf_path и проставляет сквозные номера страниц
+	(кроме титульной при skip_first). Одинаковые объекты частей (фоны)
+	сливаются, если pypdf это умеет. Возвращает число страниц."""
+	writer = PdfWriter()
+	for path, pages in parts:
+		if pages:
+			writer.append(path)
+
+	total = len(writer.pages)
+	if draw_number is not None and total:
+		overlay = _number_overlay(total, draw_number, skip_first)
+		for page, numbers in zip(writer.pages, overlay.pages):
+			page.merge_page(numbers)
+			# merge_page оставляет объединённое содержимое страницы несжатым
+			page.compress_content_streams()
+
+	# Фоновые PNG повторяются в каждой части — без этого они попадут в файл по разу на раздел
+	if hasattr(writer, "compress_identical_objects"):
+		writer.compress_identical_objects(remove_identicals=True, remove_orphans=True)
+	with open(pdf_path, "wb") as f:
+		writer.write(f)
+	return total
+
+
+@traced("pdf.render_parallel")
+def render_parallel(render: Callable[..., int], names: Sequence[str], args: tuple, pdf_path: str,
+					draw_number: Callable = None) -> str:
+	"""Собирает разделы names параллельно и склеивает в pdf_path; части удаляются."""
+	try:
+		with timed("pdf_build_seconds", "Сборка PDF в ReportLab"):
+			parts = render_parts(render, names, args, pdf_path)
+			with timed("pdf_merge_seconds", "Склейка разделов PDF"):
+				merge(parts, pdf_path, draw_number)
+	finally:
+		for path in {_part_path(pdf_path, name) for name in names}:
+			try:
+				os.remove(path)
+			except OSError:
+				pass
+	return pdf_path
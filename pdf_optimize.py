@@ -0,0 +1,151 @@
+"""
+Размер PDF-отчёта: фоны, шрифты, сжатие потоков и отчёт о размере.
+
+Фоны страниц в assets/ — PNG 1654×2340 (200 dpi). ReportLab раскрывает PNG
+в RGB и сжимает Flate, поэтому каждая картинка весит в PDF сотни КБ.
+backgrounds один раз (при первом PDF или прогреве) переводит их в JPEG
+с разрешением PDF_BACKGROUND_DPI — JPEG встраивается в PDF как есть
+(DCTDecode), без перекодирования. Готовые файлы лежат в temp/backgrounds
+и пересоздаются, только если исходник новее. Без Pillow или при ошибке
+используются исходные PNG.
+
+Шрифты ReportLab всегда встраивает подмножеством; PDF_STRICT_SUBSET
+отключает резерв ASCII в первом подмножестве (asciiReadable), и
+кириллица с латиницей укладываются в меньшее число подмножеств.
+Текст по-прежнему копируется: у подмножеств есть ToUnicode.
+
+size_report разбирает готовый PDF (без зависимостей) и делит размер на
+изображения, шрифты и содержимое страниц; log_size пишет это в лог
+и в метрику pdf_size_bytes.
+"""
+
+import os
+import re
+from typing import Dict
+
+from metrics import histogram
+from startup import Lazy
+
+
+ASSETS_DIR = os.path.join(os.path.dirname(__file__), 'assets')
+BACKGROUNDS_DIR = os.path.join(os.path.dirname(__file__), 'temp', 'backgrounds')
+BACKGROUND_FILES = {'first': 'main_template.png', 'other': 'template_standart.png'}
+
+PDF_OPTIMIZE = os.getenv("PDF_OPTIMIZE", "1") == "1"
+PDF_BACKGROUND_DPI = int(os.getenv("PDF_BACKGROUND_DPI", "150"))
+PDF_BACKGROUND_QUALITY = int(os.getenv("PDF_BACKGROUND_QUALITY", "80"))
+PDF_STRICT_SUBSET = os.getenv("PDF_STRICT_SUBSET", "1") == "1"
+PDF_PAGE_COMPRESSION = 1
+
+A4_INCHES = (8.27, 11.69)
+
+# КБ: от пустого отчёта до «раздутого» с PNG-фонами
+SIZE_BUCKETS = tuple(kb * 1024 for kb in (100, 200, 300, 500, 750, 1000, 2000, 5000, 10000))
+_pdf_size = histogram("pdf_size_bytes", "Размер PDF-отчёта, байт: part=total|images|fonts|content|other", SIZE_BUCKETS)
+
+
+# ---------------------------------------------------------------------------
+# Фоны
+# ---------------------------------------------------------------------------
+
+def _convert_background(source: str, target: str) -> None:
+	"""PNG → JPEG размером A4 при PDF_BACKGROUND_DPI."""
+	from PIL import Image
+
+	width, height = (int(round(side * PDF_BACKGROUND_DPI)) for side in A4_INCHES)
+	with Image.open(source) as image:
+		image = image.convert('RGB')
+		if image.width > width or image.height > height:
+			image = image.resize((width, height), Image.LANCZOS)
+		image.save(target, 'JPEG', quality=PDF_BACKGROUND_QUALITY, optimize=True)
+
+
+def _prepare_backgrounds() -> Dict[str, str]:
+	"""'first' | 'other' → путь к фону страницы для drawImage."""
+	originals = {kind: os.path.join(ASSETS_DIR, name) for kind, name in BACKGROUND_FILES.items()}
+	if not PDF_OPTIMIZE:
+		return originals
+	prepared = {}
+	try:
+		os.makedirs(BACKGROUNDS_DIR, exist_ok=True)
+		for kind, source in originals.items():
+			name = os.path.splitext(os.path.basename(source))[0]
+			target = os.path.join(BACKGROUNDS_DIR, f"{name}_{PDF_BACKGROUND_DPI}dpi_q{PDF_BACKGROUND_QUALITY}.jpg")
+			if not os.path.exists(target) or os.path.getmtime(target) < os.path.getmtime(source):
+				# Процессы пула 'pdf' могут готовить фон одновременно — пишем во временный файл
+				partial = f"{target}.{os.getpid()}.tmp"
+				_convert_background(source, partial)
+				os.replace(partial, target)
+			prepared[kind] = target
+	except Exception as e:
+		print(f"Не удалось подготовить фоны PDF: {e}. Используются исходные PNG.")
+		return originals
+	return prepared
+
+
+backgrounds = Lazy("pdf_backgrounds", _prepare_backgrounds)
+
+
+def image_mask(path: str):
+	"""mask для drawImage: прозрачность бывает только у PNG."""
+	return "auto" if path.lower().endswith('.png') else None
+
+
+# ---------------------------------------------------------------------------
+# Отчёт о размере
+# ---------------------------------------------------------------------------
+
+_STREAM_RE = re.compile(rb'\d+\s+\d+\s+obj\s*<<(.*?)>>\s*stream\r?\n', re.S)
+_LENGTH_RE = re.compile(rb'/Length\s+(\d+)\b(?!\s+\d+\s+R)')
+
+
+def _classify(header: bytes) -> str:
+	if b'/Subtype /Image' in header or b'/Subtype/Image' in header:
+		return 'images'
+	if b'/Length1' in header or b'/FontFile' in header:
+		return 'fonts'
+	return 'content'
+
+
+def size_report(path: str) -> Dict[str, int]:
+	"""Размер PDF и его частей в байтах: total, images, fonts, content (потоки
+	страниц и форм), other (словари, xref, метаданные), а также pages."""
+	with open(path, 'rb') as f:
+		data = f.read()
+	report = {'total': len(data), 'images': 0, 'fonts': 0, 'content': 0}
+	for match in _STREAM_RE.finditer(data):
+		length = _LENGTH_RE.search(match.group(1))
+		if length:
+			report[_classify(match.group(1))] += int(length.group(1))
+	report['other'] = max(report['total'] - report['images'] - report['fonts'] - report['content'], 0)
+	report['pages'] = len(re.findall(rb'/Type\s*/Page(?![s\w])', data))
+	return report
+
+
+def format_size_report(report: Dict[str, int]) -> str:
+	kb = lambda value: f"{value / 1024:.0f} КБ"
+	return (
+		f"{kb(report['total'])}, {report['pages']} стр. "
+		f"(изображения {kb(report['images'])}, шрифты {kb(report['fonts'])}, "
+		f"страницы {kb(report['content'])}, прочее {kb(report['other'])})"
+	)
+
+
+def log_size(path: str) -> Dict[str, int]:
+	"""size_report в лог и метрику pdf_size_bytes; ошибки разбора не мешают доставке."""
+	try:
+		report = size_report(path)
+	except Exception as e:
+		print(f"[pdf] Не удалось оценить размер {path}: {e}")
+		return {}
+	for part in ('total', 'images', 'fonts', 'content', 'other'):
+		_pdf_size.observe(report[part], part=part)
+	print(f"[pdf] {os.path.basename(path)}: {format_size_report(report)}")
+	return report
+
+
+if __name__ == "__main__":
+	import sys
+
+	for pdf in sys.argv[1:]:
+		print(f"{pdf}: {format_size_report(size_report(pdf))}")
@@ -0,0 +1,165 @@
+"""
+Вторичные прогрессии и возвращения Солнца (соляры) и Луны (лунары).
+
+	progressed_chart(chart, date)        # «день после рождения за год жизни»
+	progressed_ingresses(chart, 2025, 2027)
+	solar_return(chart, 2026)            # момент и карта соляра
+	lunar_returns(chart, 2026)           # все лунары за год
+	returns(chart, 2025, 2027)           # соляры и лунары за диапазон лет
+
+Нужна карта из calculate_full_chart с моментом рождения (jd) и
+координатами. Моменты возвращений — корни на долготе Солнца/Луны через
+ephemeris.passes, без перебора по дням; развёртки кэшируются в ephemeris,
+поэтому соляры и лунары за несколько лет для одного пользователя не
+пересчитывают общие узлы.
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import pytz
+import swisseph as swe
+
+from calculator import ASPECTS, PLANETS, chart_at_jd
+from ephemeris import calc, crossings, jd_to_datetime, passes, to_jd, wrap180
+from houses import chart_frame, chosen_system, houses_at
+
+
+TROPICAL_YEAR = 365.24219  # суток
+PROGRESSED_ORB = 1.0  # орб аспектов прогрессивных планет к натальным, °
+PROGRESSED_INGRESS_PLANETS = ('Sun', 'Moon', 'Mercury', 'Venus', 'Mars')
+# Соляр ищется в окне ± SOLAR_WINDOW суток от дня рождения в этом году
+SOLAR_WINDOW = 3.0
+
+
+def _natal_jd(chart: Dict) -> float:
+	jd = chart.get('jd')
+	if jd is None:
+		raise ValueError("В карте нет момента рождения — пересчитайте карту")
+	return jd
+
+
+def _year_start(year: int) -> float:
+	return to_jd(pytz.utc.localize(datetime(year, 1, 1)))
+
+
+# ---------------------------------------------------------------------------
+# Вторичные прогрессии
+# ---------------------------------------------------------------------------
+
+def progressed_jd(chart: Dict, date: Optional[datetime] = None) -> float:
+	"""Момент эфемерид, соответствующий дате date (сутки после рождения = год жизни)."""
+	natal = _natal_jd(chart)
+	return natal + (to_jd(date or datetime.now(pytz.utc)) - natal) / TROPICAL_YEAR
+
+
+def _real_jd(chart: Dict, jd_progressed: float) -> float:
+	natal = _natal_jd(chart)
+	return natal + (jd_progressed - natal) * TROPICAL_YEAR
+
+
+def progressed_chart(chart: Dict, date: Optional[datetime] = None) -> Dict:
+	"""
+	Прогрессивная карта на дату date (по умолчанию — сейчас).
+
+	MC смещается на солнечную дугу (прогрессивное Солнце минус натальное),
+	ASC и куспиды — из прогрессивного ARMC на широте рождения. В aspects —
+	аспекты прогрессивных планет к натальным с орбом PROGRESSED_ORB.
+	"""
+	date = date or datetime.now(pytz.utc)
+	jd = progressed_jd(chart, date)
+	positions = {name: calc(jd, pid)[0] for name, pid in PLANETS.items()}
+
+	arc = wrap180(positions['Sun'] - chart['positions']['Sun'])
+	armc, obliquity = chart_frame(chart)
+	houses = houses_at((armc + arc) % 360.0, chart['lat'], obliquity, chosen_system(chart))
+
+	return {
+		'positions': positions,
+		'asc': houses['asc'],
+		'mc': houses['mc'],
+		'cusps': houses['cusps'],
+		'aspects': progressed_aspects(positions, chart),
+		'solar_arc': arc,
+		'jd': jd,
+		'date': date,
+	}
+
+
+def progressed_aspects(positions: Dict[str, float], natal: Dict, orb: float = PROGRESSED_ORB) -> List[Dict]:
+	"""Аспекты прогрессивных планет к натальным планетам, ASC и MC."""
+	points = dict(natal['positions'], ASC=natal['asc'], MC=natal['mc'])
+	aspects = []
+	for p1, lon1 in positions.items():
+		for p2, lon2 in points.items():
+			diff = abs(wrap180(lon1 - lon2))
+			for name, angle in ASPECTS:
+				if abs(diff - angle) <= orb:
+					aspects.append({'p1': p1, 'p2': p2, 'type': name, 'orb': abs(diff - angle)})
+	return sorted(aspects, key=lambda a: a['orb'])
+
+
+def progressed_ingresses(chart: Dict, start_year: int, end_year: int,
+						 planets=PROGRESSED_INGRESS_PLANETS) -> List[Dict]:
+	"""Смена знака прогрессивными планетами с start_year по end_year включительно
+	(даты реального времени)."""
+	jd_start = progressed_jd(chart, pytz.utc.localize(datetime(start_year, 1, 1)))
+	jd_end = progressed_jd(chart, pytz.utc.localize(datetime(end_year + 1, 1, 1)))
+	boundaries = [index * 30.0 for index in range(12)]
+	events = []
+	for planet in planets:
+		for index, jd, speed in crossings(PLANETS[planet], jd_start, jd_end, boundaries):
+			real = _real_jd(chart, jd)
+			events.append({
+				'planet': planet,
+				'sign': (index - 1) % 12 if speed < 0 else index,
+				'retrograde': speed < 0,
+				'jd': real,
+				'date': jd_to_datetime(real),
+			})
+	events.sort(key=lambda e: e['jd'])
+	return events
+
+
+# ---------------------------------------------------------------------------
+# Соляры и лунары
+# ---------------------------------------------------------------------------
+
+def _return_chart(jd: float, chart: Dict, lat: Optional[float], lon: Optional[float]) -> Dict:
+	result = chart_at_jd(jd, chart['lat'] if lat is None else lat, chart['lon'] if lon is None else lon,
+						 house_system=chosen_system(chart))
+	result['date'] = jd_to_datetime(jd)
+	return result
+
+
+def solar_return(chart: Dict, year: int, lat: Optional[float] = None, lon: Optional[float] = None) -> Dict:
+	"""Соляр года year: момент возвращения Солнца в натальную долготу и карта
+	на этот момент (по умолчанию — в месте рождения)."""
+	natal = _natal_jd(chart)
+	birth_year = jd_to_datetime(natal).year
+	center = natal + (year - birth_year) * TROPICAL_YEAR
+	found = passes(swe.SUN, center - SOLAR_WINDOW, center + SOLAR_WINDOW, chart['positions']['Sun'])
+	if not found:
+		raise RuntimeError(f"Не найден соляр {year} года")
+	return _return_chart(found[0][0], chart, lat, lon)
+
+
+def lunar_returns(chart: Dict, year: int, lat: Optional[float] = None, lon: Optional[float] = None,
+				  charts: bool = False) -> List[Dict]:
+	"""Все возвращения Луны в натальную долготу за календарный год (UTC).
+	С charts=True для каждого строится карта, иначе только jd и date."""
+	moments = passes(swe.MOON, _year_start(year), _year_start(year + 1), chart['positions']['Moon'])
+	if charts:
+		return [_return_chart(jd, chart, lat, lon) for jd, _ in moments]
+	return [{'jd': jd, 'date': jd_to_datetime(jd)} for jd, _ in moments]
+
+
+def returns(chart: Dict, start_year: int, end_year: int, lunar: bool = True,
+			lat: Optional[float] = None, lon: Optional[float] = None) -> Dict[int, Dict]:
+	"""Год → {'solar': карта соляра, 'lunar': [моменты лунаров]} для start_year..end_year."""
+	result = {}
+	for year in range(start_year, end_year + 1):
+		result[year] = {'solar': solar_return(chart, year, lat, lon)}
+		if lunar:
+			result[year]['lunar'] = lunar_returns(chart, year, lat, lon)
+	return result
@@ -0,0 +1,194 @@
+"""
+Ограничение частоты действий пользователей (token bucket).
+
+Ключ ведра — (действие, telegram_id) для персонального лимита или
+(действие, '*') для общего. Хранилище выбирается через RATE_LIMIT_BACKEND:
+- memory — словарь в процессе, пустые (полностью восстановившиеся) вёдра
+  вычищаются по TTL;
+- sqlite — отдельный файл RATE_LIMIT_DB, общий для нескольких процессов
+  бота; чтение-изменение-запись идёт в транзакции BEGIN IMMEDIATE.
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory | sqlite
+RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB", "db/ratelimit.sqlite")
+SWEEP_EVERY = 1000  # операций между чистками просроченных вёдер
+
+
+class Limit:
+	"""rate — токенов в секунду, burst — ёмкость ведра."""
+
+	def __init__(self, rate: float, burst: float = 1):
+		self.rate = rate
+		self.burst = burst
+
+	@property
+	def ttl(self) -> float:
+		# За это время пустое ведро наполняется целиком — хранить его незачем
+		return self.burst / self.rate
+
+
+def per_minute(count: float, burst: float = 1) -> Limit:
+	return Limit(count / 60, burst)
+
+
+def per_hour(count: float, burst: float = 1) -> Limit:
+	return Limit(count / 3600, burst)
+
+
+CALLBACK_COOLDOWN: float = 3.5
+
+# действие → (лимит на пользователя, общий лимит или None)
+LIMITS: Dict[str, Tuple[Limit, Optional[Limit]]] = {
+	"buy_button": (Limit(1 / CALLBACK_COOLDOWN, 1), None),
+	# Nominatim допускает ~1 запрос в секунду с одного приложения
+	"chart": (per_minute(5, burst=3), Limit(float(os.getenv("CHART_GLOBAL_RATE", "1")), 3)),
+	"render": (per_hour(3, burst=2), Limit(float(os.getenv("RENDER_GLOBAL_RATE", "0.2")), 4)),
+}
+
+
+def _take(tokens: float, updated: float, limit: Limit, now: float) -> Tuple[float, float]:
+	"""Пополняет ведро и пытается взять токен. Возвращает (остаток, retry_after)."""
+	tokens = min(limit.burst, tokens + (now - updated) * limit.rate)
+	if tokens >= 1:
+		return tokens - 1, 0.0
+	return tokens, (1 - tokens) / limit.rate
+
+
+class MemoryBackend:
+	def __init__(self):
+		self._buckets: Dict[str, Tuple[float, float, float]] = {}  # key → (tokens, updated, expires)
+		self._lock = threading.Lock()
+		self._ops = 0
+
+	def hit(self, key: str, limit: Limit, now: Optional[float] = None) -> float:
+		now = time.time() if now is None else now
+		with self._lock:
+			tokens, updated, _ = self._buckets.get(key, (limit.burst, now, 0))
+			tokens, retry_after = _take(tokens, updated, limit, now)
+			self._buckets[key] = (tokens, now, now + limit.ttl)
+
+			self._ops += 1
+			if self._ops >= SWEEP_EVERY:
+				self._ops = 0
+				self._sweep(now)
+		return retry_after
+
+	def refund(self, key: str, limit: Limit, now: Optional[float] = None) -> None:
+		"""Возвращает в ведро токен, взятый hit."""
+		now = time.time() if now is None else now
+		with self._lock:
+			if key in self._buckets:
+				tokens, updated, _ = self._buckets[key]
+				tokens = min(limit.burst, tokens + (now - updated) * limit.rate + 1)
+				self._buckets[key] = (tokens, now, now + limit.ttl)
+
+	def _sweep(self, now: float) -> None:
+		expired = [k for k, (_, _, expires) in self._buckets.items() if expires <= now]
+		for key in expired:
+			del self._buckets[key]
+
+	def __len__(self) -> int:
+		return len(self._buckets)
+
+
+class SQLiteBackend:
+	def __init__(self, path: str = RATE_LIMIT_DB):
+		Path(path).parent.mkdir(parents=True, exist_ok=True)
+		self._conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+		self._conn.execute("PRAGMA journal_mode=WAL;")
+		self._conn.execute(
+			"CREATE TABLE IF NOT EXISTS rate_limits ("
+			" key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, expires REAL NOT NULL)"
+		)
+		self._conn.execute("CREATE INDEX IF NOT EXISTS idx_rate_limits_expires ON rate_limits(expires)")
+		self._lock = threading.Lock()
+		self._ops = 0
+
+	def hit(self, key: str, limit: Limit, now: Optional[float] = None) -> float:
+		now = time.time() if now is None else now
+		with self._lock:
+			self._conn.execute("BEGIN IMMEDIATE")
+			try:
+				row = self._conn.execute("SELECT tokens, updated FROM rate_limits WHERE key = ?", (key,)).fetchone()
+				tokens, updated = row if row else (limit.burst, now)
+				tokens, retry_after = _take(tokens, updated, limit, now)
+				self._conn.execute(
+					"INSERT INTO rate_limits(key, tokens, updated, expires) VALUES (?, ?, ?, ?)"
+					" ON CONFLICT(key) DO UPDATE SET tokens=excluded.tokens, updated=excluded.updated, expires=excluded.expires",
+					(key, tokens, now, now + limit.ttl),
+				)
+
+				self._ops += 1
+				if self._ops >= SWEEP_EVERY:
+					self._ops = 0
+					self._conn.execute("DELETE FROM rate_limits WHERE expires <= ?", (now,))
+				self._conn.execute("COMMIT")
+			except Exception:
+				self._conn.execute("ROLLBACK")
+				raise
+		return retry_after
+
+	def refund(self, key: str, limit: Limit, now: Optional[float] = None) -> None:
+		"""Возвращает в ведро токен, взятый hit."""
+		now = time.time() if now is None else now
+		with self._lock:
+			self._conn.execute(
+				"UPDATE rate_limits SET tokens = MIN(?, tokens + (? - updated) * ? + 1), updated = ?, expires = ?"
+				" WHERE key = ?",
+				(limit.burst, now, limit.rate, now, now + limit.ttl, key),
+			)
+
+
+class RateLimiter:
+	def __init__(self, backend=None, limits: Optional[Dict[str, Tuple[Limit, Optional[Limit]]]] = None):
+		if backend is None:
+			backend = SQLiteBackend() if RATE_LIMIT_BACKEND == "sqlite" else MemoryBackend()
+		self.backend = backend
+		self.limits = limits if limits is not None else LIMITS
+
+	def check(self, action: str, uid: Optional[int] = None, use_global: bool = True) -> float:
+		"""Пытается выполнить action. 0 — можно, иначе через сколько секунд повторить.
+
+		uid=None проверяет только общий лимит, use_global=False — только персональный.
+		Если отказал общий лимит, персональный токен возвращается: в пик нагрузки
+		пользователь не тратит свою квоту на запросы, которые не выполнились.
+		"""
+		user_limit, global_limit = self.limits[action]
+		if uid is not None:
+			retry_after = self.backend.hit(f"{action}:{uid}", user_limit)
+			if retry_after:
+				return retry_after
+		if use_global and global_limit is not None:
+			retry_after = self.backend.hit(f"{action}:*", global_limit)
+			if retry_after and uid is not None:
+				self.backend.refund(f"{action}:{uid}", user_limit)
+			return retry_after
+		return 0.0
+
+	async def wait(self, action: str, max_wait: Optional[float] = None) -> bool:
+		"""Ждёт свободного места в общем лимите action — для работы, которую нельзя
+		отбросить (например, рендер оплаченного заказа).
+
+		Возвращает False, если ожидание превысило бы max_wait.
+		"""
+		waited = 0.0
+		while True:
+			retry_after = self.check(action)
+			if not retry_after:
+				return True
+			if max_wait is not None and waited + retry_after > max_wait:
+				return False
+			await asyncio.sleep(retry_after)
+			waited += retry_after
+
+
+limiter = RateLimiter()
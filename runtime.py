@@ -0,0 +1,179 @@
+"""
+Асинхронный рантайм бота.
+
+- per_chat: апдейты одного чата обрабатываются строго по порядку,
+  разные чаты — параллельно;
+- run_blocking: тяжёлая синхронная работа (Swiss Ephemeris, геокодинг,
+  ReportLab) уходит в пулы потоков или процессов и не блокирует event loop;
+- spawn: фоновые задачи (доставка PDF), которые не должны держать чат.
+"""
+
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+import tracing
+
+
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", "4"))
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "2"))
+IO_WORKERS = int(os.getenv("IO_WORKERS", "8"))
+# Разделы PDF собираются параллельно (pdf_merge); 0 — ядра процесса, в кластере —
+# ядра, поделённые между воркерами (иначе процессов было бы воркеры × ядра)
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "0"))
+
+# Пулы создаются лениво: импорт модуля не должен порождать потоки
+_POOL_SIZES: Dict[str, int] = {
+	"chart": CHART_WORKERS,
+	"render": RENDER_WORKERS,
+	"io": IO_WORKERS,
+	"pdf": PDF_WORKERS,
+}
+# 'thread' или 'process': процессы снимают ограничение GIL для CPU-работы
+# (эфемериды, ReportLab) ценой передачи аргументов через pickle
+_POOL_KINDS: Dict[str, str] = {
+	"chart": os.getenv("CHART_POOL", "thread"),
+	"render": os.getenv("RENDER_POOL", "thread"),
+	"io": "thread",
+	"pdf": "process",
+}
+_executors: Dict[str, Executor] = {}
+# Пул 'pdf' запрашивается и из потоков пула 'render' — создание под замком
+_executors_lock = threading.Lock()
+
+
+def _cpu_share() -> int:
+	"""Ядра на процесс: в воркере кластера (WORKER_INDEX) — доля от CLUSTER_WORKERS."""
+	processes = int(os.getenv("CLUSTER_WORKERS", "1")) if os.getenv("WORKER_INDEX") else 1
+	return max(1, (os.cpu_count() or 2) // max(1, processes))
+
+
+def get_executor(pool: str) -> Executor:
+	executor = _executors.get(pool)
+	if executor is not None:
+		return executor
+	if pool not in _POOL_SIZES:
+		raise ValueError(f"Неизвестный пул: {pool}")
+	with _executors_lock:
+		executor = _executors.get(pool)
+		if executor is None:
+			size = _POOL_SIZES[pool] or _cpu_share()
+			if _POOL_KINDS[pool] == "process":
+				executor = ProcessPoolExecutor(
+					max_workers=size,
+					mp_context=multiprocessing.get_context("spawn")
+				)
+			else:
+				executor = ThreadPoolExecutor(
+					max_workers=size,
+					thread_name_prefix=pool
+				)
+			_executors[pool] = executor
+	return executor
+
+
+async def run_blocking(func: Callable[..., Any], *args: Any, pool: str = "io", **kwargs: Any) -> Any:
+	"""Выполняет синхронную функцию в пуле pool ('chart', 'render', 'io', 'pdf').
+
+	Для пулов-процессов func и аргументы должны сериализоваться pickle.
+	Текущая трасса (tracing) продолжается внутри func в обоих случаях.
+	"""
+	loop = asyncio.get_running_loop()
+	if _POOL_KINDS[pool] == "process":
+		call = functools.partial(tracing.run_in_context, tracing.current_context(), func, *args, **kwargs)
+	else:
+		# run_in_executor, в отличие от create_task, не копирует contextvars
+		call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+	return await loop.run_in_executor(get_executor(pool), call)
+
+
+def shutdown_executors(wait: bool = True) -> None:
+	with _executors_lock:
+		executors = list(_executors.values())
+		_executors.clear()
+	for executor in executors:
+		executor.shutdown(wait=wait)
+
+
+class ChatLocks:
+	"""Очередь на чат: asyncio.Lock выдаётся в порядке ожидания (FIFO).
+
+	Замки удаляются, как только у чата нет ни владельца, ни ожидающих,
+	поэтому словарь не растёт вместе с числом пользователей.
+	"""
+
+	def __init__(self):
+		self._locks: Dict[int, asyncio.Lock] = {}
+		self._users: Dict[int, int] = {}
+
+	def __len__(self) -> int:
+		return len(self._locks)
+
+	async def run(self, chat_id: int, coro_func: Callable[[], Awaitable[Any]]) -> Any:
+		lock = self._locks.get(chat_id)
+		if lock is None:
+			lock = self._locks[chat_id] = asyncio.Lock()
+		self._users[chat_id] = self._users.get(chat_id, 0) + 1
+		try:
+			async with lock:
+				return await coro_func()
+		finally:
+			self._users[chat_id] -= 1
+			if self._users[chat_id] == 0:
+				del self._users[chat_id]
+				del self._locks[chat_id]
+
+
+chat_locks = ChatLocks()
+
+
+def _chat_key(update: Any) -> Optional[int]:
+	"""Идентификатор чата для Message / CallbackQuery / PreCheckoutQuery."""
+	chat = getattr(update, "chat", None)
+	if chat is not None:
+		return chat.id
+	message = getattr(update, "message", None)
+	if message is not None and getattr(message, "chat", None) is not None:
+		return message.chat.id
+	user = getattr(update, "from_user", None)
+	return user.id if user is not None else None
+
+
+def per_chat(handler: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+	"""Декоратор хендлера: сериализует обработку апдейтов внутри одного чата."""
+	@functools.wraps(handler)
+	async def wrapper(update, *args, **kwargs):
+		key = _chat_key(update)
+		if key is None:
+			return await handler(update, *args, **kwargs)
+		return await chat_locks.run(key, lambda: handler(update, *args, **kwargs))
+
+	return wrapper
+
+
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def spawn(coro: Awaitable[Any], name: Optional[str] = None) -> asyncio.Task:
+	"""Запускает фоновую задачу и держит на неё ссылку до завершения."""
+	task = asyncio.get_running_loop().create_task(coro, name=name)
+	_background_tasks.add(task)
+	task.add_done_callback(_on_task_done)
+	return task
+
+
+def _on_task_done(task: asyncio.Task) -> None:
+	_background_tasks.discard(task)
+	if not task.cancelled() and task.exception() is not None:
+		print(f"[runtime] Фоновая задача {task.get_name()} упала: {task.exception()!r}")
+
+
+async def wait_background_tasks(timeout: Optional[float] = None) -> None:
+	"""Дожидается фоновых задач (используется при остановке бота)."""
+	if _background_tasks:
+		await asyncio.wait(set(_background_tasks), timeout=timeout)
@@ -0,0 +1,183 @@
+"""
+Быстрый старт: тяжёлые ресурсы создаются при первом обращении или
+прогреваются в фоне, а не при импорте.
+
+	timezone_finder = Lazy("timezonefinder", lambda: TimezoneFinder(in_memory=True))
+	timezone_finder.get().timezone_at(...)
+
+Все Lazy регистрируются в RESOURCES; bot.start_services после запуска
+вызывает warm_up_all в пуле 'io', так что первый пользователь обычно уже
+не ждёт загрузки полигонов часовых поясов, шрифтов или открытия БД.
+
+Отчёт о времени импорта и замер старта:
+
+	python -m startup --profile        # самые дорогие модули по python -X importtime
+	python -m startup --bench 5        # import bot в чистом процессе и фоновый прогрев
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+
+
+T = TypeVar("T")
+
+# Имя → ресурс, в порядке регистрации
+RESOURCES: Dict[str, "Lazy"] = {}
+
+
+class Lazy(Generic[T]):
+	"""Значение, которое создаётся один раз при первом get() (потокобезопасно).
+
+	Если фабрика упала, ошибка запоминается в error, а следующий get()
+	попробует ещё раз.
+	"""
+
+	def __init__(self, name: str, factory: Callable[[], T]):
+		self.name = name
+		self.factory = factory
+		self.seconds: Optional[float] = None
+		self.error: Optional[str] = None
+		self._value: Optional[T] = None
+		self._ready = False
+		self._lock = threading.Lock()
+		RESOURCES[name] = self
+
+	@property
+	def ready(self) -> bool:
+		return self._ready
+
+	def get(self) -> T:
+		if self._ready:
+			return self._value
+		with self._lock:
+			if not self._ready:
+				started = time.perf_counter()
+				try:
+					self._value = self.factory()
+				except Exception as e:
+					self.error = f"{type(e).__name__}: {e}"
+					raise
+				self.seconds = time.perf_counter() - started
+				self.error = None
+				self._ready = True
+		return self._value
+
+
+def warm_up_all(names: Optional[List[str]] = None) -> Dict[str, Optional[str]]:
+	"""Создаёт ресурсы заранее. Возвращает имя → None (готов) или текст ошибки.
+
+	Ресурсы, зарегистрированные во время прогрева (модуль импортировался
+	лениво), прогреваются в том же вызове.
+	"""
+	results: Dict[str, Optional[str]] = {}
+	while True:
+		pending = [
+			(name, resource) for name, resource in list(RESOURCES.items())
+			if name not in results and (names is None or name in names)
+		]
+		if not pending:
+			return results
+		for name, resource in pending:
+			try:
+				resource.get()
+				results[name] = None
+			except Exception as e:
+				results[name] = f"{type(e).__name__}: {e}"
+				print(f"[startup] Не удалось прогреть {name}: {e}")
+
+
+# ---------------------------------------------------------------------------
+# Профиль импорта и замер старта
+# ---------------------------------------------------------------------------
+
+def profile_imports(module: str = "bot", top: int = 25) -> List[Tuple[int, int, str]]:
+	"""(собственное мкс, суммарное мкс, модуль) для самых дорогих импортов module."""
+	proc = subprocess.run(
+		[sys.executable, "-X", "importtime", "-c", f"import {module}"],
+		cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True
+	)
+	rows = []
+	for line in proc.stderr.splitlines():
+		if not line.startswith("import time:") or "self [us]" in line:
+			continue
+		own, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|", 2))
+		rows.append((int(own), int(cumulative), name))
+	if proc.returncode != 0 and not rows:
+		raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"import {module} не удался")
+	return sorted(rows, key=lambda r: r[1], reverse=True)[:top]
+
+
+_BENCH_SCRIPT = """
+import time
+started = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+import startup
+startup.warm_up_all()
+warmed = time.perf_counter()
+print(imported - started, warmed - imported)
+for name, r in startup.RESOURCES.items():
+	print(name, r.seconds if r.seconds is not None else -1)
+"""
+
+
+def _is_timing_line(line: str) -> bool:
+	parts = line.split()
+	try:
+		return len(parts) == 2 and all(float(p) >= 0 for p in parts)
+	except ValueError:
+		return False
+
+
+def bench_startup(runs: int = 5, module: str = "bot") -> Dict[str, Any]:
+	"""Время import module и фонового прогрева, каждый раз в новом процессе."""
+	imports, warmups = [], []
+	resources: Dict[str, List[float]] = {}
+	for _ in range(runs):
+		proc = subprocess.run(
+			[sys.executable, "-c", _BENCH_SCRIPT.format(module=module)],
+			cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True
+		)
+		# Бот может печатать при импорте — замер в последних строках вывода
+		lines = proc.stdout.strip().splitlines()
+		marker = next(i for i in range(len(lines) - 1, -1, -1) if _is_timing_line(lines[i]))
+		imported, warmed = (float(x) for x in lines[marker].split())
+		rest = lines[marker + 1:]
+		imports.append(imported)
+		warmups.append(warmed)
+		for line in rest:
+			name, seconds = line.rsplit(" ", 1)
+			resources.setdefault(name, []).append(float(seconds))
+	return {"import": imports, "warm_up": warmups, "resources": resources}
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--module", default="bot")
+	parser.add_argument("--profile", action="store_true", help="отчёт python -X importtime")
+	parser.add_argument("--top", type=int, default=25)
+	parser.add_argument("--bench", type=int, default=0, metavar="RUNS", help="замер старта в RUNS процессах")
+	args = parser.parse_args()
+
+	if args.profile:
+		print(f"{'своё, мс':>10} {'всего, мс':>10}  модуль")
+		for own, cumulative, name in profile_imports(args.module, args.top):
+			print(f"{own / 1000:>10.1f} {cumulative / 1000:>10.1f}  {name}")
+
+	if args.bench:
+		result = bench_startup(args.bench, args.module)
+		best = min(result["import"])
+		print(f"\nimport {args.module}: лучший {best * 1000:.0f} мс, медиана "
+			  f"{sorted(result['import'])[len(result['import']) // 2] * 1000:.0f} мс")
+		print(f"Фоновый прогрев: медиана {sorted(result['warm_up'])[len(result['warm_up']) // 2] * 1000:.0f} мс")
+		for name, values in result["resources"].items():
+			print(f"  {name}: {sorted(values)[len(values) // 2] * 1000:.0f} мс")
+
+
+if __name__ == "__main__":
+	main()
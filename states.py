@@ -1,7 +1,12 @@
 from __future__ import annotations
-from datetime import datetime
+import copy
 import os
-from typing import Optional, Dict, Any
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional, Dict, Any
+
+from metrics import counter
+from startup import Lazy
 
 try:
 	from database import EncryptedDB
@@ -10,52 +15,118 @@ except ImportError:
 
 # In-memory fallback
 _in_memory_states: Dict[int, Dict[str, Any]] = {}
-CALLBACK_COOLDOWN: float = 3.5
-last_callback_time: Dict[int, datetime] = {}
 
-_db: Optional[EncryptedDB: Any] = None
+# Кэш сессий поверх БД (write-through). Безопасен, только когда все записи
+# пользователя идут из одного процесса — так делает cluster.py: кэшируются
+# лишь пользователи своей доли кольца (set_cache_owner), остальные читаются
+# и пишутся напрямую в БД. По умолчанию выключен.
+SESSION_CACHE_SIZE = int(os.environ.get("SESSION_CACHE_SIZE", "0"))
+_session_cache: "OrderedDict[int, Optional[Dict[str, Any]]]" = OrderedDict()
+_session_lock = threading.Lock()
+_cache_owns: Callable[[int], bool] = lambda uid: True
+_cache_lookups = counter("cache_lookups", "Обращения к кэшам: cache, result=hit|miss")
+
 
-if EncryptedDB is not None:
+def _open_db() -> Optional[EncryptedDB]:
+	"""Открывает БД, если задан DB_FERNET_KEY; иначе бот работает в памяти"""
+	if EncryptedDB is None:
+		return None
 	key = os.environ.get("DB_FERNET_KEY")
+	if not key:
+		return None
 	db_path = os.environ.get("DB_PATH", "db/data.sqlite")
-	if key:
-		try:
-			_db = EncryptedDB(path=db_path, fernet_key=key)
-			_db.init_db()
-		except Exception as e:
-			print(f"Не удалось инициализировать БД: {e}")
-			_db = None
+	try:
+		db = EncryptedDB(path=db_path, fernet_key=key)
+		db.init_db()
+		return db
+	except Exception as e:
+		print(f"Не удалось инициализировать БД: {e}")
+		return None
+
+
+# БД открывается при первом обращении (или фоновым прогревом после старта):
+# init_db и PBKDF2 для ключа-пароля не задерживают импорт бота
+_db_resource: Lazy[Optional[EncryptedDB]] = Lazy("database", _open_db)
 
 
 def _ensure_user_exists(telegram_id: int) -> None:
 	"""Создаёт запись в users, если её нет (только для БД-режима)"""
-	if not _db:
+	db = get_db()
+	if not db:
 		return
-	cur = _db._conn.cursor()
-	cur.execute(
-		"INSERT OR IGNORE INTO users (telegram_id) VALUES (?)",
-		(telegram_id,)
-	)
-	_db._conn.commit()
+	db.ensure_user_exists(telegram_id)
+
+
+def get_db() -> Optional[EncryptedDB]:
+	"""Возвращает подключение к БД или None, если бот работает в in-memory режиме"""
+	return _db_resource.get()
+
+
+def set_cache_owner(owns: Callable[[int], bool]) -> None:
+	"""Кэш сессий хранит только пользователей, для которых owns(uid) истинно"""
+	global _cache_owns
+	_cache_owns = owns
+	with _session_lock:
+		for uid in [uid for uid in _session_cache if not owns(uid)]:
+			del _session_cache[uid]
+
+
+def _cached(uid: int) -> bool:
+	return bool(SESSION_CACHE_SIZE) and _cache_owns(uid)
+
+
+def _load(uid: int) -> Optional[Dict[str, Any]]:
+	"""Состояние пользователя из БД (через кэш сессий, если он включён).
+	Возвращается копия: изменения вызывающего не попадают в кэш"""
+	db = get_db()
+	if not _cached(uid):
+		return db.get_state(uid)
+	with _session_lock:
+		if uid in _session_cache:
+			_session_cache.move_to_end(uid)
+			_cache_lookups.inc(cache="session", result="hit")
+			return copy.deepcopy(_session_cache[uid])
+	_cache_lookups.inc(cache="session", result="miss")
+	state_data = db.get_state(uid)
+	_remember(uid, state_data)
+	return state_data
+
+
+def _store(uid: int, state: str, data: Dict[str, Any]) -> None:
+	db = get_db()
+	db.set_state(uid, state, data)
+	if _cached(uid):
+		_remember(uid, {"state": state, "data": data})
+
+
+def _remember(uid: int, state_data: Optional[Dict[str, Any]]) -> None:
+	state_data = copy.deepcopy(state_data)
+	with _session_lock:
+		_session_cache[uid] = state_data
+		_session_cache.move_to_end(uid)
+		if len(_session_cache) > SESSION_CACHE_SIZE:
+			_session_cache.popitem(last=False)
 
 
 def get_state(uid: int) -> str:
-	if _db:
-		state_data = _db.get_state(uid)
+	db = get_db()
+	if db:
+		state_data = _load(uid)
 		return state_data.get("state") if state_data else "START"
 	return _in_memory_states.get(uid, {}).get("state", "START")
 
 
 def set_state(uid: int, state: str, data: Optional[Dict[str, Any]] = None) -> None:
-	if _db:
+	db = get_db()
+	if db:
 		_ensure_user_exists(uid)
 		
-		current = _db.get_state(uid) or {"state": "START", "data": {}}
+		current = _load(uid) or {"state": "START", "data": {}}
 		new_data = current["data"].copy()
 		if data:
 			new_data.update(data)
 		
-		_db.set_state(uid, state, new_data)
+		_store(uid, state, new_data)
 		return
 
 	# in-memory режим
@@ -67,16 +138,27 @@ def set_state(uid: int, state: str, data: Optional[Dict[str, Any]] = None) -> No
 		_in_memory_states[uid]["data"].update(data)
 
 
+def update_data(uid: int, data: Dict[str, Any]) -> None:
+	"""Дописывает поля в данные пользователя, не меняя его состояние"""
+	set_state(uid, get_state(uid), data)
+
+
 def get_data(uid: int) -> Dict[str, Any]:
-	if _db:
-		state_data = _db.get_state(uid)
+	db = get_db()
+	if db:
+		state_data = _load(uid)
 		return state_data.get("data", {}) if state_data else {}
 	return _in_memory_states.get(uid, {}).get("data", {})
 
 
 def is_paid(uid: int) -> bool:
-	if _db:
-		state_data = _db.get_state(uid)
+	db = get_db()
+	if db:
+		# Журнал платежей — индексный поиск без расшифровки состояния
+		if db.get_latest_payment(uid):
+			return True
+		# Оплаты, записанные до появления журнала, хранятся только во флаге paid
+		state_data = _load(uid)
 		if not state_data:
 			return False
 		return bool(state_data.get("data", {}).get("paid", False))
@@ -86,17 +168,18 @@ def is_paid(uid: int) -> bool:
 
 
 def set_paid(uid: int, charge_id: Optional[str] = None) -> None:
-	"""charge_id пока не используем, но оставляем для будущего расширения"""
-	if _db:
+	"""Помечает пользователя оплатившим; charge_id — ключ идемпотентной доставки PDF"""
+	db = get_db()
+	if db:
 		_ensure_user_exists(uid)
 		
-		current = _db.get_state(uid) or {"state": "START", "data": {}}
+		current = _load(uid) or {"state": "START", "data": {}}
 		new_data = current["data"].copy()
 		new_data["paid"] = True
 		if charge_id:
 			new_data["charge_id"] = charge_id
 		
-		_db.set_state(uid, current["state"], new_data)
+		_store(uid, current["state"], new_data)
 		return
 
 	# in-memory
@@ -109,7 +192,8 @@ def set_paid(uid: int, charge_id: Optional[str] = None) -> None:
 
 
 def migrate_from_memory(memory_states: Dict[int, Dict[str, Any]]) -> int:
-	if not _db:
+	db = get_db()
+	if not db:
 		raise RuntimeError("База данных не настроена — миграция невозможна.")
 	
 	count = 0
@@ -121,7 +205,7 @@ def migrate_from_memory(memory_states: Dict[int, Dict[str, Any]]) -> int:
 			data["paid"] = True
 		
 		_ensure_user_exists(uid)
-		_db.set_state(int(uid), state, data)
+		db.set_state(int(uid), state, data)
 		count += 1
 	
 	return count
@@ -131,9 +215,9 @@ def get_all_user_ids() -> list[int]:
 	"""
 	Возвращает список всех telegram_id, которые есть в хранилище (БД или память).
 	"""
-	if _db:
-		cur = _db._conn.execute("SELECT telegram_id FROM user_states")
-		return [row[0] for row in cur.fetchall()]
+	db = get_db()
+	if db:
+		return db.list_user_ids()
 	
 	# in-memory режим
 	return list(_in_memory_states.keys())
@@ -149,7 +233,15 @@ def get_active_user_count() -> int:
 
 
 def get_paid_user_count() -> int:
-	"""Считает пользователей с paid = True"""
+	"""Считает оплативших пользователей.
+
+	В БД-режиме — одним запросом по журналу платежей, без расшифровки
+	состояний; оплаты до появления журнала (только флаг paid) не учитываются.
+	"""
+	db = get_db()
+	if db:
+		return db.count_paid_users()
+
 	count = 0
 	for uid in get_all_user_ids():
 		if is_paid(uid):
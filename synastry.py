@@ -0,0 +1,237 @@
+"""
+Синастрия: совместимость двух натальных карт (calculate_full_chart).
+
+	result = synastry(chart_a, chart_b)
+	result['matrix']['Venus']['Mars']   # аспект Венеры A к Марсу B или None
+	result['overlays']['b_in_a']        # в каких домах A стоят планеты B
+	result['score']                     # 0–100
+
+Матрица аспектов 10×10 не перебирает аспекты для каждой пары: по разности
+долгот в сотых долях градуса сразу берётся запись из таблицы aspect_table
+(аспект, орб, множитель точности), построенной один раз.
+
+Один ко многим (score_many) — для тысяч сохранённых карт: по карте A
+строятся 10 таблиц по кругу с шагом BATCH_RESOLUTION градуса, где для
+планеты B в каждой точке круга уже сложены веса всех её аспектов к
+планетам A и её дом в карте A. Оценка кандидата — 10 обращений к таблицам;
+лучшие top кандидатов затем пересчитываются точно.
+"""
+
+import math
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from calculator import ASPECTS, ORB_LIMITS, PLANETS
+from startup import Lazy
+from texts import get_house
+
+
+# Вклад аспекта в совместимость: гармоничные плюс, напряжённые минус
+ASPECT_VALUES = {'conj': 1.0, 'trine': 1.0, 'sextile': 0.7, 'square': -0.7, 'opp': -0.5}
+
+# Вес планеты в паре; вес пары — произведение весов
+PLANET_WEIGHTS = {
+	'Sun': 3.0, 'Moon': 3.0, 'Venus': 3.0, 'Mars': 2.0, 'Mercury': 1.5,
+	'Jupiter': 1.0, 'Saturn': 1.0, 'Uranus': 0.5, 'Neptune': 0.5, 'Pluto': 0.5
+}
+
+# Планета одного партнёра в доме другого (только личные планеты)
+OVERLAY_PLANETS = ('Sun', 'Moon', 'Mercury', 'Venus', 'Mars')
+OVERLAY_HOUSE_VALUES = {1: 1.0, 5: 1.5, 7: 2.0, 8: 1.0, 4: 0.5, 11: 0.5}
+
+# Сырой балл переводится в 0–100 через tanh; SCORE_SCALE — балл, дающий ≈ 88
+SCORE_SCALE = 30.0
+
+TABLE_RESOLUTION = 0.01  # градуса
+BATCH_RESOLUTION = 0.5   # градуса
+
+PLANET_ORDER = list(PLANETS)
+
+Aspect = Tuple[str, float, float]  # (тип, орб, точность 0–1)
+
+
+def _build_aspect_table(resolution: float = TABLE_RESOLUTION) -> List[Optional[Aspect]]:
+	"""Разность долгот 0–180° (индекс = round(разность / resolution)) → аспект или None."""
+	size = int(round(180 / resolution)) + 1
+	table: List[Optional[Aspect]] = [None] * size
+	for index in range(size):
+		diff = index * resolution
+		best = None
+		for name, angle in ASPECTS:
+			orb = abs(diff - angle)
+			limit = ORB_LIMITS.get(name, 5)
+			if orb <= limit and (best is None or orb < best[1]):
+				best = (name, orb, 1.0 - orb / limit)
+		table[index] = best
+	return table
+
+
+# 18 001 запись строится при первой синастрии или прогревом, не при импорте
+aspect_table = Lazy("synastry_aspects", _build_aspect_table)
+
+
+def aspect_between(lon1: float, lon2: float) -> Optional[Aspect]:
+	diff = abs(lon1 - lon2) % 360.0
+	if diff > 180.0:
+		diff = 360.0 - diff
+	return aspect_table.get()[int(round(diff / TABLE_RESOLUTION))]
+
+
+def aspect_matrix(chart_a: Dict, chart_b: Dict) -> Dict[str, Dict[str, Optional[Aspect]]]:
+	"""Аспекты планет A (строки) к планетам B (столбцы)."""
+	pos_a, pos_b = chart_a['positions'], chart_b['positions']
+	return {
+		p1: {p2: aspect_between(pos_a[p1], pos_b[p2]) for p2 in PLANET_ORDER if p2 in pos_b}
+		for p1 in PLANET_ORDER if p1 in pos_a
+	}
+
+
+def house_overlays(host: Dict, guest: Dict) -> Dict[str, int]:
+	"""Дома карты host, в которые попадают планеты guest.
+
+	При неизвестном времени рождения host куспиды условные (на полдень),
+	поэтому наложений нет — пустой словарь.
+	"""
+	if host.get('unknown_time'):
+		return {}
+	cusps = host.get('cusps') or []
+	return {planet: get_house(cusps, lon) for planet, lon in guest['positions'].items()}
+
+
+def _aspect_score(p1: str, p2: str, aspect: Optional[Aspect]) -> float:
+	if aspect is None:
+		return 0.0
+	name, _, exactness = aspect
+	return ASPECT_VALUES.get(name, 0.0) * PLANET_WEIGHTS.get(p1, 1.0) * PLANET_WEIGHTS.get(p2, 1.0) * exactness
+
+
+def _overlay_score(overlays: Dict[str, int]) -> float:
+	return sum(
+		OVERLAY_HOUSE_VALUES.get(house, 0.0) * PLANET_WEIGHTS[planet]
+		for planet, house in overlays.items() if planet in OVERLAY_PLANETS
+	)
+
+
+def _to_percent(raw: float) -> float:
+	return round(50.0 + 50.0 * math.tanh(raw / SCORE_SCALE), 1)
+
+
+def synastry(chart_a: Dict, chart_b: Dict) -> Dict:
+	"""Полная синастрия: матрица аспектов, наложения домов и оценка 0–100."""
+	matrix = aspect_matrix(chart_a, chart_b)
+	b_in_a = house_overlays(chart_a, chart_b)
+	a_in_b = house_overlays(chart_b, chart_a)
+
+	aspects = []
+	raw = 0.0
+	for p1, row in matrix.items():
+		for p2, aspect in row.items():
+			if aspect is None:
+				continue
+			value = _aspect_score(p1, p2, aspect)
+			raw += value
+			aspects.append({'p1': p1, 'p2': p2, 'type': aspect[0], 'orb': aspect[1], 'score': value})
+	raw += _overlay_score(b_in_a) + _overlay_score(a_in_b)
+
+	aspects.sort(key=lambda a: abs(a['score']), reverse=True)
+	return {
+		'matrix': matrix,
+		'aspects': aspects,
+		'overlays': {'b_in_a': b_in_a, 'a_in_b': a_in_b},
+		'raw_score': raw,
+		'score': _to_percent(raw),
+	}
+
+
+def score(chart_a: Dict, chart_b: Dict) -> float:
+	return synastry(chart_a, chart_b)['score']
+
+
+# ---------------------------------------------------------------------------
+# Один ко многим
+# ---------------------------------------------------------------------------
+
+class BatchScorer:
+	"""Таблицы вклада планет кандидата для фиксированной карты A.
+
+	tables[planet][i] — сумма аспектов планеты кандидата в точке
+	i * resolution ко всем планетам A плюс её наложение на дома A.
+	Наложение планет A на дома кандидата зависит от его куспидов и
+	считается для каждого кандидата отдельно (5 вызовов get_house).
+	Карты с unknown_time, как и в house_overlays, наложений не дают.
+	"""
+
+	def __init__(self, chart: Dict, resolution: float = BATCH_RESOLUTION):
+		self.chart = chart
+		self.resolution = resolution
+		self.bins = int(round(360 / resolution))
+		pos_a = chart['positions']
+		# Без времени рождения A её куспиды условные — наложений на дома A нет
+		cusps = None if chart.get('unknown_time') else chart.get('cusps') or []
+		self.tables: Dict[str, List[float]] = {}
+		for planet in PLANET_ORDER:
+			table = []
+			for i in range(self.bins):
+				lon = i * resolution
+				value = sum(_aspect_score(p, planet, aspect_between(pos_a[p], lon)) for p in pos_a)
+				if cusps is not None and planet in OVERLAY_PLANETS:
+					value += OVERLAY_HOUSE_VALUES.get(get_house(cusps, lon), 0.0) * PLANET_WEIGHTS[planet]
+				table.append(value)
+			self.tables[planet] = table
+		self._guests = [
+			(pos_a[p], PLANET_WEIGHTS[p]) for p in OVERLAY_PLANETS if p in pos_a
+		]
+
+	def raw_score(self, other: Dict) -> float:
+		bins, resolution = self.bins, self.resolution
+		raw = 0.0
+		for planet, lon in other['positions'].items():
+			table = self.tables.get(planet)
+			if table is not None:
+				raw += table[int(round(lon / resolution)) % bins]
+		if other.get('unknown_time'):
+			return raw
+		cusps = other.get('cusps') or []
+		for lon, weight in self._guests:
+			raw += OVERLAY_HOUSE_VALUES.get(get_house(cusps, lon), 0.0) * weight
+		return raw
+
+	def score(self, other: Dict) -> float:
+		return _to_percent(self.raw_score(other))
+
+
+def score_many(chart: Dict, candidates: Iterable[Tuple[object, Dict]], top: int = 20,
+			   resolution: float = BATCH_RESOLUTION) -> List[Tuple[object, float]]:
+	"""Лучшие top кандидатов (ключ, оценка 0–100) по убыванию оценки.
+
+	candidates — пары (ключ, карта). Все кандидаты оцениваются по таблицам,
+	первые top пересчитываются точно через synastry.
+	"""
+	scorer = BatchScorer(chart, resolution)
+	rough = [(scorer.raw_score(other), key, other) for key, other in candidates]
+	# Запас на погрешность таблиц: точно пересчитываем вдвое больше
+	rough.sort(key=lambda r: r[0], reverse=True)
+	exact = [(key, score(chart, other)) for _, key, other in rough[:top * 2]]
+	exact.sort(key=lambda r: r[1], reverse=True)
+	return exact[:top]
+
+
+def stored_charts(exclude: Optional[int] = None) -> Iterator[Tuple[int, Dict]]:
+	"""(telegram_id, карта) пользователей, у которых в состоянии сохранена карта."""
+	from states import get_all_user_ids, get_data
+
+	for uid in get_all_user_ids():
+		if uid == exclude:
+			continue
+		chart = get_data(uid).get('chart')
+		if chart and chart.get('positions'):
+			yield uid, chart
+
+
+def best_matches(uid: int, top: int = 20) -> List[Tuple[int, float]]:
+	"""Самые совместимые с uid пользователи среди сохранённых карт."""
+	from states import get_data
+
+	chart = get_data(uid).get('chart')
+	if not chart:
+		return []
+	return score_many(chart, stored_charts(exclude=uid), top=top)
@@ -1,12 +1,26 @@
+import html
 import json
 import os
 
+from calculator import SIGNS
+from houses import HOUSE_NAMES_RU
+from transits import SLOW_PLANETS, find_transits, highlights, period_years
+
 CONTENT_DIR = os.path.join(os.path.dirname(__file__), "source")
 
 # Эмодзи планет
 PLANET_EMOJI = {
 	'Sun': '☉', 'Moon': '☽', 'Mercury': '☿', 'Venus': '♀', 'Mars': '♂',
-	'Jupiter': '♃', 'Saturn': '♄', 'Uranus': '♅', 'Neptune': '♆', 'Pluto': '♇'
+	'Jupiter': '♃', 'Saturn': '♄', 'Uranus': '♅', 'Neptune': '♆', 'Pluto': '♇',
+	'NorthNode': '☊', 'SouthNode': '☋', 'Lilith': '⚸', 'Chiron': '⚷',
+	'Ceres': '⚳', 'Pallas': '⚴', 'Juno': '⚵', 'Vesta': '⚶'
+}
+
+# Русские названия дополнительных тел (bodies.py)
+BODY_NAMES_RU = {
+	'NorthNode': 'Северный узел', 'SouthNode': 'Южный узел', 'Lilith': 'Лилит',
+	'Chiron': 'Хирон', 'Ceres': 'Церера', 'Pallas': 'Паллада', 'Juno': 'Юнона',
+	'Vesta': 'Веста', 'Pholus': 'Фол'
 }
 
 # Русские названия аспектов
@@ -15,7 +29,13 @@ ASPECT_NAMES_RU = {
 	'opp': '☍ оппозиция',
 	'trine': '△ трин',
 	'square': '□ квадратура',
-	'sextile': '⚹ секстиль'
+	'sextile': '⚹ секстиль',
+	'semisextile': 'полусекстиль',
+	'semisquare': '∠ полуквадрат',
+	'quintile': 'квинтиль',
+	'sesquiquadrate': 'полутораквадрат',
+	'biquintile': 'биквинтиль',
+	'quincunx': 'квинконс'
 }
 
 # Сопоставление типа аспекта → имя файла
@@ -161,6 +181,77 @@ def _group_planets_by_house(positions: dict, cusps: list) -> dict:
 	return planets_by_house
 
 
+def describe_transit(event: dict) -> str:
+	"""Строка транзитного события (transits.find_transits / highlights)."""
+	planet = f"{PLANET_EMOJI.get(event['planet'], '★')} {event['planet']}"
+	if event['kind'] == 'aspect':
+		passes = event.get('passes') or [event]
+		dates = ", ".join(p['date'].strftime("%d.%m.%Y") for p in passes)
+		aspect = ASPECT_NAMES_RU.get(event['aspect'], event['aspect'])
+		return f"{planet} {aspect} к натальному {event['target']}: {dates}"
+	retro = " (ретроградно)" if event['retrograde'] else ""
+	date = event['date'].strftime("%d.%m.%Y")
+	if event['kind'] == 'sign':
+		return f"{planet} входит в знак {SIGNS[event['sign']]}{retro}: {date}"
+	return f"{planet} входит в {event['house']} дом{retro}: {date}"
+
+
+def format_ranges(ranges: list, key: str = 'sign') -> str:
+	"""Диапазоны unknown_time одной строкой: «Рак 00:00–13:40, Лев 13:41–23:59»."""
+	parts = []
+	for r in ranges:
+		value = SIGNS[r['sign']] if key == 'sign' else f"{r['house']} дом"
+		parts.append(f"{value} {r['from']}–{r['to']}")
+	return ", ".join(parts)
+
+
+# Линии астрокартографии
+ANGLE_NAMES_RU = {'ASC': 'восхода (ASC)', 'DSC': 'захода (DSC)', 'MC': 'зенита (MC)', 'IC': 'надира (IC)'}
+
+
+def describe_line(line: dict) -> str:
+	"""«☉ Sun — линия зенита (MC), 1.2° по долготе»."""
+	planet = f"{PLANET_EMOJI.get(line['planet'], '★')} {line['planet']}"
+	return f"{planet} — линия {ANGLE_NAMES_RU[line['angle']]}, {line['distance']:.1f}° по долготе"
+
+
+def format_relocation(reloc: dict) -> str:
+	"""Релоцированная карта (astrocartography.relocate_to) текстом для Telegram (HTML)."""
+	lines = [
+		f"🌍 <b>Карта в месте: {html.escape(reloc.get('place', ''))}</b>",
+		f"↑ Асцендент: {deg_to_sign(reloc['asc'])}",
+		f"Середина Неба (MC): {deg_to_sign(reloc['mc'])}",
+		f"Система домов: {HOUSE_NAMES_RU.get(reloc['house_system'], reloc['house_system'])}",
+		"",
+	]
+	for planet, house in reloc['houses'].items():
+		lines.append(f"{PLANET_EMOJI.get(planet, '★')} {planet} — {house} дом")
+	if reloc['lines']:
+		lines.append("")
+		lines.append("<b>Рядом проходят линии:</b>")
+		lines.extend(describe_line(line) for line in reloc['lines'])
+	return "\n".join(lines)
+
+
+def house_system_note(chart: dict) -> str:
+	"""Пояснение, если за полярным кругом выбранная система домов заменена запасной."""
+	if not chart.get('house_fallback'):
+		return ""
+	chosen = HOUSE_NAMES_RU.get(chart['house_fallback'], chart['house_fallback'])
+	used = HOUSE_NAMES_RU.get(chart['house_system'], chart['house_system'])
+	return f"За полярным кругом система домов {chosen} не определена — дома рассчитаны по системе {used}."
+
+
+def _next_transit(chart) -> str:
+	"""Ближайший транзит медленной планеты к личной точке или пустая строка."""
+	try:
+		upcoming = highlights(find_transits(chart, planets=SLOW_PLANETS), limit=1)
+	except Exception as e:
+		print(f"Ошибка расчёта транзитов: {e}")
+		return ""
+	return describe_transit(upcoming[0]) if upcoming else ""
+
+
 def generate_free_interpretation(chart):
 	pos = chart['positions']
 	asc = chart['asc']
@@ -180,9 +271,24 @@ def generate_free_interpretation(chart):
 
 	text = "<b>Краткий предварительный разбор вашей натальной карты</b>\n\n"
 
+	unknown = chart.get('unknown_time')
+
 	text += f"🌞 <b>Солнце в {sun_sign}</b>\n{sun_text}\n\n"
-	text += f"🌙 <b>Луна в {moon_sign}</b>\n{moon_text}\n\n"
-	text += f"↑ <b>Асцендент в {asc_sign}</b>\n{asc_text}\n\n"
+	if unknown and len(unknown['moon']) > 1:
+		# Луна за сутки сменила знак — без времени рождения знак не определить
+		text += f"🌙 <b>Луна</b> (зависит от времени рождения): {format_ranges(unknown['moon'])}\n\n"
+	elif unknown:
+		text += f"🌙 <b>Луна в знаке {moon_sign.split(' ', 1)[1]}</b>\n{moon_text}\n\n"
+	else:
+		text += f"🌙 <b>Луна в {moon_sign}</b>\n{moon_text}\n\n"
+	if unknown:
+		text += "↑ <b>Асцендент</b> без точного времени рождения не определить. По времени суток:\n"
+		text += f"{format_ranges(unknown['asc'])}\n\n"
+	else:
+		text += f"↑ <b>Асцендент в {asc_sign}</b>\n{asc_text}\n\n"
+		note = house_system_note(chart)
+		if note:
+			text += f"<i>{note}</i>\n\n"
 
 	if aspects:
 		best = min(aspects, key=lambda a: a['orb'])
@@ -191,6 +297,11 @@ def generate_free_interpretation(chart):
 		text += f"<b>Ключевой аспект:</b> {p1} {best['type']} {p2} (орб {best['orb']:.1f}°)\n"
 		text += f"{aspect_text}\n\n"
 
+	next_transit = _next_transit(chart)
+	if next_transit:
+		text += f"⏳ <b>Ближайший важный транзит:</b>\n{next_transit}\n\n"
+
+	start_year, end_year = period_years()
 	text += "────────────────────────────\n"
 	text += "<i>Это только первые штрихи — как обложка книги.</i>\n\n"
 	text += "<b>В полной версии вы получите гораздо больше:</b>\n"
@@ -200,7 +311,7 @@ def generate_free_interpretation(chart):
 	text += "• деньги и карьера\n"
 	text += "• теневые стороны и блоки\n"
 	text += "• главная жизненная задача\n"
-	text += "• главная жизненная задача + текущий период (2025–2027)\n\n"
+	text += f"• главная жизненная задача + текущий период ({start_year}–{end_year})\n\n"
 	text += "<b>Хотите увидеть полную картину?</b>\nНажмите кнопку ниже 👇"
 
 	return text
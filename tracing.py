@@ -0,0 +1,358 @@
+"""
+Трассировка запросов: trace_id и спаны по этапам (карта, LLM, PDF, отправка).
+
+	from tracing import span, traced
+
+	with span("request.chart", uid=uid):
+		...
+
+	@traced("pdf.create")
+	def create_natal_pdf(...): ...
+
+Текущий спан хранится в contextvars, поэтому trace_id сам переходит в
+asyncio-задачи (spawn, create_task копируют контекст) и в пулы runtime:
+run_blocking запускает функцию в копии контекста, а в пул-процесс
+передаёт родителя явно (run_in_context). Спан без родителя начинает
+новую трассу.
+
+Завершённые спаны пишутся строками JSON в TRACE_FILE — поля и имена как в
+OTLP/JSON (traceId, spanId, parentSpanId, startTimeUnixNano, ...).
+TRACE_SAMPLE — доля трасс, которые экспортируются (решение принимается
+у корня и наследуется); по умолчанию 0 — спаны не пишутся. Файл
+ротируется по размеру: при TRACE_MAX_BYTES текущий переименовывается в
+.1 (старые сдвигаются до .TRACE_BACKUPS), запись продолжается в новый.
+
+Профилировщик медленных запросов (PROFILE_SLOW_SECONDS > 0): фоновый поток
+раз в PROFILE_INTERVAL секунд снимает стеки потоков, выполняющих спаны
+трасс старше порога, и по завершении трассы пишет свёрнутые стеки
+(формат flamegraph) в PROFILE_FILE. Быстрые запросы профилировщик не
+трогает. Синхронные спаны в пулах потоков привязаны к своему потоку;
+код в event loop не семплируется — его время видно по спанам.
+"""
+
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+TRACE_FILE = os.getenv("TRACE_FILE", "logs/traces.jsonl")
+TRACE_SAMPLE = float(os.getenv("TRACE_SAMPLE", "0"))
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(50 * 1024 * 1024)))
+TRACE_BACKUPS = int(os.getenv("TRACE_BACKUPS", "3"))
+PROFILE_FILE = os.getenv("PROFILE_FILE", "logs/profiles.jsonl")
+PROFILE_SLOW_SECONDS = float(os.getenv("PROFILE_SLOW_SECONDS", "0"))  # 0 — профилировщик выключен
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.01"))
+
+# (trace_id, span_id, начало трассы по time.monotonic, sampled) — то, что передаётся в пул-процесс
+ParentContext = Tuple[str, str, float, bool]
+
+
+def _new_id(bits: int) -> str:
+	return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+class Span:
+	__slots__ = ("name", "trace_id", "span_id", "parent_id", "trace_start", "sampled",
+				 "start_ns", "end_ns", "attributes", "error")
+
+	def __init__(self, name: str, parent: Optional[ParentContext], attributes: Dict[str, Any]):
+		self.name = name
+		self.span_id = _new_id(64)
+		if parent is None:
+			self.trace_id = _new_id(128)
+			self.parent_id = None
+			self.trace_start = time.monotonic()
+			self.sampled = random.random() < TRACE_SAMPLE
+		else:
+			self.trace_id, self.parent_id, self.trace_start, self.sampled = parent
+		self.start_ns = time.time_ns()
+		self.end_ns = 0
+		self.attributes = attributes
+		self.error: Optional[str] = None
+
+	@property
+	def is_root(self) -> bool:
+		return self.parent_id is None
+
+	def context(self) -> ParentContext:
+		return self.trace_id, self.span_id, self.trace_start, self.sampled
+
+	def set(self, **attributes: Any) -> None:
+		self.attributes.update(attributes)
+
+	def to_json(self) -> Dict[str, Any]:
+		return {
+			"traceId": self.trace_id,
+			"spanId": self.span_id,
+			"parentSpanId": self.parent_id or "",
+			"name": self.name,
+			"startTimeUnixNano": self.start_ns,
+			"endTimeUnixNano": self.end_ns,
+			"durationMs": round((self.end_ns - self.start_ns) / 1e6, 3),
+			"attributes": self.attributes,
+			"status": {"code": "ERROR", "message": self.error} if self.error else {"code": "OK"},
+		}
+
+
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+class JsonLinesExporter:
+	"""Дописывает записи в файл по одной строке JSON (общий файл для всех процессов)
+	с ротацией по размеру."""
+
+	# Размер файла сверяется раз в столько записей, а не на каждой
+	ROTATE_CHECK_EVERY = 100
+
+	def __init__(self, path: str, max_bytes: int = TRACE_MAX_BYTES, backups: int = TRACE_BACKUPS):
+		self.path = path
+		self.max_bytes = max_bytes
+		self.backups = backups
+		self._lock = threading.Lock()
+		self._file = None
+		self._writes = 0
+
+	def _open(self) -> None:
+		if self._file is not None:
+			self._file.close()
+		os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+		self._file = open(self.path, "a", encoding="utf-8", buffering=1)
+
+	def _rotate_if_needed(self) -> None:
+		try:
+			on_disk = os.stat(self.path)
+		except FileNotFoundError:
+			self._open()
+			return
+		if os.fstat(self._file.fileno()).st_ino != on_disk.st_ino:
+			# Файл уже ротировал другой процесс — переходим на новый
+			self._open()
+		elif on_disk.st_size >= self.max_bytes:
+			for i in range(self.backups - 1, 0, -1):
+				if os.path.exists(f"{self.path}.{i}"):
+					os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+			if self.backups > 0:
+				os.replace(self.path, f"{self.path}.1")
+			else:
+				os.remove(self.path)
+			self._open()
+
+	def export(self, record: Dict[str, Any]) -> None:
+		line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+		with self._lock:
+			try:
+				if self._file is None:
+					self._open()
+				elif self.max_bytes and self._writes % self.ROTATE_CHECK_EVERY == 0:
+					self._rotate_if_needed()
+				self._writes += 1
+				self._file.write(line)
+			except OSError as e:
+				print(f"[tracing] Не удалось записать {self.path}: {e}")
+
+
+exporter = JsonLinesExporter(TRACE_FILE)
+
+
+def current_span() -> Optional[Span]:
+	return _current.get()
+
+
+def current_context() -> Optional[ParentContext]:
+	current = _current.get()
+	return current.context() if current is not None else None
+
+
+def set_attributes(**attributes: Any) -> None:
+	"""Дописывает атрибуты в текущий спан (если он есть)."""
+	current = _current.get()
+	if current is not None:
+		current.set(**attributes)
+
+
+class span:
+	"""Спан: контекстный менеджер (with span(...)) или декоратор (@span(...))."""
+
+	def __init__(self, name: str, **attributes: Any):
+		self.name = name
+		self.attributes = attributes
+		self._stack = []
+
+	def _start(self, parent: Optional[ParentContext] = None) -> Tuple[Span, contextvars.Token]:
+		if parent is None:
+			parent = current_context()
+		s = Span(self.name, parent, dict(self.attributes))
+		profiler.enter(s)
+		return s, _current.set(s)
+
+	@staticmethod
+	def _finish(s: Span, token: contextvars.Token, exc: Optional[BaseException]) -> None:
+		s.end_ns = time.time_ns()
+		if exc is not None:
+			s.error = f"{type(exc).__name__}: {exc}"
+		_current.reset(token)
+		profiler.exit(s)
+		if s.sampled:
+			exporter.export(s.to_json())
+		if s.is_root:
+			profiler.trace_finished(s)
+
+	def __enter__(self) -> Span:
+		s, token = self._start()
+		self._stack.append((s, token))
+		return s
+
+	def __exit__(self, exc_type, exc, tb) -> None:
+		s, token = self._stack.pop()
+		self._finish(s, token, exc)
+
+	def __call__(self, func: Callable) -> Callable:
+		if asyncio.iscoroutinefunction(func):
+			@functools.wraps(func)
+			async def async_wrapper(*args, **kwargs):
+				s, token = self._start()
+				try:
+					result = await func(*args, **kwargs)
+				except BaseException as e:
+					self._finish(s, token, e)
+					raise
+				self._finish(s, token, None)
+				return result
+			return async_wrapper
+
+		@functools.wraps(func)
+		def wrapper(*args, **kwargs):
+			s, token = self._start()
+			try:
+				result = func(*args, **kwargs)
+			except BaseException as e:
+				self._finish(s, token, e)
+				raise
+			self._finish(s, token, None)
+			return result
+		return wrapper
+
+
+traced = span
+
+
+def run_in_context(parent: Optional[ParentContext], func: Callable, *args: Any, **kwargs: Any) -> Any:
+	"""Выполняет func в другом процессе как продолжение трассы parent."""
+	if parent is None:
+		return func(*args, **kwargs)
+	s = Span("process", parent, {"pid": os.getpid()})
+	token = _current.set(s)
+	try:
+		result = func(*args, **kwargs)
+	except BaseException as e:
+		span._finish(s, token, e)
+		raise
+	span._finish(s, token, None)
+	return result
+
+
+# ---------------------------------------------------------------------------
+# Профилировщик медленных запросов
+# ---------------------------------------------------------------------------
+
+class SlowRequestProfiler:
+	def __init__(self, threshold: float = PROFILE_SLOW_SECONDS, interval: float = PROFILE_INTERVAL,
+				 path: str = PROFILE_FILE):
+		self.threshold = threshold
+		self.interval = interval
+		self.exporter = JsonLinesExporter(path)
+		self._threads: Dict[int, Span] = {}
+		self._samples: Dict[str, Counter] = {}
+		self._lock = threading.Lock()
+		self._thread: Optional[threading.Thread] = None
+		self._stop = threading.Event()
+
+	@property
+	def enabled(self) -> bool:
+		return self._thread is not None
+
+	def start(self, threshold: Optional[float] = None) -> None:
+		if threshold is not None:
+			self.threshold = threshold
+		if self._thread is None and self.threshold > 0:
+			self._stop.clear()
+			self._thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+			self._thread.start()
+
+	def stop(self) -> None:
+		if self._thread is not None:
+			self._stop.set()
+			self._thread.join()
+			self._thread = None
+
+	def enter(self, s: Span) -> None:
+		if self._thread is not None and not _in_event_loop():
+			self._threads[threading.get_ident()] = s
+
+	def exit(self, s: Span) -> None:
+		if self._thread is None:
+			return
+		tid = threading.get_ident()
+		if self._threads.get(tid) is s:
+			parent = _current.get()
+			if parent is not None and parent.trace_id == s.trace_id and not _in_event_loop():
+				self._threads[tid] = parent
+			else:
+				self._threads.pop(tid, None)
+
+	def trace_finished(self, root: Span) -> None:
+		with self._lock:
+			samples = self._samples.pop(root.trace_id, None)
+		if samples:
+			self.exporter.export({
+				"traceId": root.trace_id,
+				"name": root.name,
+				"durationMs": round((root.end_ns - root.start_ns) / 1e6, 3),
+				"intervalMs": self.interval * 1000,
+				"stacks": dict(samples.most_common()),
+			})
+
+	def _run(self) -> None:
+		while not self._stop.wait(self.interval):
+			now = time.monotonic()
+			frames = sys._current_frames()
+			for tid, s in list(self._threads.items()):
+				if now - s.trace_start < self.threshold:
+					continue
+				frame = frames.get(tid)
+				if frame is None:
+					continue
+				stack = _collapse(frame)
+				with self._lock:
+					self._samples.setdefault(s.trace_id, Counter())[f"{s.name};{stack}"] += 1
+
+
+def _in_event_loop() -> bool:
+	try:
+		asyncio.get_running_loop()
+	except RuntimeError:
+		return False
+	return True
+
+
+def _collapse(frame, limit: int = 64) -> str:
+	"""Стек в свёрнутом виде: внешний;...;внутренний (module:function:line)."""
+	parts = []
+	while frame is not None and len(parts) < limit:
+		code = frame.f_code
+		parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+		frame = frame.f_back
+	return ";".join(reversed(parts))
+
+
+profiler = SlowRequestProfiler()
+if PROFILE_SLOW_SECONDS > 0:
+	profiler.start()
@@ -0,0 +1,123 @@
+"""
+Транзиты: точные моменты аспектов транзитных планет к натальным точкам,
+входы в знаки и в натальные дома на окне в несколько лет.
+
+	events = find_transits(chart, years=3)
+	main = highlights(events)  # медленные планеты к личным точкам
+
+Вместо перебора по дням каждая планета один раз проходится развёрткой
+ephemeris.sweep (сетка SWEEP_STEP суток со станциями, общий кэш). Все цели
+события — долготы: натальная точка ± угол аспекта, границы знаков и
+куспиды. Проходы через них находит ephemeris.crossings — bisect по
+отсортированному списку целей и метод Ньютона внутри скобки.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pytz
+
+from calculator import ASPECTS, PLANETS
+from ephemeris import SWEEP_STEP, crossings, jd_to_datetime, to_jd
+
+
+TRANSIT_YEARS = 3
+
+# Луна по умолчанию не считается: за три года это ~5 тысяч проходов (аспект
+# к каждой точке раз в месяц), которые прогнозу не нужны
+TRANSIT_PLANETS = tuple(planet for planet in PLANETS if planet != 'Moon')
+# Медленные планеты задают «текущий период»; быстрые дают слишком много событий
+SLOW_PLANETS = ('Jupiter', 'Saturn', 'Uranus', 'Neptune', 'Pluto')
+PERSONAL_POINTS = ('Sun', 'Moon', 'Mercury', 'Venus', 'Mars', 'ASC', 'MC')
+MAJOR_TRANSIT_ASPECTS = ('conj', 'opp', 'square', 'trine')
+
+
+def natal_points(chart: Dict) -> Dict[str, float]:
+	points = dict(chart['positions'])
+	# При неизвестном времени рождения ASC, MC и куспиды условные
+	if not chart.get('unknown_time'):
+		points['ASC'] = chart['asc']
+		points['MC'] = chart['mc']
+	return points
+
+
+def _targets(chart: Dict) -> List[Tuple[float, tuple]]:
+	"""Целевые долготы: (долгота, описание события), по возрастанию долготы."""
+	targets = []
+	for name, lon in natal_points(chart).items():
+		for aspect, angle in ASPECTS:
+			for side in {angle % 360, -angle % 360}:
+				targets.append(((lon + side) % 360.0, ('aspect', name, aspect)))
+	for index in range(12):
+		targets.append((index * 30.0, ('sign', index)))
+	cusps = [] if chart.get('unknown_time') else chart.get('cusps') or []
+	for index, cusp in enumerate(cusps[:12]):
+		targets.append((cusp % 360.0, ('house', index)))
+	targets.sort(key=lambda t: t[0])
+	return targets
+
+
+def find_transits(chart: Dict, start: Optional[datetime] = None, years: float = TRANSIT_YEARS,
+				  planets: Optional[Iterable[str]] = None, step: float = SWEEP_STEP) -> List[Dict]:
+	"""
+	Транзитные события за years лет от start (по умолчанию — сейчас), по времени.
+	planets — имена из calculator.PLANETS (по умолчанию TRANSIT_PLANETS, без Луны).
+
+	Каждое событие — словарь:
+		planet, jd, date (UTC), retrograde,
+		kind: 'aspect' (target, aspect), 'sign' (sign — индекс входа)
+		      или 'house' (house — номер дома, в который вошла планета)
+	"""
+	jd_start = to_jd(start or datetime.now(pytz.utc))
+	jd_end = jd_start + years * 365.25
+	targets = _targets(chart)
+	lons = [t[0] for t in targets]
+
+	events = []
+	for planet in planets or TRANSIT_PLANETS:
+		for index, jd, speed in crossings(PLANETS[planet], jd_start, jd_end, lons, step):
+			retrograde = speed < 0
+			kind, *rest = targets[index][1]
+			event = {'planet': planet, 'jd': jd, 'date': jd_to_datetime(jd), 'retrograde': retrograde, 'kind': kind}
+			if kind == 'aspect':
+				event['target'], event['aspect'] = rest
+			elif kind == 'sign':
+				# обратным ходом планета возвращается в предыдущий знак
+				event['sign'] = (rest[0] - 1) % 12 if retrograde else rest[0]
+			else:
+				event['house'] = ((rest[0] - 1) % 12 if retrograde else rest[0]) + 1
+			events.append(event)
+	events.sort(key=lambda e: e['jd'])
+	return events
+
+
+def highlights(events: List[Dict], planets: Iterable[str] = SLOW_PLANETS,
+			   points: Iterable[str] = PERSONAL_POINTS, aspects: Iterable[str] = MAJOR_TRANSIT_ASPECTS,
+			   limit: Optional[int] = None) -> List[Dict]:
+	"""Главные транзиты периода: медленные планеты к личным точкам.
+
+	Ретроградная петля даёт до трёх точных проходов одного аспекта — они
+	сводятся в одно событие со всеми проходами в passes.
+	"""
+	planets, points, aspects = set(planets), set(points), set(aspects)
+	last: Dict[tuple, Dict] = {}
+	result = []
+	for event in events:
+		if (event['kind'] != 'aspect' or event['planet'] not in planets
+				or event['target'] not in points or event['aspect'] not in aspects):
+			continue
+		key = (event['planet'], event['target'], event['aspect'])
+		previous = last.get(key)
+		# проход дольше чем через год после предыдущего — уже новый цикл
+		if previous is not None and event['jd'] - previous['passes'][-1]['jd'] < 365.25:
+			previous['passes'].append(event)
+			continue
+		last[key] = dict(event, passes=[event])
+		result.append(last[key])
+	return result[:limit] if limit else result
+
+
+def period_years(start: Optional[datetime] = None, years: float = TRANSIT_YEARS) -> Tuple[int, int]:
+	"""Первый и последний год окна прогноза."""
+	start = start or datetime.now(pytz.utc)
+	return start.year, (start + timedelta(days=years * 365.25)).year
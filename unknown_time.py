@@ -0,0 +1,113 @@
+"""
+Режим «время рождения неизвестно»: что в карте определено наверняка.
+
+	ranges = day_ranges("07.03.1994", lat, lon)
+	ranges['moon']     # [{'sign': 2, 'from': '00:00', 'to': '13:41'}, ...]
+	ranges['asc']      # знаки Асцендента по времени суток
+	ranges['houses']   # дом каждой планеты по времени суток
+
+Местные сутки проходятся с шагом в минуту. Для домов не нужен полный
+swe.houses на каждую минуту: ARMC растёт линейно (звёздное время), наклон
+эклиптики за сутки не меняется, поэтому куспиды считаются swe.houses_armc
+от ARMC начала суток плюс k минут. Долготы планет между полуночами
+интерполируются линейно — за сутки Луна отклоняется от прямой меньше чем
+на 0,1°. Смены знака планетами (в первую очередь Луной) берутся точно —
+корнями через ephemeris.crossings.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import swisseph as swe
+
+from calculator import PLANETS, timezone_for
+from ephemeris import calc, crossings, to_jd, wrap180
+from houses import HOUSE_SYSTEMS, effective_system, sidereal_frame
+from metrics import timed
+from texts import get_house
+
+
+# Звёздные сутки короче солнечных: ARMC за минуту, °
+ARMC_PER_MINUTE = 360.98564736629 / 1440
+SIGN_BOUNDARIES = [index * 30.0 for index in range(12)]
+
+
+def _compress(values: list, times: List[str], key: str) -> List[Dict]:
+	"""Подряд идущие одинаковые значения → [{key: значение, 'from': ..., 'to': ...}]."""
+	ranges = []
+	start = 0
+	for k in range(1, len(values) + 1):
+		if k == len(values) or values[k] != values[start]:
+			ranges.append({key: values[start], 'from': times[start], 'to': times[k - 1]})
+			start = k
+	return ranges
+
+
+def day_ranges(birth_date: str, lat: float, lon: float, house_system: str = None) -> Dict:
+	"""
+	Знаки планет, Асцендента и MC и дома планет на протяжении местных суток
+	birth_date (ДД.ММ.ГГГГ) в точке (lat, lon) в системе домов house_system.
+
+	Возвращает словарь (сериализуется в JSON, хранится в карте):
+		moon, asc, mc   — [{'sign': индекс знака, 'from': 'ЧЧ:ММ', 'to': 'ЧЧ:ММ'}]
+		signs           — то же для каждой планеты
+		houses          — {планета: [{'house': номер, 'from', 'to'}]}
+		ambiguous       — планеты, дом которых зависит от времени рождения
+	"""
+	tz = timezone_for(lat, lon)
+	day = datetime.strptime(birth_date, "%d.%m.%Y")
+	start = tz.localize(day, is_dst=False)
+	end = tz.localize(day + timedelta(days=1), is_dst=False)
+	jd0, jd1 = to_jd(start), to_jd(end)
+	minutes = int(round((jd1 - jd0) * 1440))  # 1380 или 1500 в дни перевода часов
+	times = [tz.normalize(start + timedelta(minutes=k)).strftime("%H:%M") for k in range(minutes)]
+
+	def local_time(jd: float) -> str:
+		return times[min(max(int((jd - jd0) * 1440), 0), minutes - 1)]
+
+	# Знаки планет: точные моменты смены знака
+	signs = {}
+	for name, pid in PLANETS.items():
+		sign = int(calc(jd0, pid)[0] // 30)
+		segments = [{'sign': sign, 'from': times[0]}]
+		for index, jd, speed in crossings(pid, jd0, jd1, SIGN_BOUNDARIES):
+			sign = (index - 1) % 12 if speed < 0 else index
+			segments[-1]['to'] = local_time(jd)
+			segments.append({'sign': sign, 'from': local_time(jd)})
+		segments[-1]['to'] = times[-1]
+		signs[name] = segments
+
+	# Куспиды на каждую минуту от ARMC начала суток
+	armc0, obliquity = sidereal_frame(jd0, lon)
+	hsys = HOUSE_SYSTEMS[effective_system(house_system, lat, obliquity)]
+	try:
+		with timed("chart_stage_seconds", stage="houses_day_sweep"):
+			houses = [
+				swe.houses_armc((armc0 + k * ARMC_PER_MINUTE) % 360.0, lat, obliquity, hsys)
+				for k in range(minutes)
+			]
+	except Exception as e:
+		raise RuntimeError(f"Ошибка расчёта домов: {e}")
+
+	asc = [int((ascmc[0] % 360) // 30) for _, ascmc in houses]
+	mc = [int((ascmc[1] % 360) // 30) for _, ascmc in houses]
+
+	# Дом каждой планеты поминутно; долгота интерполируется между полуночами
+	planet_houses = {}
+	for name, pid in PLANETS.items():
+		lon0 = calc(jd0, pid)[0]
+		motion = wrap180(calc(jd1, pid)[0] - lon0) / minutes
+		values = [
+			get_house(cusps, (lon0 + k * motion) % 360.0)
+			for k, (cusps, _) in enumerate(houses)
+		]
+		planet_houses[name] = _compress(values, times, 'house')
+
+	return {
+		'moon': signs['Moon'],
+		'signs': signs,
+		'asc': _compress(asc, times, 'sign'),
+		'mc': _compress(mc, times, 'sign'),
+		'houses': planet_houses,
+		'ambiguous': [name for name, ranges in planet_houses.items() if len(ranges) > 1],
+	}
@@ -0,0 +1,200 @@
+"""
+Прогрев после деплоя и проверка готовности.
+
+Прогрев (warm_up, запускается из bot.start_services) по шагам:
+	resources — startup.warm_up_all: TimezoneFinder, шрифты, ReportLab, БД;
+	chart     — синтетическая карта по фиксированным координатам, без
+	            геокодера: открывает файлы Swiss Ephemeris в пуле 'chart';
+	render    — PDF с готовыми текстами в пуле 'render', файл удаляется;
+	llm       — запрос к модели на 1 токен (LM Studio загружает модель).
+
+Каждый шаг отмечается в реестре CHECKS: pending → ok | failed. Бот готов,
+когда все обязательные шаги прошли (llm обязателен только при
+WARMUP_REQUIRE_LLM=1 — без модели бот отдаёт запасные тексты). Упавшие
+шаги повторяются раз в WARMUP_RETRY секунд.
+
+Пока бот не готов, апдейты не принимаются: webhook отвечает 503 (Telegram
+повторит доставку), polling и воркеры кластера ждут wait_ready. Состояние
+видно по /healthz (процесс жив), /readyz (200 или 503 с отчётом) и по
+команде администратора /health.
+"""
+
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import startup
+from metrics import gauge
+from runtime import run_blocking
+
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") == "1"
+WARMUP_REQUIRE_LLM = os.getenv("WARMUP_REQUIRE_LLM", "0") == "1"
+WARMUP_RETRY = float(os.getenv("WARMUP_RETRY", "30"))
+
+PENDING, OK, FAILED = "pending", "ok", "failed"
+
+# Синтетическая карта: фиксированные дата и координаты (Москва), геокодер не нужен
+WARMUP_BIRTH = datetime(1990, 6, 15, 12, 0)
+WARMUP_LAT, WARMUP_LON = 55.7558, 37.6173
+
+
+class Check:
+	__slots__ = ("name", "required", "status", "seconds", "error", "updated")
+
+	def __init__(self, name: str, required: bool = True):
+		self.name = name
+		self.required = required
+		self.status = PENDING
+		self.seconds: Optional[float] = None
+		self.error: Optional[str] = None
+		self.updated: Optional[float] = None
+
+	def to_json(self) -> Dict:
+		return {
+			"status": self.status,
+			"required": self.required,
+			"seconds": round(self.seconds, 3) if self.seconds is not None else None,
+			"error": self.error,
+		}
+
+
+# Имя шага → состояние, в порядке выполнения
+CHECKS: Dict[str, Check] = {
+	"resources": Check("resources"),
+	"chart": Check("chart"),
+	"render": Check("render"),
+	"llm": Check("llm", required=WARMUP_REQUIRE_LLM),
+}
+
+_ready: Optional[asyncio.Event] = None
+
+
+def _ready_event() -> asyncio.Event:
+	# Создаётся в работающем event loop (в каждом процессе кластера свой)
+	global _ready
+	if _ready is None:
+		_ready = asyncio.Event()
+	return _ready
+
+
+def is_ready() -> bool:
+	return not WARMUP_ENABLED or all(c.status == OK for c in CHECKS.values() if c.required)
+
+
+gauge("bot_ready", "1 — обязательные шаги прогрева пройдены", func=lambda: float(is_ready()))
+
+
+async def wait_ready() -> None:
+	"""Ждёт окончания обязательных шагов прогрева."""
+	if not is_ready():
+		await _ready_event().wait()
+
+
+def _warm_chart() -> dict:
+	from calculator import calculate_chart_at
+	return calculate_chart_at(WARMUP_BIRTH, WARMUP_LAT, WARMUP_LON)
+
+
+def _warm_render(chart: dict) -> None:
+	from love_ai import FALLBACK_TEXTS
+	from pdf_generator import create_natal_pdf
+
+	path = create_natal_pdf(chart, 0, "Warmup", "warmup", sections=dict(FALLBACK_TEXTS))
+	os.remove(path)
+
+
+async def _run_check(name: str, coro) -> Any:
+	"""Выполняет шаг и отмечает результат в CHECKS. Возвращает результат шага или None."""
+	check = CHECKS[name]
+	started = time.perf_counter()
+	result = None
+	try:
+		result = await coro
+	except Exception as e:
+		check.status, check.error = FAILED, f"{type(e).__name__}: {e}"
+		print(f"[warmup] {name}: {check.error}")
+	else:
+		check.status, check.error = OK, None
+	check.seconds = time.perf_counter() - started
+	check.updated = time.time()
+	return result
+
+
+async def _warm_resources() -> None:
+	errors = await run_blocking(startup.warm_up_all)
+	failed = [f"{name}: {error}" for name, error in errors.items() if error]
+	if failed:
+		raise RuntimeError("; ".join(failed))
+
+
+async def warm_up() -> None:
+	"""Прогревает ресурсы до готовности; упавшие шаги повторяются."""
+	if not WARMUP_ENABLED:
+		_ready_event().set()
+		return
+	from love_ai import ping
+
+	chart = None
+	while True:
+		if CHECKS["resources"].status != OK:
+			await _run_check("resources", _warm_resources())
+		if chart is None:
+			chart = await _run_check("chart", run_blocking(_warm_chart, pool="chart"))
+		if CHECKS["render"].status != OK and chart is not None:
+			await _run_check("render", run_blocking(_warm_render, chart, pool="render"))
+		if CHECKS["llm"].status != OK:
+			await _run_check("llm", ping())
+
+		if is_ready():
+			_ready_event().set()
+		if all(c.status == OK for c in CHECKS.values()):
+			print("[warmup] Готово: " + ", ".join(f"{c.name} {c.seconds:.1f} с" for c in CHECKS.values()))
+			return
+		await asyncio.sleep(WARMUP_RETRY)
+
+
+def report() -> Dict:
+	return {
+		"ready": is_ready(),
+		"checks": {name: check.to_json() for name, check in CHECKS.items()},
+		"resources": {
+			name: {"ready": r.ready, "seconds": r.seconds, "error": r.error}
+			for name, r in startup.RESOURCES.items()
+		},
+	}
+
+
+def format_report() -> str:
+	"""Текст для команды администратора /health."""
+	marks = {OK: "✅", FAILED: "❌", PENDING: "⏳"}
+	lines = ["Готов к работе" if is_ready() else "Прогрев не завершён", ""]
+	for check in CHECKS.values():
+		line = f"{marks[check.status]} {check.name}"
+		if check.seconds is not None:
+			line += f" — {check.seconds:.2f} с"
+		if not check.required:
+			line += " (необязательно)"
+		if check.error:
+			line += f"\n    {check.error}"
+		lines.append(line)
+	lines.append("")
+	for name, r in startup.RESOURCES.items():
+		state = f"{r.seconds:.2f} с" if r.ready else (r.error or "не загружен")
+		lines.append(f"{name}: {state}")
+	return "\n".join(lines)
+
+
+async def handle_healthz(request):
+	from aiohttp import web
+	return web.json_response({"status": "ok"})
+
+
+async def handle_readyz(request):
+	from aiohttp import web
+	return web.json_response(report(), status=200 if is_ready() else 503)
+
+
+HEALTH_ROUTES = (("/healthz", handle_healthz), ("/readyz", handle_readyz))
@@ -0,0 +1,190 @@
+"""
+Webhook-режим бота: встроенный aiohttp-сервер принимает апдейты от Telegram.
+
+Апдейт проходит путь:
+	POST /<WEBHOOK_PATH> → проверка секрета → дедупликация по update_id
+	→ ограниченная очередь → пул воркеров → bot.process_new_updates
+
+Если очередь переполнена, сервер отвечает 503 — Telegram повторит доставку
+позже, так что нагрузка не копится в памяти. При остановке сервер перестаёт
+принимать апдейты и дожидается, пока воркеры разберут очередь.
+"""
+
+import asyncio
+import os
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from aiohttp import web
+from telebot.types import Update
+
+import metrics
+import warmup
+
+
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # публичный https-адрес без пути
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+
+QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+WORKERS = int(os.getenv("WEBHOOK_WORKERS", "32"))
+DEDUP_WINDOW = 10000
+DRAIN_TIMEOUT = 60
+
+_updates = metrics.counter("webhook_updates", "Апдейты webhook: received, duplicate, rejected, processed, error")
+
+
+class UpdateDeduplicator:
+	"""Помнит последние DEDUP_WINDOW update_id (Telegram может прислать апдейт повторно)."""
+
+	def __init__(self, size: int = DEDUP_WINDOW):
+		self.size = size
+		self._seen: "OrderedDict[int, None]" = OrderedDict()
+
+	def seen(self, update_id: int) -> bool:
+		"""Возвращает True, если апдейт уже был; иначе запоминает его."""
+		if update_id in self._seen:
+			return True
+		self._seen[update_id] = None
+		if len(self._seen) > self.size:
+			self._seen.popitem(last=False)
+		return False
+
+	def forget(self, update_id: int) -> None:
+		self._seen.pop(update_id, None)
+
+
+class WebhookServer:
+	def __init__(self, bot, path: str = WEBHOOK_PATH, secret: str = WEBHOOK_SECRET,
+				 queue_size: int = QUEUE_SIZE, workers: int = WORKERS,
+				 ready: Optional[Callable[[], bool]] = None):
+		self.bot = bot
+		# Пока ready() ложно (идёт прогрев), апдейты отклоняются с 503
+		self.ready = ready or (lambda: True)
+		self.path = path
+		self.secret = secret
+		self.workers = workers
+		self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+		self.dedup = UpdateDeduplicator()
+		self.stats = {"received": 0, "duplicates": 0, "rejected": 0, "processed": 0, "errors": 0}
+		self._accepting = False
+		self._worker_tasks = []
+		self._runner: Optional[web.AppRunner] = None
+
+	def make_app(self) -> web.Application:
+		app = web.Application()
+		app.router.add_post(self.path, self.handle_update)
+		# Порт webhook открыт наружу — метрики здесь только по токену, иначе через METRICS_PORT
+		if metrics.METRICS_TOKEN:
+			app.router.add_get("/metrics", metrics.handle_protected_metrics)
+		app.router.add_get("/healthz", warmup.handle_healthz)
+		app.router.add_get("/readyz", self.handle_readyz)
+		return app
+
+	def readiness(self) -> dict:
+		report = warmup.report()
+		report["ready"] = self._accepting and self.ready()
+		return report
+
+	async def handle_readyz(self, request: web.Request) -> web.Response:
+		report = self.readiness()
+		return web.json_response(report, status=200 if report["ready"] else 503)
+
+	async def handle_update(self, request: web.Request) -> web.Response:
+		if self.secret and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != self.secret:
+			return web.Response(status=403)
+		if not self._accepting or not self.ready():
+			return web.Response(status=503)
+
+		try:
+			payload = await request.json()
+			update_id = int(payload["update_id"])
+		except (ValueError, KeyError, TypeError):  # битый JSON или нет update_id
+			return web.Response(status=400)
+
+		self.stats["received"] += 1
+		_updates.inc(result="received")
+		if self.dedup.seen(update_id):
+			self.stats["duplicates"] += 1
+			_updates.inc(result="duplicate")
+			return web.Response()
+
+		if not self.enqueue(payload):
+			# Даём Telegram повторить доставку; id забываем, чтобы повтор не сочли дублем
+			self.dedup.forget(update_id)
+			self.stats["rejected"] += 1
+			_updates.inc(result="rejected")
+			return web.Response(status=503)
+		return web.Response()
+
+	def enqueue(self, payload: dict) -> bool:
+		"""Ставит апдейт в очередь обработки. False — очередь переполнена."""
+		try:
+			self.queue.put_nowait(payload)
+		except asyncio.QueueFull:
+			return False
+		return True
+
+	async def _worker(self) -> None:
+		while True:
+			payload = await self.queue.get()
+			try:
+				await self.bot.process_new_updates([Update.de_json(payload)])
+				self.stats["processed"] += 1
+				_updates.inc(result="processed")
+			except Exception as e:
+				self.stats["errors"] += 1
+				_updates.inc(result="error")
+				print(f"[webhook] Ошибка обработки апдейта {payload.get('update_id')}: {e}")
+			finally:
+				self.queue.task_done()
+
+	def queue_depth(self) -> int:
+		return self.queue.qsize()
+
+	async def start(self, host: str = WEBHOOK_HOST, port: int = WEBHOOK_PORT, app: Optional[web.Application] = None) -> None:
+		metrics.gauge("webhook_queue_depth", "Апдейты в очереди webhook", func=self.queue_depth)
+		self._worker_tasks = [
+			asyncio.create_task(self._worker(), name=f"webhook-worker-{i}")
+			for i in range(self.workers)
+		]
+		self._runner = web.AppRunner(app or self.make_app())
+		await self._runner.setup()
+		await web.TCPSite(self._runner, host, port).start()
+		self._accepting = True
+
+	async def stop(self, drain_timeout: float = DRAIN_TIMEOUT) -> None:
+		"""Перестаёт принимать апдейты, дожидается очереди и гасит воркеров."""
+		self._accepting = False
+		# Без своих воркеров (маршрутизатор кластера) очередь не используется
+		if self.workers:
+			try:
+				await asyncio.wait_for(self.queue.join(), timeout=drain_timeout)
+			except asyncio.TimeoutError:
+				print(f"[webhook] Очередь не разобрана за {drain_timeout} с, осталось {self.queue.qsize()} апдейтов")
+		for task in self._worker_tasks:
+			task.cancel()
+		await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+		self._worker_tasks = []
+		if self._runner is not None:
+			await self._runner.cleanup()
+			self._runner = None
+
+
+async def run_webhook(bot, stop_event: Optional[asyncio.Event] = None) -> None:
+	"""Регистрирует webhook в Telegram и обслуживает апдейты до stop_event (или навсегда)."""
+	server = WebhookServer(bot, ready=warmup.is_ready)
+	await server.start()
+	if WEBHOOK_URL:
+		await bot.set_webhook(
+			url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+			secret_token=WEBHOOK_SECRET or None,
+			max_connections=min(100, WORKERS),
+		)
+	print(f"[webhook] Слушаю {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+	try:
+		await (stop_event or asyncio.Event()).wait()
+	finally:
+		await server.stop()